@@ -0,0 +1,170 @@
+"""Flask CLI commands for maintenance tasks (run with ``flask <command>``)."""
+
+import click
+from extensions import db
+
+
+def register_commands(app):
+    """Attach maintenance commands to the app's CLI."""
+
+    @app.cli.command('rebuild-rankings')
+    @click.option('--season', 'year', type=int, default=None,
+                  help='Only rebuild this season (year).')
+    def rebuild_rankings(year):
+        """Rebuild the season_rankings table from scores."""
+        import models
+        from rankings import rebuild_season_rankings
+
+        season_id = None
+        if year is not None:
+            season = models.Seasons.query.filter_by(year=year).first()
+            if not season:
+                raise click.ClickException(f'No season for {year}')
+            season_id = season.id
+
+        count = rebuild_season_rankings(season_id)
+        db.session.commit()
+        click.echo(f'Wrote {count} ranking rows')
+
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search():
+        """Rebuild the search_index table used by the results search."""
+        from search import rebuild_search_index
+
+        count = rebuild_search_index()
+        db.session.commit()
+        click.echo(f'Wrote {count} search tokens')
+
+    @app.cli.command('migrate')
+    @click.option('--status', is_flag=True,
+                  help='List pending migrations without applying them.')
+    def migrate(status):
+        """Create the database or apply pending schema migrations."""
+        from create_app import initialize_levels, initialize_seasons
+        from migrations import pending, upgrade
+
+        if status:
+            names = pending()
+            for name in names:
+                click.echo(f'Pending: {name}')
+            if not names:
+                click.echo('The database is up to date')
+            return
+
+        for name in upgrade():
+            click.echo(f'Applied {name}')
+        # A new database gets its seasons and levels now rather than when
+        # the app next starts
+        initialize_seasons()
+        initialize_levels()
+        click.echo('The database is up to date')
+
+    @app.cli.command('check-query-plans')
+    def check_plans():
+        """EXPLAIN the hot queries and check they use their indexes."""
+        from query_plans import check_query_plans
+
+        checks = check_query_plans()
+        for check in checks:
+            result = check.index or 'NO INDEX'
+            click.echo(f'{check.query.description}: {result}')
+            if check.index is None:
+                for line in check.plan:
+                    click.echo(f'    {line}')
+
+        missing = [check for check in checks if check.index is None]
+        if missing:
+            raise click.ClickException(
+                f'{len(missing)} hot queries do not use their index; run '
+                f'"flask migrate" and check the table statistics'
+            )
+
+    @app.cli.command('rebuild-entry-totals')
+    @click.option('--competition', 'competition_id', type=int, default=None,
+                  help='Only this competition (id).')
+    @click.option('--season', 'year', type=int, default=None,
+                  help='Only this season (year).')
+    @click.option('--verify', is_flag=True,
+                  help='Compare with the scores without changing anything.')
+    def rebuild_totals(competition_id, year, verify):
+        """Rebuild the entry_totals table from scores, or verify it."""
+        import models
+        from totals import find_totals_drift, rebuild_entry_totals
+
+        season_id = None
+        if year is not None:
+            season = models.Seasons.query.filter_by(year=year).first()
+            if not season:
+                raise click.ClickException(f'No season for {year}')
+            season_id = season.id
+
+        if verify:
+            drift = find_totals_drift(competition_id, season_id)
+            for row in drift:
+                stored = ('missing' if row.stored is None
+                          else f'{row.stored:g}')
+                click.echo(f'Entry {row.entry_id}: {row.column} is {stored}, '
+                           f'expected {row.expected:g}')
+            if drift:
+                raise click.ClickException(
+                    f'{len({row.entry_id for row in drift})} entry totals '
+                    f'are out of date; run "flask rebuild-entry-totals" to '
+                    f'fix them'
+                )
+            click.echo('Entry totals match the scores')
+            return
+
+        count = rebuild_entry_totals(competition_id, season_id)
+        db.session.commit()
+        click.echo(f'Wrote {count} entry totals')
+
+    @app.cli.command('recompute-scores')
+    @click.option('--competition', 'competition_id', type=int, default=None,
+                  help='Only this competition (id).')
+    @click.option('--season', 'year', type=int, default=None,
+                  help='Only this season (year).')
+    @click.option('--check', is_flag=True,
+                  help='Report drift without changing anything.')
+    def recompute_scores_command(competition_id, year, check):
+        """Recompute stored E-scores and totals, or check them for drift."""
+        import models
+        from recompute import find_drift, recompute_scores
+
+        season_id = None
+        if year is not None:
+            season = models.Seasons.query.filter_by(year=year).first()
+            if not season:
+                raise click.ClickException(f'No season for {year}')
+            season_id = season.id
+
+        if check:
+            drift = find_drift(competition_id, season_id)
+            for row in drift:
+                click.echo(f'Score {row.score_id}: {row.column} is '
+                           f'{row.stored:.3f}, expected {row.expected:.3f}')
+            if drift:
+                raise click.ClickException(
+                    f'{len(drift)} stored values have drifted; run '
+                    f'"flask recompute-scores" to fix them'
+                )
+            click.echo('No drift found')
+            return
+
+        e_fixed, totals_fixed = recompute_scores(competition_id, season_id)
+        click.echo(f'Recomputed {e_fixed} E-scores and {totals_fixed} '
+                   f'totals')
+
+    @app.cli.command('prune-score-submissions')
+    @click.option('--days', type=int, default=30, show_default=True,
+                  help='Keep keys newer than this many days.')
+    def prune_score_submissions(days):
+        """Delete old idempotency keys from the score_submissions table."""
+        import datetime
+        import models
+
+        cutoff = datetime.datetime.now() - datetime.timedelta(days=days)
+        count = models.ScoreSubmissions.query.filter(
+            models.ScoreSubmissions.created_at < cutoff
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        click.echo(f'Deleted {count} submission keys')
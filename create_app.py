@@ -38,7 +38,12 @@ def _build_database_uri() -> str:
     )
 
 
-def create_app():
+def create_app(test_config=None):
+    """Build the app from the environment.
+
+    ``test_config`` overrides any of the settings; the tests use it to run
+    against SQLite instead of MySQL.
+    """
     # Load environment from .env located next to this file, regardless of CWD
     if load_dotenv:
         basedir = os.path.abspath(os.path.dirname(__file__))
@@ -53,15 +58,72 @@ def create_app():
 
     # Core configuration
     app.config.update(
-        SQLALCHEMY_DATABASE_URI=_build_database_uri(),
         SQLALCHEMY_TRACK_MODIFICATIONS=False,
         SECRET_KEY=os.environ.get("SECRET_KEY", "change-me-in-prod"),
         DEBUG=os.environ.get("FLASK_DEBUG", "0") in {"1", "true", "True"},
         PERMANENT_SESSION_LIFETIME=timedelta(days=30),
+        # /live/stream: idle keepalive interval and how long one stream is
+        # held open before the browser is asked to reconnect
+        LIVE_STREAM_HEARTBEAT=int(
+            os.environ.get("LIVE_STREAM_HEARTBEAT", "15")
+        ),
+        LIVE_STREAM_MAX_SECONDS=int(
+            os.environ.get("LIVE_STREAM_MAX_SECONDS", "300")
+        ),
+        # Streams one worker holds open at once. Each takes a thread for
+        # its whole life, so this is 0 (every page polls the JSON API)
+        # unless the server runs threads; see DEPLOYMENT.md
+        LIVE_STREAM_MAX_CLIENTS=int(
+            os.environ.get("LIVE_STREAM_MAX_CLIENTS", "0")
+        ),
+        # Public page cache: "memory" (per worker), "filesystem" (shared
+        # by the workers on one host) or "none"
+        PAGE_CACHE_BACKEND=os.environ.get("PAGE_CACHE_BACKEND", "memory"),
+        PAGE_CACHE_DIR=os.environ.get("PAGE_CACHE_DIR"),
+        PAGE_CACHE_TTL=int(os.environ.get("PAGE_CACHE_TTL", "300")),
+        PAGE_CACHE_SIZE=int(os.environ.get("PAGE_CACHE_SIZE", "1000")),
+        # Top NZ and profile best scores: served as is for the soft TTL,
+        # then served stale while refreshed in the background, up to the
+        # hard TTL (0 turns this off)
+        STALE_CACHE_SOFT_TTL=int(os.environ.get("STALE_CACHE_SOFT_TTL", "10")),
+        STALE_CACHE_HARD_TTL=int(
+            os.environ.get("STALE_CACHE_HARD_TTL", "300")
+        ),
+        STALE_CACHE_SIZE=int(os.environ.get("STALE_CACHE_SIZE", "1000")),
+        # Per-request SQL statistics: share of requests sampled (0 is off),
+        # repeats of one statement shape reported as a likely N+1, and
+        # whether sampled responses get an X-SQL-Stats header
+        SQL_STATS_SAMPLE_RATE=float(
+            os.environ.get("SQL_STATS_SAMPLE_RATE", "0")
+        ),
+        SQL_STATS_REPEAT_THRESHOLD=int(
+            os.environ.get("SQL_STATS_REPEAT_THRESHOLD", "5")
+        ),
+        SQL_STATS_HEADER=os.environ.get("SQL_STATS_HEADER", "0")
+        in {"1", "true", "True"},
     )
+    if test_config:
+        app.config.update(test_config)
+    if "SQLALCHEMY_DATABASE_URI" not in app.config:
+        app.config["SQLALCHEMY_DATABASE_URI"] = _build_database_uri()
 
     db.init_app(app)
 
+    from page_cache import page_cache
+    page_cache.init_app(app)
+
+    from stale_cache import stale_cache
+    stale_cache.init_app(app)
+
+    import sql_stats
+    sql_stats.init_app(app)
+
+    import metrics
+    metrics.init_app(app)
+
+    # Keeps search_index in step with the names it covers
+    import search  # noqa: F401
+
     # Error handlers
     @app.errorhandler(404)
     def page_not_found(e):
@@ -93,17 +155,16 @@ def create_app():
     from routes import main
     app.register_blueprint(main)
 
-    with app.app_context():
-        # Ensure tables exist before any initialization that queries them
-        try:
-            # Use the module-level `db` imported from extensions to avoid shadowing
-            db.create_all()
-        except Exception:
-            pass
+    # CLI maintenance commands
+    from commands import register_commands
+    register_commands(app)
 
-        # Initialize default seasons if the table is present
+    with app.app_context():
+        # Initialize default seasons and levels if the tables are present;
+        # they are created and migrated by "flask migrate", never here
         try:
             initialize_seasons()
+            initialize_levels()
         except Exception:
             # Avoid hard failure on startup if DB is empty or not ready
             pass
@@ -133,3 +194,24 @@ def initialize_seasons():
     except Exception as e:
         db.session.rollback()
         print(f"Error creating seasons: {e}")
+
+
+def initialize_levels():
+    """Create the standard levels on a database that has none."""
+    import models
+
+    if models.Levels.query.first():
+        return
+
+    for sort_order, name in enumerate(models.DEFAULT_LEVELS, 1):
+        db.session.add(models.Levels(
+            name=name, sort_order=sort_order,
+            top_nz=name in models.TOP_NZ_LEVELS
+        ))
+
+    try:
+        db.session.commit()
+        print(f"Created {len(models.DEFAULT_LEVELS)} levels")
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error creating levels: {e}")
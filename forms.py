@@ -24,6 +24,20 @@ from wtforms.validators import (
 )
 import re
 
+from extensions import db
+import models
+
+
+def level_choices(prompt=None):
+    """(name, name) for every level in competition order, after an
+    optional blank ``prompt`` choice."""
+    choices = [('', prompt)] if prompt else []
+    choices.extend(
+        (name, name) for (name,) in db.session.query(models.Levels.name)
+        .order_by(models.Levels.sort_order)
+    )
+    return choices
+
 
 def validate_not_placeholder(form, field):
     """Custom validator to reject placeholder values (0) for select fields."""
@@ -167,20 +181,10 @@ class AddGymnast(FlaskForm):
         validators=[DataRequired('Please select a club')]
     )
 
-    level = SelectField('Level', choices=[
-        ('Level 1', 'Level 1'),
-        ('Level 2', 'Level 2'),
-        ('Level 3', 'Level 3'),
-        ('Level 4', 'Level 4'),
-        ('Level 5', 'Level 5'),
-        ('Level 6', 'Level 6'),
-        ('Level 7', 'Level 7'),
-        ('Level 8', 'Level 8'),
-        ('Level 9', 'Level 9'),
-        ('Junior International', 'Junior International'),
-        ('Senior International', 'Senior International')
-    ],
-                        validators=[DataRequired('Please select a level')]
+    # Choices are the levels table, filled in by __init__
+    level = SelectField(
+        'Level',
+        validators=[DataRequired('Please select a level')]
     )
 
     # Optional bio fields
@@ -206,6 +210,10 @@ class AddGymnast(FlaskForm):
 
     submit = SubmitField('Add Gymnast')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.level.choices = level_choices()
+
 
 class AddClub(FlaskForm):
     """Form for adding new clubs"""
@@ -316,27 +324,9 @@ class EditGymnastProfileForm(FlaskForm):
         validators=[Optional(), Length(max=100)]
     )
     
+    # Choices are the levels table, filled in by __init__
     level = SelectField(
         'Competition Level',
-        choices=[
-            ('', 'Select Level'),
-            ('Level 1', 'Level 1'),
-            ('Level 2', 'Level 2'),
-            ('Level 3', 'Level 3'),
-            ('Level 4', 'Level 4'),
-            ('Level 5', 'Level 5'),
-            ('Level 6', 'Level 6'),
-            ('Level 7', 'Level 7'),
-            ('Level 8', 'Level 8'),
-            ('Level 9', 'Level 9'),
-            ('Level 10', 'Level 10'),
-            ('Junior', 'Junior'),
-            ('Senior', 'Senior'),
-            ('Junior International', 'Junior International'),
-            ('Senior International', 'Senior International'),
-            ('Open', 'Open'),
-            ('Elite', 'Elite')
-        ],
         validators=[Optional()]
     )
     
@@ -362,6 +352,10 @@ class EditGymnastProfileForm(FlaskForm):
     
     submit = SubmitField('Update Profile')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.level.choices = level_choices('Select Level')
+
 
 class AthleteApplicationForm(FlaskForm):
     """Form for users to apply for athlete profiles"""
@@ -374,21 +368,9 @@ class AthleteApplicationForm(FlaskForm):
         ]
     )
     
+    # Choices are the levels table, filled in by __init__
     gymnastics_level = SelectField(
         'Competition Level',
-        choices=[
-            ('Level 1', 'Level 1'),
-            ('Level 2', 'Level 2'),
-            ('Level 3', 'Level 3'),
-            ('Level 4', 'Level 4'),
-            ('Level 5', 'Level 5'),
-            ('Level 6', 'Level 6'),
-            ('Level 7', 'Level 7'),
-            ('Level 8', 'Level 8'),
-            ('Level 9', 'Level 9'),
-            ('Junior International', 'Junior International'),
-            ('Senior International', 'Senior International')
-        ],
         validators=[DataRequired('Please select your level')]
     )
     
@@ -409,6 +391,10 @@ class AthleteApplicationForm(FlaskForm):
     
     submit = SubmitField('Submit Application')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.gymnastics_level.choices = level_choices()
+
 
 class AdminEditGymnastBioForm(FlaskForm):
     """Form for admins to edit gymnast bio details"""
@@ -418,27 +404,9 @@ class AdminEditGymnastBioForm(FlaskForm):
         validators=[Optional(), Length(max=100)]
     )
     
+    # Choices are the levels table, filled in by __init__
     level = SelectField(
         'Competition Level',
-        choices=[
-            ('', 'Select Level'),
-            ('Level 1', 'Level 1'),
-            ('Level 2', 'Level 2'),
-            ('Level 3', 'Level 3'),
-            ('Level 4', 'Level 4'),
-            ('Level 5', 'Level 5'),
-            ('Level 6', 'Level 6'),
-            ('Level 7', 'Level 7'),
-            ('Level 8', 'Level 8'),
-            ('Level 9', 'Level 9'),
-            ('Level 10', 'Level 10'),
-            ('Junior', 'Junior'),
-            ('Senior', 'Senior'),
-            ('Junior International', 'Junior International'),
-            ('Senior International', 'Senior International'),
-            ('Open', 'Open'),
-            ('Elite', 'Elite')
-        ],
         validators=[Optional()]
     )
     
@@ -463,3 +431,8 @@ class AdminEditGymnastBioForm(FlaskForm):
     )
     
     submit = SubmitField('Update Gymnast Bio')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.level.choices = level_choices('Select Level')
+
@@ -0,0 +1,481 @@
+"""In-memory standings for the live competition.
+
+The live leaderboard is read far more often than it is written: every
+spectator refresh hits ``/live`` while scores only change when a judge
+submits. Instead of aggregating ``Scores`` in the database on each request,
+the worker keeps the live competition's scores in memory and updates them
+as judges commit. All-around sums come from ``entry_totals`` rather than
+being added up here. Sorted standings are cached per level and apparatus
+and only re-sorted after a score in that level changes.
+
+Each board remembers the ``Competitions.scores_version`` it reflects. A
+worker that sees a newer version in the database (because another worker
+handled the write) rebuilds before serving.
+
+Spectators on ``/live/stream`` subscribe to one level and apparatus. When a
+score changes, the board diffs the affected standings once and pushes the
+same delta to every subscriber, so the cost of a write does not grow with
+the number of viewers.
+"""
+
+import queue
+import threading
+from collections import namedtuple
+
+from extensions import db
+import models
+from single_flight import flights
+
+
+ALL_AROUND = 'all_around'
+
+# One leaderboard row. For a single apparatus the score columns are that
+# apparatus' score; for the all-around they are sums across apparatus.
+StandingRow = namedtuple(
+    'StandingRow',
+    'entry_id id name club_name level e_score d_score penalty total'
+)
+
+
+def ranked(rows):
+    """Yield ``(rank, row)`` for rows sorted highest total first.
+
+    Equal totals share a rank and the places they fill are skipped
+    ("1, 2, 2, 4"), as on Top NZ.
+    """
+    rank = 0
+    previous = None
+    for position, row in enumerate(rows, 1):
+        # Sums of floats can differ in the last bits for equal totals
+        total = round(row.total, 3)
+        if total != previous:
+            rank = position
+            previous = total
+        yield rank, row
+
+
+def row_to_dict(row, rank):
+    """Serialise a standing row for JSON clients."""
+    return {
+        'entry_id': row.entry_id,
+        'gymnast_id': row.id,
+        'name': row.name,
+        'club_name': row.club_name,
+        'level': row.level,
+        'rank': rank,
+        'e_score': round(row.e_score, 3),
+        'd_score': round(row.d_score, 3),
+        'penalty': round(row.penalty, 3),
+        'total': round(row.total, 3),
+    }
+
+
+def rows_to_dicts(rows):
+    """Serialise sorted standings, with their ranks, for JSON clients."""
+    return [row_to_dict(row, rank) for rank, row in ranked(rows)]
+
+
+def diff_standings(old_rows, new_rows):
+    """Return the rows added, changed or re-ranked, and the entries removed.
+
+    Rows are compared as serialised dicts so a rank change alone counts as
+    a change.
+    """
+    old = {data['entry_id']: data for data in rows_to_dicts(old_rows)}
+    changed = []
+    seen = set()
+    for data in rows_to_dicts(new_rows):
+        seen.add(data['entry_id'])
+        if old.get(data['entry_id']) != data:
+            changed.append(data)
+    removed = [entry_id for entry_id in old if entry_id not in seen]
+    return changed, removed
+
+
+class Subscriber:
+    """A single spectator stream listening to one level and apparatus."""
+
+    def __init__(self, level, apparatus_id, maxsize=100):
+        self.level = level
+        self.apparatus_id = apparatus_id
+        self.events = queue.Queue(maxsize=maxsize)
+
+    def push(self, event):
+        """Queue an event; a slow client is sent a fresh snapshot instead."""
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            self._drain()
+            self.events.put_nowait(('resync', None))
+
+    def close(self):
+        """Tell the stream to finish, e.g. when the competition ends."""
+        self._drain()
+        self.events.put_nowait(('end', None))
+
+    def _drain(self):
+        try:
+            while True:
+                self.events.get_nowait()
+        except queue.Empty:
+            pass
+
+
+class LiveLeaderboard:
+    """Standings for one competition, held in process memory."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.competition_id = None
+        # Competitions.scores_version this board reflects; None forces a
+        # rebuild on next use
+        self.version = None
+        # entry_id -> (gymnast_id, name, club_name, level)
+        self._roster = {}
+        # level name -> Levels.sort_order
+        self._level_order = {}
+        # entry_id -> {apparatus_id: (e_score, d_score, penalty, total)}
+        self._scores = {}
+        # entry_id -> all-around (e_score, d_score, penalty, total), from
+        # entry_totals
+        self._totals = {}
+        # (level, apparatus_id or ALL_AROUND) -> [StandingRow, ...]
+        self._sorted = {}
+        # (level, apparatus_id or ALL_AROUND) -> set of Subscriber
+        self._subscribers = {}
+        # Standings last pushed to subscribers of each key
+        self._published = {}
+        self._refresh_lock = threading.Lock()
+
+    def is_current(self, competition_id, version):
+        """Return True if the board holds this version of a competition."""
+        return (self.competition_id == competition_id
+                and self.version is not None
+                and self.version == version)
+
+    def rebuild(self, competition_id, version=None):
+        """Reload every entry and score for a competition from the DB.
+
+        Used when a worker first serves ``/live`` (possibly mid-competition),
+        when the live competition changes and when another worker has
+        written scores this one has not seen.
+        """
+        roster_rows = (
+            db.session.query(
+                models.Entries.id,
+                models.Gymnasts.id,
+                models.Gymnasts.name,
+                models.Clubs.name,
+                models.Levels.name
+            )
+            .join(models.Gymnasts,
+                  models.Entries.gymnast_id == models.Gymnasts.id)
+            .join(models.Clubs, models.Gymnasts.club_id == models.Clubs.id)
+            .join(models.Levels, models.Gymnasts.level_id == models.Levels.id)
+            .filter(models.Entries.competition_id == competition_id)
+            .all()
+        )
+        score_rows = (
+            db.session.query(
+                models.Scores.entry_id,
+                models.Scores.apparatus_id,
+                models.Scores.level,
+                models.Scores.e_score,
+                models.Scores.d_score,
+                models.Scores.penalty,
+                models.Scores.total
+            )
+            .filter(models.Scores.competition_id == competition_id)
+            .all()
+        )
+        totals_rows = (
+            db.session.query(
+                models.EntryTotals.entry_id,
+                models.EntryTotals.e_score,
+                models.EntryTotals.d_score,
+                models.EntryTotals.penalty,
+                models.EntryTotals.total
+            )
+            .join(models.Entries,
+                  models.EntryTotals.entry_id == models.Entries.id)
+            .filter(models.Entries.competition_id == competition_id)
+            .all()
+        )
+
+        roster = {
+            entry_id: (gymnast_id, name, club_name, level)
+            for entry_id, gymnast_id, name, club_name, level in roster_rows
+        }
+        scores = {}
+        for entry_id, apparatus_id, level, e_score, d_score, penalty, total \
+                in score_rows:
+            scores.setdefault(entry_id, {})[apparatus_id] = (
+                e_score, d_score, penalty, total
+            )
+            # Scored gymnasts stay in the level they competed at, even if
+            # they have moved up since
+            if entry_id in roster:
+                roster[entry_id] = roster[entry_id][:3] + (level,)
+        totals = {row[0]: tuple(row[1:]) for row in totals_rows}
+        level_order = models.Levels.sort_orders()
+
+        with self._lock:
+            if self.competition_id != competition_id:
+                # Streams for another competition have nothing left to show
+                for subscribers in self._subscribers.values():
+                    for subscriber in subscribers:
+                        subscriber.close()
+                self._subscribers = {}
+                self._published = {}
+            self.competition_id = competition_id
+            self.version = version
+            self._roster = roster
+            self._scores = scores
+            self._totals = totals
+            self._level_order = level_order
+            self._sorted = {}
+            self._notify()
+
+    def refresh(self):
+        """Rebuild if the live competition has moved on from this board.
+
+        Called by idle streams so that scores written through other workers
+        still reach this worker's subscribers. Only one caller rebuilds at a
+        time; the rest keep serving the current data.
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            live_competition = models.Competitions.query.filter_by(
+                status='live'
+            ).first()
+            if live_competition is None:
+                self.rebuild(None)
+            elif not self.is_current(live_competition.id,
+                                     live_competition.scores_version):
+                self.rebuild(live_competition.id,
+                             live_competition.scores_version)
+        finally:
+            self._refresh_lock.release()
+
+    def _advance(self, version):
+        # Caller holds the lock. A local write moves the board forward one
+        # version; any gap means another worker wrote in between.
+        if version is None or self.version is None \
+                or version != self.version + 1:
+            self.version = None
+        else:
+            self.version = version
+
+    def apply_score(self, score, version=None):
+        """Record an inserted or updated score after it has been committed.
+
+        ``version`` is the competition's ``scores_version`` after the write.
+        Scores for any competition other than the loaded one are ignored.
+        """
+        self.apply_scores([score], version)
+
+    def apply_scores(self, scores, version=None):
+        """Record several scores committed together under one version."""
+        scores = [
+            score for score in scores
+            if score.entry is not None
+            and score.entry.competition_id == self.competition_id
+        ]
+        if not scores:
+            return
+
+        with self._lock:
+            self._advance(version)
+            levels = set()
+            for score in scores:
+                entry = score.entry
+                if entry.id not in self._roster:
+                    gymnast = entry.gymnasts
+                    self._roster[entry.id] = (
+                        gymnast.id, gymnast.name, gymnast.clubs.name,
+                        score.level
+                    )
+                self._scores.setdefault(entry.id, {})[score.apparatus_id] = (
+                    score.e_score, score.d_score, score.penalty, score.total
+                )
+                if entry.totals is not None:
+                    self._totals[entry.id] = (
+                        entry.totals.e_score, entry.totals.d_score,
+                        entry.totals.penalty, entry.totals.total
+                    )
+                levels.add(self._roster[entry.id][3])
+            for level in levels:
+                self._invalidate(level)
+                self._notify(level)
+
+    def remove_score(self, competition_id, entry_id, apparatus_id,
+                     version=None, totals=None):
+        """Forget a deleted score.
+
+        ``totals`` is the entry's refreshed ``entry_totals`` row as a dict.
+        """
+        if competition_id != self.competition_id:
+            return
+
+        with self._lock:
+            self._advance(version)
+            if totals is not None:
+                self._totals[entry_id] = (
+                    totals['e_score'], totals['d_score'],
+                    totals['penalty'], totals['total']
+                )
+            entry_scores = self._scores.get(entry_id)
+            if not entry_scores or apparatus_id not in entry_scores:
+                return
+            del entry_scores[apparatus_id]
+            if not entry_scores:
+                del self._scores[entry_id]
+            if entry_id in self._roster:
+                level = self._roster[entry_id][3]
+                self._invalidate(level)
+                self._notify(level)
+
+    def levels(self):
+        """Levels entered in the competition, in competition order."""
+        with self._lock:
+            levels = {info[3] for info in self._roster.values()}
+            order = self._level_order
+        # Levels added since the last rebuild go last
+        return sorted(levels, key=lambda level: (order.get(level, 10000),
+                                                 level))
+
+    def standings(self, level, apparatus_id=ALL_AROUND):
+        """Return rows for a level, highest total first.
+
+        ``apparatus_id`` is an apparatus id or ``ALL_AROUND`` for the sum of
+        every apparatus each gymnast has been scored on.
+        """
+        key = (level, apparatus_id)
+        with self._lock:
+            rows = self._sorted.get(key)
+            if rows is None:
+                rows = self._compute(level, apparatus_id)
+                self._sorted[key] = rows
+        return rows
+
+    def subscribe(self, level, apparatus_id=ALL_AROUND):
+        """Register a stream and return it with the current standings."""
+        key = (level, apparatus_id)
+        subscriber = Subscriber(level, apparatus_id)
+        with self._lock:
+            rows = self._sorted.get(key)
+            if rows is None:
+                rows = self._compute(level, apparatus_id)
+                self._sorted[key] = rows
+            self._subscribers.setdefault(key, set()).add(subscriber)
+            self._published.setdefault(key, rows)
+        return subscriber, rows
+
+    def unsubscribe(self, subscriber):
+        """Remove a stream once its client has gone."""
+        key = (subscriber.level, subscriber.apparatus_id)
+        with self._lock:
+            subscribers = self._subscribers.get(key)
+            if subscribers is None:
+                return
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[key]
+                self._published.pop(key, None)
+
+    def _notify(self, level=None):
+        # Caller holds the lock. Diff each watched key once and push the
+        # same delta to all of its subscribers.
+        for key, subscribers in self._subscribers.items():
+            if level is not None and key[0] != level:
+                continue
+            rows = self._sorted.get(key)
+            if rows is None:
+                rows = self._compute(*key)
+                self._sorted[key] = rows
+            changed, removed = diff_standings(
+                self._published.get(key, []), rows
+            )
+            self._published[key] = rows
+            if not changed and not removed:
+                continue
+            delta = {'rows': changed, 'removed': removed}
+            for subscriber in subscribers:
+                subscriber.push(('delta', delta))
+
+    def _invalidate(self, level):
+        # Caller holds the lock
+        for key in [k for k in self._sorted if k[0] == level]:
+            del self._sorted[key]
+
+    def _compute(self, level, apparatus_id):
+        # Caller holds the lock
+        rows = []
+        for entry_id, entry_scores in self._scores.items():
+            info = self._roster.get(entry_id)
+            if info is None or info[3] != level:
+                continue
+
+            if apparatus_id == ALL_AROUND and entry_id in self._totals:
+                parts = [self._totals[entry_id]]
+            elif apparatus_id == ALL_AROUND:
+                # No entry_totals row yet (e.g. before a rebuild)
+                parts = list(entry_scores.values())
+            elif apparatus_id in entry_scores:
+                parts = [entry_scores[apparatus_id]]
+            else:
+                continue
+
+            gymnast_id, name, club_name, gymnast_level = info
+            rows.append(StandingRow(
+                entry_id=entry_id,
+                id=gymnast_id,
+                name=name,
+                club_name=club_name,
+                level=gymnast_level,
+                e_score=sum(p[0] for p in parts),
+                d_score=sum(p[1] for p in parts),
+                penalty=sum(p[2] for p in parts),
+                total=sum(p[3] for p in parts),
+            ))
+
+        rows.sort(key=lambda r: (-r.total, r.name))
+        return rows
+
+
+live_board = LiveLeaderboard()
+
+
+def get_live_board(competition):
+    """Return the shared board, rebuilding it for ``competition`` if needed.
+
+    Requests that find the board out of date at the same moment share one
+    rebuild.
+    """
+    competition_id = competition.id
+    version = competition.scores_version
+
+    def rebuild():
+        if not live_board.is_current(competition_id, version):
+            live_board.rebuild(competition_id, version)
+
+    if not live_board.is_current(competition_id, version):
+        flights.do(('live_board', competition_id, version), rebuild)
+    return live_board
+
+
+def build_board(competition):
+    """Return a one-off board for a competition that is not live.
+
+    Concurrent requests for the same competition and version share one.
+    """
+    competition_id = competition.id
+    version = competition.scores_version
+
+    def build():
+        board = LiveLeaderboard()
+        board.rebuild(competition_id, version)
+        return board
+
+    return flights.do(('board', competition_id, version), build)
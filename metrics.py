@@ -0,0 +1,346 @@
+"""Prometheus metrics, served as text at ``/metrics``.
+
+Collected on every request: latency per endpoint, statements and time in
+the database per endpoint, template render time, time to check out a
+pool connection and score writes per competition. The page cache,
+stale cache and single-flight counters, the pool's current state and the
+live competition's writes in the last minute are read when scraped.
+
+Hot routes must not queue behind the collector, so each thread records
+into its own shard of counters and histograms, without a lock. A scrape
+sums the shards under the only lock, taken once per scrape and once per
+new thread; each time, the shards of threads that have exited are folded
+into one.
+
+Every worker process keeps its own numbers, so with several workers each
+scrape sees the worker that answered it.
+"""
+
+from bisect import bisect_left
+from collections import deque
+import threading
+import time
+
+from flask import (before_render_template, g, has_request_context, request,
+                   template_rendered)
+from sqlalchemy import event
+
+from extensions import db
+import models
+
+
+# Upper bounds of the histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Score writes remembered per competition for the last-minute rate
+RECENT_WRITES = 10000
+
+# name: (type, help) of every metric, in the order they are written
+METRICS = {
+    'stag_http_requests_total': (
+        'counter', 'Requests answered, by endpoint, method and status.'),
+    'stag_http_request_duration_seconds': (
+        'histogram', 'Time to answer a request, by endpoint and method.'),
+    'stag_db_queries_total': (
+        'counter', 'SQL statements run, by endpoint.'),
+    'stag_db_query_seconds_total': (
+        'counter', 'Time spent running SQL statements, by endpoint.'),
+    'stag_db_pool_checkout_seconds': (
+        'histogram', 'Time to check a connection out of the pool, '
+                     'including any wait for a free one.'),
+    'stag_db_pool_connections': (
+        'gauge', 'Pool connections by state.'),
+    'stag_template_render_seconds': (
+        'histogram', 'Time to render a template, by template.'),
+    'stag_page_cache_requests_total': (
+        'counter', 'Page cache lookups, by result.'),
+    'stag_page_cache_hit_ratio': (
+        'gauge', 'Share of page cache lookups that were hits.'),
+    'stag_stale_cache_stale_hits_total': (
+        'counter', 'Stale values served while being refreshed.'),
+    'stag_stale_cache_refreshes_total': (
+        'counter', 'Background refreshes of stale values.'),
+    'stag_single_flight_requests_total': (
+        'counter', 'Computations by kind, run (leader) or shared '
+                   '(coalesced).'),
+    'stag_score_writes_total': (
+        'counter', 'Scores written, by competition.'),
+    'stag_live_score_writes_per_minute': (
+        'gauge', 'Scores written to the live competition in the last '
+                 'minute.'),
+}
+
+
+class _Shard:
+    """One thread's counters and histograms, keyed by (name, labels).
+
+    A histogram is a count per bucket (the last for +Inf) and the sum.
+    Gauges read at scrape time are added to ``counters`` of the total.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+    def merge(self, other):
+        for key, value in list(other.counters.items()):
+            self.counters[key] = self.counters.get(key, 0) + value
+        for key, values in list(other.histograms.items()):
+            mine = self.histograms.setdefault(key, [0] * len(values))
+            for index, value in enumerate(list(values)):
+                mine[index] += value
+
+
+class Registry:
+    """Counters and histograms recorded per thread, summed when read."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []
+        self._retired = _Shard()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                # Without a scrape, threads that come and go would
+                # otherwise leave their shards here forever
+                self._fold_dead()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _fold_dead(self):
+        """Fold the shards of exited threads into one; hold ``_lock``."""
+        shards = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                shards.append((thread, shard))
+            else:
+                self._retired.merge(shard)
+        self._shards = shards
+
+    def inc(self, name, labels=(), amount=1):
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + amount
+
+    def observe(self, name, labels, seconds):
+        histograms = self._shard().histograms
+        key = (name, labels)
+        values = histograms.get(key)
+        if values is None:
+            values = histograms[key] = [0] * (len(BUCKETS) + 2)
+        values[bisect_left(BUCKETS, seconds)] += 1
+        values[-1] += seconds
+
+    def collect(self):
+        """Everything recorded so far, as one ``_Shard``."""
+        total = _Shard()
+        with self._lock:
+            self._fold_dead()
+            total.merge(self._retired)
+            for _, shard in self._shards:
+                total.merge(shard)
+        return total
+
+
+registry = Registry()
+
+# competition id: times of its recent score writes
+_recent_writes = {}
+
+# Start times of the templates being rendered by this thread
+_rendering = threading.local()
+
+
+def _endpoint():
+    if has_request_context():
+        return request.endpoint or 'none'
+    return 'none'
+
+
+def record_score_writes(competition_id, count):
+    """Count ``count`` scores written to a competition."""
+    registry.inc('stag_score_writes_total',
+                 (('competition', str(competition_id)),), count)
+    writes = _recent_writes.get(competition_id)
+    if writes is None:
+        writes = _recent_writes.setdefault(
+            competition_id, deque(maxlen=RECENT_WRITES)
+        )
+    now = time.time()
+    writes.extend([now] * count)
+
+
+def _before_render(sender, template, context, **extra):
+    stack = getattr(_rendering, 'starts', None)
+    if stack is None:
+        stack = _rendering.starts = []
+    stack.append(time.perf_counter())
+
+
+def _rendered(sender, template, context, **extra):
+    stack = getattr(_rendering, 'starts', None)
+    if stack:
+        registry.observe('stag_template_render_seconds',
+                         (('template', template.name or 'string'),),
+                         time.perf_counter() - stack.pop())
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    conn.info.setdefault('metrics_start', []).append(time.perf_counter())
+
+
+def _record_statement(conn):
+    starts = conn.info.get('metrics_start')
+    if not starts:
+        return
+    labels = (('endpoint', _endpoint()),)
+    registry.inc('stag_db_queries_total', labels)
+    registry.inc('stag_db_query_seconds_total', labels,
+                 time.perf_counter() - starts.pop())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    _record_statement(conn)
+
+
+def _handle_error(context):
+    # A statement that fails never reaches ``after_cursor_execute``;
+    # count it here so its start time doesn't stay on the stack
+    if context.connection is not None:
+        _record_statement(context.connection)
+
+
+def _time_pool_checkout(engine):
+    pool = engine.pool
+    connect = pool.connect
+
+    def timed_connect():
+        start = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            registry.observe('stag_db_pool_checkout_seconds', (),
+                             time.perf_counter() - start)
+
+    pool.connect = timed_connect
+
+
+def init_app(app):
+    """Record requests, statements, templates and pool checkouts."""
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+    _time_pool_checkout(engine)
+    # ``dispose`` replaces the pool
+    event.listen(engine, 'engine_disposed', _time_pool_checkout)
+
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+
+    @app.before_request
+    def start_request_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop('_metrics_start', None)
+        if start is not None:
+            endpoint = _endpoint()
+            registry.observe('stag_http_request_duration_seconds',
+                             (('endpoint', endpoint),
+                              ('method', request.method)),
+                             time.perf_counter() - start)
+            registry.inc('stag_http_requests_total',
+                         (('endpoint', endpoint),
+                          ('method', request.method),
+                          ('status', str(response.status_code))))
+        return response
+
+
+def _escape(value):
+    return (str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+def _sample(name, labels, value):
+    if labels:
+        text = ','.join(f'{key}="{_escape(label)}"' for key, label in labels)
+        name = f'{name}{{{text}}}'
+    return f'{name} {value}'
+
+
+def _scraped(total):
+    """Add the values read at scrape time to ``total``."""
+    from page_cache import page_cache
+    from single_flight import flights
+    from stale_cache import stale_cache
+
+    counters = total.counters
+    hits, misses = page_cache.hits, page_cache.misses
+    counters['stag_page_cache_requests_total', (('result', 'hit'),)] = hits
+    counters['stag_page_cache_requests_total', (('result', 'miss'),)] = misses
+    counters['stag_page_cache_hit_ratio', ()] = (
+        hits / (hits + misses) if hits + misses else 0.0
+    )
+    counters['stag_stale_cache_stale_hits_total', ()] = stale_cache.stale_hits
+    counters['stag_stale_cache_refreshes_total', ()] = stale_cache.refreshes
+    for kind, counts in flights.stats().items():
+        for role, count in counts.items():
+            counters['stag_single_flight_requests_total',
+                     (('kind', kind), ('role', role))] = count
+
+    pool = db.engine.pool
+    if hasattr(pool, 'checkedout'):
+        for state, count in (('checked_out', pool.checkedout()),
+                             ('idle', pool.checkedin()),
+                             ('overflow', max(pool.overflow(), 0))):
+            counters['stag_db_pool_connections',
+                     (('state', state),)] = count
+
+    live = db.session.query(models.Competitions.id).filter(
+        models.Competitions.status == 'live'
+    ).first()
+    if live:
+        since = time.time() - 60
+        writes = list(_recent_writes.get(live.id, ()))
+        counters['stag_live_score_writes_per_minute',
+                 (('competition', str(live.id)),)] = sum(
+            1 for written in writes if written >= since
+        )
+
+
+def render():
+    """All metrics in the Prometheus text format."""
+    total = registry.collect()
+    _scraped(total)
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind != 'histogram':
+            for (metric, labels), value in sorted(total.counters.items()):
+                if metric == name:
+                    lines.append(_sample(name, labels, value))
+            continue
+
+        for (metric, labels), values in sorted(total.histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), values):
+                cumulative += count
+                le = bound if bound == '+Inf' else f'{bound:g}'
+                lines.append(_sample(f'{name}_bucket',
+                                     labels + (('le', le),), cumulative))
+            lines.append(_sample(f'{name}_sum', labels, float(values[-1])))
+            lines.append(_sample(f'{name}_count', labels, cumulative))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,445 @@
+"""Schema migrations, applied in order and recorded in ``schema_migrations``.
+
+``db.create_all()`` creates missing tables but never changes one that
+exists, so every change to an existing table is a migration here. A new
+database is created from the models and marked as up to date. An existing
+one gets the migrations it has not seen, in order, each committed on its
+own. Migrations look at the schema before changing it, so they are safe on
+databases where the old one-off commands (``add-score-keys``,
+``convert-scores-to-decimal``, ``convert-levels``) were already run.
+
+Migrations only run from ``flask migrate``, as a deploy step: workers
+altering tables as they start would race each other. Where the app is
+served, ``check`` refuses to start on a database that is behind.
+
+To change an existing table, update the model and append a migration in
+the same commit; never edit or reorder one that has shipped.
+``tests/test_migrations.py`` migrates a database at the original schema
+and fails if the result differs from what the models create.
+"""
+
+import re
+
+from extensions import db
+import models
+
+
+# (name, function) in the order they are applied
+MIGRATIONS = []
+
+
+def migration(name):
+    """Register a function as the next migration."""
+    def register(function):
+        MIGRATIONS.append((name, function))
+        return function
+    return register
+
+
+def _columns(table):
+    return {
+        column['name']
+        for column in db.inspect(db.session.connection()).get_columns(table)
+    }
+
+
+def _create_indexes(model):
+    for index in model.__table__.indexes:
+        index.create(db.session.connection(), checkfirst=True)
+
+
+def _drop_index(table, name):
+    connection = db.session.connection()
+    reflected = db.Table(table, db.MetaData(), autoload_with=connection)
+    for index in reflected.indexes:
+        if index.name == name:
+            index.drop(connection)
+
+
+def _foreign_keys(table):
+    """The column lists of a table's foreign keys, as tuples."""
+    return {
+        tuple(key['constrained_columns'])
+        for key in db.inspect(db.session.connection()).get_foreign_keys(table)
+    }
+
+
+def _dialect():
+    return db.engine.dialect.name
+
+
+def _execute(*statements):
+    for statement in statements:
+        db.session.execute(db.text(statement))
+
+
+@migration('0001_competition_scores_version')
+def competition_scores_version():
+    """Add the counter readers use to tell if a leaderboard changed."""
+    if 'scores_version' not in _columns('competitions'):
+        _execute('ALTER TABLE competitions ADD COLUMN scores_version '
+                 'INTEGER NOT NULL DEFAULT 0')
+
+
+@migration('0002_score_keys')
+def score_keys():
+    """Remove duplicate scores and add the keys score writes upsert on.
+
+    The newest score per gymnast and apparatus (and per judge) is kept.
+    """
+    def duplicates(model, *columns):
+        keep = {
+            score_id for (score_id,) in db.session.query(
+                db.func.max(model.id)
+            ).group_by(*columns)
+        }
+        return [row_id for (row_id,) in db.session.query(model.id)
+                if row_id not in keep]
+
+    score_ids = duplicates(models.Scores, models.Scores.entry_id,
+                           models.Scores.apparatus_id)
+    if score_ids:
+        models.JudgeScores.query.filter(
+            models.JudgeScores.score_id.in_(score_ids)
+        ).delete(synchronize_session=False)
+        models.ScoreSubmissions.query.filter(
+            models.ScoreSubmissions.score_id.in_(score_ids)
+        ).update({'score_id': None}, synchronize_session=False)
+        models.Scores.query.filter(
+            models.Scores.id.in_(score_ids)
+        ).delete(synchronize_session=False)
+
+    judge_ids = duplicates(models.JudgeScores,
+                           models.JudgeScores.score_id,
+                           models.JudgeScores.judge_number)
+    if judge_ids:
+        models.JudgeScores.query.filter(
+            models.JudgeScores.id.in_(judge_ids)
+        ).delete(synchronize_session=False)
+
+    for model in (models.Scores, models.JudgeScores):
+        for index in model.__table__.indexes:
+            if index.name.startswith('uq_'):
+                index.create(db.session.connection(), checkfirst=True)
+
+
+@migration('0003_score_context')
+def score_context():
+    """Copy each score's competition, gymnast and level onto the score."""
+    dialect = _dialect()
+    columns = _columns('scores')
+    for name, column_type, target in (
+            ('competition_id', 'INTEGER', 'competitions'),
+            ('gymnast_id', 'INTEGER', 'gymnasts'),
+            ('level', 'VARCHAR(50)', None)):
+        if name in columns:
+            continue
+        # SQLite can only add a foreign key along with its column
+        references = (f' REFERENCES {target} (id)'
+                      if target and dialect == 'sqlite' else '')
+        _execute(f'ALTER TABLE scores ADD COLUMN {name} '
+                 f'{column_type} NULL{references}')
+
+    # Gymnasts still hold the level name until 0005 moves it to levels
+    if 'level' in _columns('gymnasts'):
+        level = 'gymnasts.level'
+        levels = ''
+    else:
+        level = 'levels.name'
+        levels = 'JOIN levels ON levels.id = gymnasts.level_id '
+    _execute(
+        'UPDATE scores SET '
+        'competition_id = (SELECT competition_id FROM entries '
+        'WHERE entries.id = scores.entry_id), '
+        'gymnast_id = (SELECT gymnast_id FROM entries '
+        'WHERE entries.id = scores.entry_id), '
+        f'level = (SELECT {level} FROM entries '
+        'JOIN gymnasts ON gymnasts.id = entries.gymnast_id '
+        f'{levels}WHERE entries.id = scores.entry_id) '
+        'WHERE competition_id IS NULL OR gymnast_id IS NULL '
+        'OR level IS NULL'
+    )
+
+    if dialect in ('mysql', 'mariadb'):
+        _execute('ALTER TABLE scores '
+                 'MODIFY competition_id INTEGER NOT NULL, '
+                 'MODIFY gymnast_id INTEGER NOT NULL, '
+                 'MODIFY level VARCHAR(50) NOT NULL')
+    elif dialect == 'postgresql':
+        _execute('ALTER TABLE scores '
+                 'ALTER COLUMN competition_id SET NOT NULL, '
+                 'ALTER COLUMN gymnast_id SET NOT NULL, '
+                 'ALTER COLUMN level SET NOT NULL')
+    # SQLite cannot add constraints to an existing column; the models
+    # always set these
+
+    for index in models.Scores.__table__.indexes:
+        if index.name in ('ix_scores_total', 'ix_scores_board',
+                          'ix_scores_gymnast'):
+            index.create(db.session.connection(), checkfirst=True)
+
+    # After the indexes, which lead with these columns, so MySQL uses them
+    # for the keys rather than adding its own
+    if dialect != 'sqlite':
+        keys = _foreign_keys('scores')
+        for name, target in (('competition_id', 'competitions'),
+                             ('gymnast_id', 'gymnasts')):
+            if (name,) not in keys:
+                _execute(f'ALTER TABLE scores ADD FOREIGN KEY ({name}) '
+                         f'REFERENCES {target} (id)')
+
+
+@migration('0004_decimal_scores')
+def decimal_scores():
+    """Store score columns as DECIMAL(6,3) instead of floating point.
+
+    Values are rounded to the thousandth here; totals are recomputed from
+    the rounded values in 0006.
+    """
+    dialect = _dialect()
+    for table in db.metadata.sorted_tables:
+        columns = [column for column in table.columns
+                   if column.type is models.SCORE_TYPE]
+        if not columns or not db.inspect(
+            db.session.connection()
+        ).has_table(table.name):
+            continue
+
+        db.session.execute(table.update().values({
+            column.name: db.func.round(column, 3) for column in columns
+        }))
+        if dialect in ('mysql', 'mariadb'):
+            changes = ', '.join(
+                f'MODIFY {column.name} DECIMAL(6,3) '
+                f'{"NULL" if column.nullable else "NOT NULL"}'
+                for column in columns
+            )
+        elif dialect == 'postgresql':
+            changes = ', '.join(
+                f'ALTER COLUMN {column.name} TYPE NUMERIC(6,3)'
+                for column in columns
+            )
+        else:
+            # SQLite keeps whatever type a value has, so the rounded
+            # values are all that is needed
+            changes = None
+        if changes:
+            _execute(f'ALTER TABLE {table.name} {changes}')
+
+
+@migration('0005_gymnast_levels')
+def gymnast_levels():
+    """Move gymnast levels from a name column to the levels table.
+
+    The standard levels are added if the table is empty, and names that
+    are not standard levels after them.
+    """
+    columns = _columns('gymnasts')
+    if 'level' not in columns:
+        return
+
+    # The standard levels as they were when this shipped
+    standard = ['Level 1', 'Level 2', 'Level 3', 'Level 4', 'Level 5',
+                'Level 6', 'Level 7', 'Level 8', 'Level 9',
+                'Junior International', 'Senior International']
+    known = dict(db.session.execute(db.text(
+        'SELECT name, sort_order FROM levels'
+    )).all())
+    names = [] if known else list(standard)
+    for (name,) in db.session.execute(db.text(
+        'SELECT DISTINCT level FROM gymnasts WHERE level IS NOT NULL '
+        'ORDER BY level'
+    )):
+        if name not in known and name not in names:
+            names.append(name)
+    last = max(known.values(), default=0)
+    if names:
+        db.session.execute(
+            db.text('INSERT INTO levels (name, sort_order) '
+                    'VALUES (:name, :sort_order)'),
+            [{'name': name, 'sort_order': sort_order}
+             for sort_order, name in enumerate(names, last + 1)]
+        )
+
+    dialect = _dialect()
+    if 'level_id' not in columns:
+        # SQLite can only add a foreign key along with its column
+        references = ' REFERENCES levels (id)' if dialect == 'sqlite' else ''
+        _execute('ALTER TABLE gymnasts ADD COLUMN level_id INTEGER '
+                 f'NULL{references}')
+
+    _execute('UPDATE gymnasts SET level_id = '
+             '(SELECT id FROM levels WHERE levels.name = gymnasts.level)')
+
+    if dialect in ('mysql', 'mariadb'):
+        _execute('ALTER TABLE gymnasts MODIFY level_id INTEGER NOT NULL',
+                 'ALTER TABLE gymnasts ADD FOREIGN KEY (level_id) '
+                 'REFERENCES levels (id)')
+    elif dialect == 'postgresql':
+        _execute('ALTER TABLE gymnasts ALTER COLUMN level_id SET NOT NULL',
+                 'ALTER TABLE gymnasts ADD FOREIGN KEY (level_id) '
+                 'REFERENCES levels (id)')
+    # SQLite cannot add constraints to an existing column
+    _execute('ALTER TABLE gymnasts DROP COLUMN level')
+
+
+@migration('0006_read_models')
+def read_models():
+    """Fill the tables derived from scores and names.
+
+    Rankings, entry totals and the search index were added as new tables,
+    which ``create_all`` creates empty, and stored totals may be off by
+    the rounding in 0004. Written against the tables as they were then,
+    so later changes to the models or their rebuilds don't change it.
+    """
+    # Scores: E-score is the judges' average when there is a panel
+    _execute(
+        'UPDATE scores SET e_score = '
+        '(SELECT ROUND(AVG(judge_scores.e_score), 3) FROM judge_scores '
+        'WHERE judge_scores.score_id = scores.id) '
+        'WHERE id IN (SELECT score_id FROM judge_scores)',
+        'UPDATE scores SET total = ROUND(e_score + d_score - penalty, 3)',
+        'UPDATE competitions SET scores_version = scores_version + 1'
+    )
+
+    # Rankings: each gymnast's best routine per season, level and
+    # apparatus, then the sum of those as the all-around row
+    _execute(
+        'DELETE FROM season_rankings',
+        'INSERT INTO season_rankings (season_id, level, gymnast_id, '
+        'apparatus_id, e_score, d_score, penalty, total) '
+        'SELECT season_id, level, gymnast_id, apparatus_id, e_score, '
+        'd_score, penalty, total FROM ('
+        'SELECT competitions.season_id, scores.level, scores.gymnast_id, '
+        'scores.apparatus_id, scores.e_score, scores.d_score, '
+        'scores.penalty, scores.total, ROW_NUMBER() OVER ('
+        'PARTITION BY scores.gymnast_id, scores.level, '
+        'competitions.season_id, scores.apparatus_id '
+        'ORDER BY scores.total DESC, scores.id) AS pick '
+        'FROM scores JOIN competitions '
+        'ON competitions.id = scores.competition_id) AS best '
+        'WHERE pick = 1',
+        'INSERT INTO season_rankings (season_id, level, gymnast_id, '
+        'apparatus_id, e_score, d_score, penalty, total) '
+        'SELECT season_id, level, gymnast_id, NULL, '
+        'ROUND(SUM(e_score), 3), ROUND(SUM(d_score), 3), '
+        'ROUND(SUM(penalty), 3), ROUND(SUM(total), 3) '
+        'FROM season_rankings WHERE apparatus_id IS NOT NULL '
+        'GROUP BY season_id, level, gymnast_id'
+    )
+
+    # Entry totals, including entries with no scores
+    _execute(
+        'DELETE FROM entry_totals',
+        'INSERT INTO entry_totals (entry_id, apparatus_count, e_score, '
+        'd_score, penalty, total) '
+        'SELECT entries.id, COUNT(scores.id), '
+        'COALESCE(ROUND(SUM(scores.e_score), 3), 0), '
+        'COALESCE(ROUND(SUM(scores.d_score), 3), 0), '
+        'COALESCE(ROUND(SUM(scores.penalty), 3), 0), '
+        'COALESCE(ROUND(SUM(scores.total), 3), 0) '
+        'FROM entries LEFT JOIN scores ON scores.entry_id = entries.id '
+        'GROUP BY entries.id'
+    )
+
+    # Search index: the lowercase words of each name (and gymnast level),
+    # cut to the token column's 50 characters
+    word = re.compile(r'\w+', re.UNICODE)
+    sources = (
+        ('gymnast', 'SELECT gymnasts.id, gymnasts.name, levels.name '
+                    'FROM gymnasts '
+                    'LEFT JOIN levels ON levels.id = gymnasts.level_id'),
+        ('club', 'SELECT id, name FROM clubs'),
+        ('competition', 'SELECT id, name FROM competitions'),
+        ('apparatus', 'SELECT id, name FROM apparatus'),
+    )
+    rows = []
+    for kind, query in sources:
+        for ref_id, *names in db.session.execute(db.text(query)):
+            text = ' '.join(name or '' for name in names).lower()
+            tokens = {token[:50] for token in word.findall(text)}
+            rows.extend({'token': token, 'kind': kind, 'ref_id': ref_id}
+                        for token in sorted(tokens))
+    _execute('DELETE FROM search_index')
+    if rows:
+        db.session.execute(
+            db.text('INSERT INTO search_index (token, kind, ref_id) '
+                    'VALUES (:token, :kind, :ref_id)'),
+            rows
+        )
+
+
+@migration('0007_hot_path_indexes')
+def hot_path_indexes():
+    """Index the predicates most pages filter on.
+
+    ``query_plans.hot_queries`` lists the queries each one serves.
+    """
+    for model in (models.Competitions, models.Gymnasts, models.Scores,
+                  models.JudgeScores, models.AthleteApplications):
+        _create_indexes(model)
+    # Replaced by ix_gymnasts_level, which leads with the same column
+    _drop_index('gymnasts', 'ix_gymnasts_level_id')
+
+
+@migration('0008_top_nz_levels')
+def top_nz_levels():
+    """Mark the levels Top NZ ranks, which used to be a list in its route."""
+    if 'top_nz' not in _columns('levels'):
+        _execute('ALTER TABLE levels ADD COLUMN top_nz BOOLEAN NOT NULL '
+                 'DEFAULT FALSE')
+    db.session.execute(
+        db.text('UPDATE levels SET top_nz = TRUE WHERE name IN :names')
+        .bindparams(db.bindparam('names', expanding=True)),
+        {'names': ['Level 7', 'Level 8', 'Level 9',
+                   'Junior International', 'Senior International']}
+    )
+
+
+def pending():
+    """Names of the migrations this database has not had."""
+    applied = {
+        name for (name,) in db.session.query(models.SchemaMigrations.name)
+    }
+    return [name for name, _ in MIGRATIONS if name not in applied]
+
+
+def check():
+    """Raise ``RuntimeError`` unless every migration has been applied."""
+    if db.inspect(db.engine).has_table(
+            models.SchemaMigrations.__tablename__):
+        names = pending()
+    else:
+        names = [name for name, _ in MIGRATIONS]
+    if names:
+        raise RuntimeError(
+            f'The database is missing migrations {", ".join(names)}; run '
+            f'"flask --app run migrate"'
+        )
+
+
+def upgrade():
+    """Create the database, or bring an existing one up to date.
+
+    Returns the names of the migrations that were run; a new database is
+    created at the latest schema and runs none.
+    """
+    new = not db.inspect(db.engine).has_table('competitions')
+    db.create_all()
+
+    names = pending()
+    ran = []
+    for name, function in MIGRATIONS:
+        if name not in names:
+            continue
+        try:
+            # A new database already has everything the migrations add
+            if not new:
+                function()
+                ran.append(name)
+            db.session.add(models.SchemaMigrations(name=name))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    return ran
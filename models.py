@@ -2,6 +2,13 @@
 
 from extensions import db
 from datetime import datetime
+from sqlalchemy.ext.hybrid import hybrid_property
+
+
+# Score values are exact to the thousandth: stored as DECIMAL so sums,
+# comparisons and ties are exact in SQL, and read back as floats so Python
+# code sees the same values as before
+SCORE_TYPE = db.Numeric(6, 3, asdecimal=False)
 
 
 class Roles(db.Model):
@@ -135,6 +142,12 @@ class Competitions(db.Model):
         db.DateTime, nullable=True
     )
 
+    # Incremented whenever the competition's scores, entries or status
+    # change, so readers can tell if their cached leaderboard is current
+    scores_version = db.Column(
+        db.Integer, nullable=False, default=0, server_default='0'
+    )
+
     entries = db.relationship(
         'Entries', backref='competitions'
     )
@@ -143,6 +156,85 @@ class Competitions(db.Model):
         'Seasons', backref='competitions'
     )
 
+    # The home page, /live and scoring look competitions up by status
+    # (upcoming ones in date order) and the calendar by date range
+    __table_args__ = (
+        db.Index('ix_competitions_status_date', 'status',
+                 'competition_date'),
+        db.Index('ix_competitions_date', 'competition_date'),
+    )
+
+    @staticmethod
+    def bump_scores_version(competition_id):
+        """Increment scores_version in the current transaction."""
+        db.session.query(Competitions).filter_by(id=competition_id).update(
+            {Competitions.scores_version: Competitions.scores_version + 1},
+            synchronize_session=False
+        )
+
+    @staticmethod
+    def current_scores_version(competition_id):
+        """Read scores_version straight from the database."""
+        return db.session.query(Competitions.scores_version).filter_by(
+            id=competition_id
+        ).scalar()
+
+
+# Levels created on a fresh database, in competition order
+DEFAULT_LEVELS = [
+    'Level 1', 'Level 2', 'Level 3', 'Level 4', 'Level 5',
+    'Level 6', 'Level 7', 'Level 8', 'Level 9',
+    'Junior International', 'Senior International'
+]
+
+# The standard levels Top NZ ranks
+TOP_NZ_LEVELS = [
+    'Level 7', 'Level 8', 'Level 9',
+    'Junior International', 'Senior International'
+]
+
+
+class Levels(db.Model):
+    """Competition levels, in the order they are run and listed.
+
+    Anything that orders by level joins here and sorts on ``sort_order``.
+    Only levels with ``top_nz`` set are ranked on Top NZ.
+    """
+    __tablename__ = 'levels'
+
+    id = db.Column(
+        db.Integer, primary_key=True
+    )
+
+    name = db.Column(
+        db.String(50), nullable=False, unique=True
+    )
+
+    sort_order = db.Column(
+        db.Integer, nullable=False, index=True
+    )
+
+    # A server default, so levels inserted by plain SQL (as migration
+    # 0005 does) are left off Top NZ
+    top_nz = db.Column(
+        db.Boolean, nullable=False, default=False, server_default=db.false()
+    )
+
+    @staticmethod
+    def named(name):
+        """Return the level called ``name``, adding it last if it is new."""
+        level = Levels.query.filter_by(name=name).first()
+        if level is None:
+            last = db.session.query(db.func.max(Levels.sort_order)).scalar()
+            level = Levels(name=name, sort_order=(last or 0) + 1)
+            db.session.add(level)
+        return level
+
+    @staticmethod
+    def sort_orders():
+        """Map each level name to its position."""
+        return dict(db.session.query(Levels.name, Levels.sort_order))
+
 
 class Gymnasts(db.Model):
     __tablename__ = 'gymnasts'
@@ -156,7 +248,7 @@ class Gymnasts(db.Model):
     )
 
     user_id = db.Column(
-        db.Integer, db.ForeignKey('users.id'), nullable=True
+        db.Integer, db.ForeignKey('users.id'), nullable=True, index=True
     )
 
     name = db.Column(
@@ -171,14 +263,40 @@ class Gymnasts(db.Model):
 
     injuries = db.Column(db.Text, nullable=True)
 
-    level = db.Column(
-        db.String(50), nullable=False
+    level_id = db.Column(
+        db.Integer, db.ForeignKey('levels.id'), nullable=False
+    )
+
+    # Always loaded with the gymnast so ``level`` never costs a query
+    level_ref = db.relationship(
+        'Levels', lazy='joined', innerjoin=True
     )
 
     entries = db.relationship(
         'Entries', backref='gymnasts',
     )
 
+    # Gymnasts are listed by level, then name
+    __table_args__ = (
+        db.Index('ix_gymnasts_level', 'level_id', 'name'),
+    )
+
+    @hybrid_property
+    def level(self):
+        """The gymnast's level name."""
+        return self.level_ref.name if self.level_ref else None
+
+    @level.inplace.setter
+    def _level_setter(self, name):
+        self.level_ref = Levels.named(name) if name else None
+
+    @level.inplace.expression
+    @classmethod
+    def _level_expression(cls):
+        return db.select(Levels.name).where(
+            Levels.id == cls.level_id
+        ).scalar_subquery()
+
 
 class Entries(db.Model):
     __tablename__ = 'entries'
@@ -199,6 +317,11 @@ class Entries(db.Model):
         'Scores', backref='entry'
     )
 
+    totals = db.relationship(
+        'EntryTotals', backref='entry', uselist=False,
+        cascade='all, delete-orphan'
+    )
+
     # Database constraint prevents duplicate entries
     __table_args__ = (
         db.UniqueConstraint('competition_id', 'gymnast_id',
@@ -221,24 +344,54 @@ class Scores(db.Model):
         db.Integer, db.ForeignKey('apparatus.id'), nullable=False
     )
 
+    # Copied from the entry when the score is written so leaderboards can
+    # filter scores without joining entries and gymnasts. ``level`` is the
+    # gymnast's level at the competition; it does not follow later moves.
+    competition_id = db.Column(
+        db.Integer, db.ForeignKey('competitions.id'), nullable=False
+    )
+
+    gymnast_id = db.Column(
+        db.Integer, db.ForeignKey('gymnasts.id'), nullable=False
+    )
+
+    level = db.Column(
+        db.String(50), nullable=False
+    )
+
     e_score = db.Column(
-        db.Float, nullable=False
+        SCORE_TYPE, nullable=False
     )
 
     d_score = db.Column(
-        db.Float, nullable=False
+        SCORE_TYPE, nullable=False
     )
 
     penalty = db.Column(
-        db.Float, nullable=False
+        SCORE_TYPE, nullable=False
     )
 
     total = db.Column(
-        db.Float, nullable=False
+        SCORE_TYPE, nullable=False
     )
 
     judge_scores = db.relationship(
-        'JudgeScores', backref='final_score', lazy=True
+        'JudgeScores', backref='final_score', lazy=True,
+        cascade='all, delete-orphan'
+    )
+
+    # One score per gymnast per apparatus; score writes upsert on this key.
+    # Results sort on the stored total, with id as the keyset tiebreaker,
+    # and leaderboards read one range of the board index. Searches that
+    # match an apparatus read it in total order.
+    __table_args__ = (
+        db.Index('uq_scores_entry_apparatus', 'entry_id', 'apparatus_id',
+                 unique=True),
+        db.Index('ix_scores_total', 'total', 'id'),
+        db.Index('ix_scores_apparatus', 'apparatus_id', 'total', 'id'),
+        db.Index('ix_scores_board', competition_id, level, apparatus_id,
+                 total.desc()),
+        db.Index('ix_scores_gymnast', gymnast_id, apparatus_id),
     )
 
     def calculate_average_e_score(self):
@@ -254,7 +407,7 @@ class Scores(db.Model):
         """Update the final e_score and total based on judge scores."""
         if self.judge_scores:
             self.e_score = self.calculate_average_e_score()
-            self.total = self.e_score + self.d_score - self.penalty
+            self.total = round(self.e_score + self.d_score - self.penalty, 3)
 
 
 class JudgeScores(db.Model):
@@ -273,7 +426,218 @@ class JudgeScores(db.Model):
     )
 
     e_score = db.Column(
-        db.Float, nullable=False
+        SCORE_TYPE, nullable=False
+    )
+
+    __table_args__ = (
+        db.Index('uq_judge_scores_score_judge', 'score_id', 'judge_number',
+                 unique=True),
+    )
+
+
+class EntryTotals(db.Model):
+    """Running totals of one entry's scores.
+
+    One row per entry, rewritten in the same transaction as any change to
+    its scores, so progress counts and all-around totals are read here
+    instead of aggregating ``Scores``. Maintained by ``totals.py``.
+    """
+    __tablename__ = 'entry_totals'
+
+    id = db.Column(
+        db.Integer, primary_key=True
+    )
+
+    entry_id = db.Column(
+        db.Integer, db.ForeignKey('entries.id'), nullable=False, unique=True
+    )
+
+    # Number of apparatus scored so far
+    apparatus_count = db.Column(
+        db.Integer, nullable=False, default=0
+    )
+
+    e_score = db.Column(
+        SCORE_TYPE, nullable=False, default=0.0
+    )
+
+    d_score = db.Column(
+        SCORE_TYPE, nullable=False, default=0.0
+    )
+
+    penalty = db.Column(
+        SCORE_TYPE, nullable=False, default=0.0
+    )
+
+    # All-around total: the sum of the entry's apparatus totals
+    total = db.Column(
+        SCORE_TYPE, nullable=False, default=0.0
+    )
+
+
+class PanelScores(db.Model):
+    """One judge's part of a panel score, submitted from their own device.
+
+    Rows collect per entry and apparatus until every judge on the panel has
+    submitted, then they are combined into ``Scores`` and ``JudgeScores``.
+    Judge 1 chairs the panel and also sends the D-score and penalty.
+    """
+    __tablename__ = 'panel_scores'
+
+    id = db.Column(
+        db.Integer, primary_key=True
+    )
+
+    entry_id = db.Column(
+        db.Integer, db.ForeignKey('entries.id'), nullable=False
+    )
+
+    apparatus_id = db.Column(
+        db.Integer, db.ForeignKey('apparatus.id'), nullable=False
+    )
+
+    judge_number = db.Column(
+        db.Integer, nullable=False
+    )
+
+    # Number of E-judges the submitting device was set up for; every judge
+    # on one panel must agree
+    panel_size = db.Column(
+        db.Integer, nullable=False
+    )
+
+    e_score = db.Column(
+        SCORE_TYPE, nullable=False
+    )
+
+    d_score = db.Column(
+        SCORE_TYPE, nullable=True
+    )
+
+    penalty = db.Column(
+        SCORE_TYPE, nullable=True
+    )
+
+    submitted_at = db.Column(
+        db.DateTime, nullable=False, default=db.func.current_timestamp()
+    )
+
+    __table_args__ = (
+        db.Index('uq_panel_scores_judge', 'entry_id', 'apparatus_id',
+                 'judge_number', unique=True),
+    )
+
+
+class SeasonRankings(db.Model):
+    """Each gymnast's best scores for a season and level.
+
+    A read model for Top NZ, refreshed from ``Scores`` whenever a gymnast's
+    scores change. Rows with ``apparatus_id`` NULL hold the all-around: the
+    sum of the gymnast's best routine on each apparatus.
+    """
+    __tablename__ = 'season_rankings'
+
+    id = db.Column(
+        db.Integer, primary_key=True
+    )
+
+    season_id = db.Column(
+        db.Integer, db.ForeignKey('seasons.id'), nullable=False
+    )
+
+    level = db.Column(
+        db.String(50), nullable=False
+    )
+
+    gymnast_id = db.Column(
+        db.Integer, db.ForeignKey('gymnasts.id'), nullable=False
+    )
+
+    apparatus_id = db.Column(
+        db.Integer, db.ForeignKey('apparatus.id'), nullable=True
+    )
+
+    e_score = db.Column(
+        SCORE_TYPE, nullable=False
+    )
+
+    d_score = db.Column(
+        SCORE_TYPE, nullable=False
+    )
+
+    penalty = db.Column(
+        SCORE_TYPE, nullable=False
+    )
+
+    total = db.Column(
+        SCORE_TYPE, nullable=False
+    )
+
+    gymnast = db.relationship('Gymnasts')
+
+    __table_args__ = (
+        db.Index('ix_season_rankings_board',
+                 'season_id', 'level', 'apparatus_id', 'total'),
+        db.Index('ix_season_rankings_gymnast', 'gymnast_id', 'season_id'),
+    )
+
+
+class SearchIndex(db.Model):
+    """Word tokens for the results search box.
+
+    One row per lowercased word of a searchable name, pointing back at the
+    row it came from (``kind`` is gymnast, club, competition or apparatus).
+    Maintained by ``search.py`` whenever those rows change.
+    """
+    __tablename__ = 'search_index'
+
+    id = db.Column(
+        db.Integer, primary_key=True
+    )
+
+    token = db.Column(
+        db.String(50), nullable=False
+    )
+
+    kind = db.Column(
+        db.String(20), nullable=False
+    )
+
+    ref_id = db.Column(
+        db.Integer, nullable=False
+    )
+
+    __table_args__ = (
+        db.Index('ix_search_index_token', 'token', 'kind', 'ref_id'),
+        db.Index('ix_search_index_ref', 'kind', 'ref_id'),
+    )
+
+
+class ScoreSubmissions(db.Model):
+    """Idempotency keys of scores already applied.
+
+    Judges' tablets queue scores while offline and resend them when the
+    connection returns, each with a key generated on the tablet. A key found
+    here has been applied before, so a resend is acknowledged without being
+    written twice.
+    """
+    __tablename__ = 'score_submissions'
+
+    id = db.Column(
+        db.Integer, primary_key=True
+    )
+
+    idempotency_key = db.Column(
+        db.String(64), nullable=False, unique=True
+    )
+
+    score_id = db.Column(
+        db.Integer, db.ForeignKey('scores.id', ondelete='SET NULL'),
+        nullable=True
+    )
+
+    created_at = db.Column(
+        db.DateTime, nullable=False, default=db.func.current_timestamp()
     )
 
 
@@ -341,3 +705,24 @@ class AthleteApplications(db.Model):
     user = db.relationship("Users", foreign_keys=[user_id],
                            backref="athlete_application")
     reviewer = db.relationship("Users", foreign_keys=[reviewed_by])
+
+    # Admins review pending applications oldest first, and applicants are
+    # checked for one already pending
+    __table_args__ = (
+        db.Index('ix_athlete_applications_status', 'status',
+                 'submitted_at'),
+        db.Index('ix_athlete_applications_user', 'user_id', 'status'),
+    )
+
+
+class SchemaMigrations(db.Model):
+    """Migrations from ``migrations.py`` already applied to this database."""
+    __tablename__ = 'schema_migrations'
+
+    name = db.Column(
+        db.String(100), primary_key=True
+    )
+
+    applied_at = db.Column(
+        db.DateTime, nullable=False, default=db.func.current_timestamp()
+    )
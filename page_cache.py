@@ -0,0 +1,331 @@
+"""Cache of rendered public pages, invalidated by tag.
+
+The public pages (home, calendar, competition details, Top NZ, /live and
+gymnast profiles) are read far more often than anything they show
+changes, yet each view reruns its queries and renders from scratch. With
+``page_cache.cached`` a view's page is stored under its path and query
+arguments, tagged with the rows it was built from (``competition:<id>``,
+``gymnast:<id>``, ``season:<year>``, or ``competitions`` for the pages
+that list them). Routes that write call ``page_cache.invalidate`` with the
+affected tags after they commit.
+
+Every tag has a token that invalidation replaces. A page remembers the
+tokens its tags had *before* its view ran, and is only served while they
+are all unchanged, so a page built while a write was committing is never
+kept. Because nothing has to be deleted, the same scheme works in process
+(``MemoryBackend``, one LRU per worker) and on disk (``FileSystemBackend``,
+shared by every worker on the host). With the in-process backend another
+worker's writes are only seen once the TTL runs out, so deployments with
+several workers should set ``PAGE_CACHE_BACKEND=filesystem``.
+
+The layout shows the signed-in user's name and tools, so pages are only
+cached for anonymous visitors; signed-in users always get a fresh page.
+"""
+
+from collections import OrderedDict, namedtuple
+from functools import wraps
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import urlencode
+
+from flask import Response, make_response, request, session
+
+from extensions import db
+import models
+
+
+# ``tokens`` maps each tag to its token when the page was built
+CacheEntry = namedtuple('CacheEntry', 'value expires tokens')
+
+
+def competition_tag(competition_id):
+    return f'competition:{competition_id}'
+
+
+def gymnast_tag(gymnast_id):
+    return f'gymnast:{gymnast_id}'
+
+
+def season_tag(year):
+    return f'season:{year}'
+
+
+# Pages that list competitions (home, calendar, /live)
+COMPETITIONS_TAG = 'competitions'
+
+
+class MemoryBackend:
+    """Least recently used pages in this process, up to ``max_entries``."""
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def tokens(self, tags):
+        with self._lock:
+            return {tag: self._tokens.get(tag, 0) for tag in tags}
+
+    def invalidate(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._tokens[tag] = self._tokens.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens.clear()
+
+
+class FileSystemBackend:
+    """Pages stored as files in ``directory``, shared between processes.
+
+    Writes go to a temporary file that is renamed into place, so readers
+    never see half a page. Once there are more than ``max_entries`` pages,
+    expired ones are removed first, then the oldest. Tag tokens are kept
+    apart from pages and never pruned, so an invalidation is not undone.
+    """
+
+    def __init__(self, directory, max_entries=1000):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._tag_directory = os.path.join(directory, 'tags')
+        os.makedirs(self._tag_directory, exist_ok=True)
+
+    @staticmethod
+    def _name(text):
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    def _write(self, path, data):
+        fd, temporary = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(temporary, path)
+        except OSError:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+
+    @staticmethod
+    def _load(path):
+        try:
+            with open(path, 'rb') as file:
+                return pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def get(self, key):
+        return self._load(os.path.join(self.directory, self._name(key)))
+
+    def set(self, key, entry):
+        self._write(os.path.join(self.directory, self._name(key)),
+                    pickle.dumps(entry, pickle.HIGHEST_PROTOCOL))
+        self._prune()
+
+    def _prune(self):
+        pages = [item for item in os.scandir(self.directory)
+                 if item.is_file()]
+        if len(pages) <= self.max_entries:
+            return
+        now = time.time()
+        keep = []
+        for page in pages:
+            entry = self._load(page.path)
+            if entry is None or entry.expires <= now:
+                self._remove(page.path)
+            else:
+                keep.append(page)
+        keep.sort(key=lambda page: page.stat().st_mtime)
+        for page in keep[:len(keep) - self.max_entries]:
+            self._remove(page.path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def tokens(self, tags):
+        tokens = {}
+        for tag in tags:
+            try:
+                with open(os.path.join(self._tag_directory,
+                                       self._name(tag))) as file:
+                    tokens[tag] = file.read()
+            except OSError:
+                tokens[tag] = ''
+        return tokens
+
+    def invalidate(self, tags):
+        for tag in tags:
+            self._write(os.path.join(self._tag_directory, self._name(tag)),
+                        uuid.uuid4().hex.encode())
+
+    def clear(self):
+        for directory in (self.directory, self._tag_directory):
+            for item in os.scandir(directory):
+                if item.is_file():
+                    self._remove(item.path)
+
+
+class PageCache:
+    """Tagged page cache; configured from the app by ``init_app``."""
+
+    def __init__(self):
+        self.backend = MemoryBackend()
+        self.ttl = 300
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        """Pick the backend from ``PAGE_CACHE_*`` config.
+
+        ``PAGE_CACHE_BACKEND`` is ``memory`` (default), ``filesystem`` or
+        ``none``. ``PAGE_CACHE_DIR`` is where the filesystem backend keeps
+        pages, ``PAGE_CACHE_TTL`` the longest a page is kept in seconds and
+        ``PAGE_CACHE_SIZE`` how many pages are kept.
+        """
+        backend = app.config.get('PAGE_CACHE_BACKEND', 'memory')
+        size = app.config.get('PAGE_CACHE_SIZE', 1000)
+        self.ttl = app.config.get('PAGE_CACHE_TTL', 300)
+        self.enabled = backend != 'none'
+        if backend == 'filesystem':
+            directory = app.config.get('PAGE_CACHE_DIR') or os.path.join(
+                app.instance_path, 'page_cache'
+            )
+            self.backend = FileSystemBackend(directory, size)
+        else:
+            self.backend = MemoryBackend(size)
+
+    def get(self, key):
+        """Return the value cached under ``key`` if it is still current."""
+        entry = self.backend.get(key)
+        if entry is None or entry.expires <= time.time():
+            return None
+        if self.backend.tokens(entry.tokens) != entry.tokens:
+            return None
+        return entry.value
+
+    def tokens(self, tags):
+        """Current tokens for ``tags``; take them before building a value."""
+        return self.backend.tokens(set(tags))
+
+    def set(self, key, value, tokens, ttl=None):
+        """Cache ``value`` under ``key``, built when tags had ``tokens``."""
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        self.backend.set(key, CacheEntry(value, expires, tokens))
+
+    def invalidate(self, *tags):
+        """Drop every cached page tagged with any of ``tags``.
+
+        Call after the write commits, so a page rebuilt straight away
+        reads the new rows.
+        """
+        if tags:
+            self.backend.invalidate(set(tags))
+
+    def clear(self):
+        self.backend.clear()
+
+    @staticmethod
+    def _cacheable():
+        # Flashed messages and anything stored in the session during the
+        # view are for one visitor only
+        return (request.method == 'GET' and 'user_id' not in session
+                and '_flashes' not in session)
+
+    @staticmethod
+    def _key(vary):
+        arguments = urlencode(sorted(request.args.items(multi=True)))
+        key = f'{request.path}?{arguments}'
+        if vary is not None:
+            key = f'{key}#{vary!r}'
+        return key
+
+    def cached(self, tags, vary=None, ttl=None):
+        """Cache a public page for anonymous visitors.
+
+        ``tags`` is called with the view's arguments (and may read
+        ``request.args``) and returns the tags the page depends on.
+        ``vary``, if given, returns extra state the page depends on that
+        is cheap to read on every request; it becomes part of the key.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                if not self.enabled or not self._cacheable():
+                    return view(**kwargs)
+
+                key = self._key(vary() if vary else None)
+                cached = self.get(key)
+                if cached is not None:
+                    self.hits += 1
+                    body, mimetype = cached
+                    response = Response(body, mimetype=mimetype)
+                    response.headers['X-Cache'] = 'HIT'
+                    return response
+
+                self.misses += 1
+                tokens = self.tokens(tags(**kwargs))
+                response = make_response(view(**kwargs))
+                if (response.status_code == 200
+                        and not response.direct_passthrough
+                        and not session.modified):
+                    self.set(key, (response.get_data(), response.mimetype),
+                             tokens, ttl)
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            return wrapper
+        return decorator
+
+
+page_cache = PageCache()
+
+
+def score_tags(competition, gymnast_ids):
+    """Tags of the pages that show a competition's scores."""
+    return [
+        competition_tag(competition.id),
+        season_tag(competition.season.year),
+        *(gymnast_tag(gymnast_id) for gymnast_id in gymnast_ids),
+    ]
+
+
+def gymnast_tags(gymnast_id):
+    """Tags of the pages that show a gymnast's name, club or level."""
+    competition_ids = db.session.query(
+        models.Entries.competition_id
+    ).filter(models.Entries.gymnast_id == gymnast_id)
+    years = db.session.query(models.Seasons.year).join(
+        models.SeasonRankings,
+        models.SeasonRankings.season_id == models.Seasons.id
+    ).filter(models.SeasonRankings.gymnast_id == gymnast_id).distinct()
+    return [
+        gymnast_tag(gymnast_id),
+        *(competition_tag(competition_id)
+          for (competition_id,) in competition_ids),
+        *(season_tag(year) for (year,) in years),
+    ]
@@ -0,0 +1,133 @@
+"""EXPLAIN checks that the hot queries are read through their indexes.
+
+``hot_queries`` lists the lookups most page loads run, built the way the
+routes build them, each with the index it should use. ``check_query_plans``
+asks the database for every plan and reports which ones use their index.
+Planners can prefer a scan on tiny tables, so check a database with
+realistic data (and, on MySQL or PostgreSQL, current statistics).
+"""
+
+from collections import namedtuple
+from datetime import date
+import re
+
+from extensions import db
+import models
+
+
+# ``indexes`` lists the indexes that serve the query; any one will do
+HotQuery = namedtuple('HotQuery', 'description indexes statement')
+
+PlanCheck = namedtuple('PlanCheck', 'query index plan')
+
+
+def hot_queries():
+    """The hot queries, with placeholder values for their parameters."""
+    today = date.today()
+    return [
+        HotQuery(
+            'Live competition (/, /live, /scoring, admin)',
+            ('ix_competitions_status_date',),
+            db.select(models.Competitions)
+            .where(models.Competitions.status == 'live')
+        ),
+        HotQuery(
+            'Upcoming competitions (/)',
+            ('ix_competitions_status_date', 'ix_competitions_date'),
+            db.select(models.Competitions)
+            .where(models.Competitions.competition_date >= today,
+                   models.Competitions.status.in_(['draft', 'live']))
+            .order_by(models.Competitions.competition_date)
+            .limit(3)
+        ),
+        HotQuery(
+            'Competitions in a month (/calendar)',
+            ('ix_competitions_date',),
+            db.select(models.Competitions)
+            .where(models.Competitions.competition_date.between(
+                today.replace(day=1), today
+            ))
+        ),
+        HotQuery(
+            "User's gymnast profile (dashboard)",
+            ('ix_gymnasts_user_id',),
+            db.select(models.Gymnasts).where(models.Gymnasts.user_id == 1)
+        ),
+        HotQuery(
+            'Gymnasts at a level (entries, calendar)',
+            ('ix_gymnasts_level',),
+            db.select(models.Gymnasts)
+            .where(models.Gymnasts.level_id == 1)
+            .order_by(models.Gymnasts.name)
+        ),
+        HotQuery(
+            "Entries' scores (scoring, progress)",
+            ('uq_scores_entry_apparatus',),
+            db.select(models.Scores)
+            .where(models.Scores.entry_id.in_([1, 2, 3]))
+        ),
+        HotQuery(
+            'Scores on an apparatus, best first (results search)',
+            ('ix_scores_apparatus',),
+            db.select(models.Scores)
+            .where(models.Scores.apparatus_id.in_([1, 2]))
+            .order_by(models.Scores.total.desc(), models.Scores.id.desc())
+            .limit(20)
+        ),
+        HotQuery(
+            "Scores' judge panels (scoring)",
+            ('uq_judge_scores_score_judge',),
+            db.select(models.JudgeScores)
+            .where(models.JudgeScores.score_id.in_([1, 2, 3]))
+        ),
+        HotQuery(
+            'Pending athlete applications (admin)',
+            ('ix_athlete_applications_status',),
+            db.select(models.AthleteApplications)
+            .where(models.AthleteApplications.status == 'pending')
+            .order_by(models.AthleteApplications.submitted_at)
+        ),
+        HotQuery(
+            "User's pending application (apply)",
+            ('ix_athlete_applications_user',),
+            db.select(models.AthleteApplications)
+            .where(models.AthleteApplications.user_id == 1,
+                   models.AthleteApplications.status == 'pending')
+        ),
+    ]
+
+
+def explain(statement):
+    """Return the database's plan for a statement, one line per step."""
+    dialect = db.engine.dialect
+    compiled = statement.compile(
+        dialect=dialect, compile_kwargs={'render_postcompile': True}
+    )
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+
+    prefix = 'EXPLAIN QUERY PLAN' if dialect.name == 'sqlite' else 'EXPLAIN'
+    rows = db.session.connection().exec_driver_sql(
+        f'{prefix} {compiled}', params
+    )
+    if dialect.name in ('mysql', 'mariadb'):
+        # Only ``key`` is the index chosen; ``possible_keys`` lists others
+        return [f'{row.table}: {row.key or "full scan"}' for row in rows]
+    if dialect.name == 'sqlite':
+        return [row.detail for row in rows]
+    return [row[0] for row in rows]
+
+
+def check_query_plans():
+    """Explain every hot query. Returns a ``PlanCheck`` for each, where
+    ``index`` is the expected index the plan uses, or None."""
+    checks = []
+    for query in hot_queries():
+        plan = explain(query.statement)
+        used = [
+            index for index in query.indexes
+            if any(re.search(rf'\b{index}\b', line) for line in plan)
+        ]
+        checks.append(PlanCheck(query, used[0] if used else None, plan))
+    return checks
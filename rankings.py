@@ -0,0 +1,119 @@
+"""Maintenance of the ``season_rankings`` read model behind Top NZ.
+
+Rankings only change when a gymnast's scores change, so rather than
+aggregating ``Scores`` on every ``/topnz`` request the affected gymnasts'
+rows are recomputed on write and Top NZ reads them directly. A gymnast is
+ranked in the level each score was recorded at, so one who moves up
+mid-season appears in both levels.
+"""
+
+from collections import defaultdict
+
+from extensions import db
+import models
+
+
+def _best_routines(gymnast_ids=None, season_id=None):
+    """Return each gymnast's best routine per season, level and apparatus."""
+    best = (
+        db.session.query(
+            models.Scores.gymnast_id.label('gymnast_id'),
+            models.Scores.level.label('level'),
+            models.Competitions.season_id.label('season_id'),
+            models.Scores.apparatus_id.label('apparatus_id'),
+            models.Scores.e_score.label('e_score'),
+            models.Scores.d_score.label('d_score'),
+            models.Scores.penalty.label('penalty'),
+            models.Scores.total.label('total'),
+            db.func.row_number().over(
+                partition_by=(models.Scores.gymnast_id,
+                              models.Scores.level,
+                              models.Competitions.season_id,
+                              models.Scores.apparatus_id),
+                order_by=(models.Scores.total.desc(), models.Scores.id)
+            ).label('pick')
+        )
+        .join(models.Competitions,
+              models.Scores.competition_id == models.Competitions.id)
+    )
+    if gymnast_ids is not None:
+        best = best.filter(models.Scores.gymnast_id.in_(gymnast_ids))
+    if season_id is not None:
+        best = best.filter(models.Competitions.season_id == season_id)
+    best = best.subquery()
+
+    return db.session.query(best).filter(best.c.pick == 1).all()
+
+
+def _ranking_rows(routines):
+    """Turn best routines into apparatus and all-around ranking rows."""
+    rows = []
+    all_around = defaultdict(lambda: [0.0, 0.0, 0.0, 0.0])
+    for r in routines:
+        rows.append({
+            'season_id': r.season_id,
+            'level': r.level,
+            'gymnast_id': r.gymnast_id,
+            'apparatus_id': r.apparatus_id,
+            'e_score': r.e_score,
+            'd_score': r.d_score,
+            'penalty': r.penalty,
+            'total': r.total,
+        })
+        sums = all_around[(r.season_id, r.level, r.gymnast_id)]
+        sums[0] += r.e_score
+        sums[1] += r.d_score
+        sums[2] += r.penalty
+        sums[3] += r.total
+
+    for (season_id, level, gymnast_id), sums in all_around.items():
+        rows.append({
+            'season_id': season_id,
+            'level': level,
+            'gymnast_id': gymnast_id,
+            'apparatus_id': None,
+            'e_score': round(sums[0], 3),
+            'd_score': round(sums[1], 3),
+            'penalty': round(sums[2], 3),
+            'total': round(sums[3], 3),
+        })
+    return rows
+
+
+def refresh_season_rankings(gymnast_ids, season_id=None):
+    """Recompute ranking rows for some gymnasts in the current transaction.
+
+    Pass ``season_id`` to limit the refresh to one season (e.g. the season
+    of the competition just scored); otherwise every season is refreshed.
+    The caller commits.
+    """
+    gymnast_ids = sorted({gid for gid in gymnast_ids if gid is not None})
+    if not gymnast_ids:
+        return
+
+    stale = models.SeasonRankings.query.filter(
+        models.SeasonRankings.gymnast_id.in_(gymnast_ids)
+    )
+    if season_id is not None:
+        stale = stale.filter(models.SeasonRankings.season_id == season_id)
+    stale.delete(synchronize_session=False)
+
+    rows = _ranking_rows(_best_routines(gymnast_ids, season_id))
+    if rows:
+        db.session.bulk_insert_mappings(models.SeasonRankings, rows)
+
+
+def rebuild_season_rankings(season_id=None):
+    """Rebuild the whole read model (or one season) from ``Scores``.
+
+    Returns the number of ranking rows written. The caller commits.
+    """
+    stale = models.SeasonRankings.query
+    if season_id is not None:
+        stale = stale.filter(models.SeasonRankings.season_id == season_id)
+    stale.delete(synchronize_session=False)
+
+    rows = _ranking_rows(_best_routines(season_id=season_id))
+    if rows:
+        db.session.bulk_insert_mappings(models.SeasonRankings, rows)
+    return len(rows)
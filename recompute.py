@@ -0,0 +1,143 @@
+"""Set-based recompute of stored score values, and a check for drift.
+
+``Scores.e_score`` is the average of the judges' scores when there is a
+panel, and ``Scores.total`` is ``e_score + d_score - penalty``. Both are
+stored when a score is written and everything else (results, rankings,
+the live board) reads them, so they must not drift from their inputs.
+``recompute_scores`` rebuilds them for a competition, a season or every
+score with two UPDATE statements; ``find_drift`` reports rows that no
+longer agree without changing anything.
+"""
+
+from collections import namedtuple
+
+from extensions import db
+import models
+from page_cache import page_cache, score_tags
+from rankings import rebuild_season_rankings
+from totals import TOLERANCE, entries_in_scope, rebuild_entry_totals
+
+# A stored value that disagrees with what its inputs give
+Drift = namedtuple('Drift', 'score_id column stored expected')
+
+
+def _judge_averages(competition_id=None, season_id=None, rounded=True):
+    """Average judge score per score in scope, as a subquery."""
+    average = db.func.avg(models.JudgeScores.e_score)
+    if rounded:
+        average = db.func.round(average, 3)
+    return (
+        db.select(models.JudgeScores.score_id.label('score_id'),
+                  average.label('e_score'))
+        .where(models.JudgeScores.score_id.in_(
+            db.select(models.Scores.id).where(models.Scores.entry_id.in_(
+                entries_in_scope(competition_id, season_id)
+            ))
+        ))
+        .group_by(models.JudgeScores.score_id)
+        .subquery()
+    )
+
+
+def _total_expr():
+    return (models.Scores.e_score + models.Scores.d_score
+            - models.Scores.penalty)
+
+
+def _rounded_total_expr():
+    """The total as ``Scores.update_final_score`` stores it."""
+    return db.func.round(_total_expr(), 3)
+
+
+def find_drift(competition_id=None, season_id=None):
+    """Return a ``Drift`` for every stored value that disagrees.
+
+    E-scores are compared with the unrounded judge average and totals
+    with their stored parts, so only real differences are reported.
+    """
+    averages = _judge_averages(competition_id, season_id, rounded=False)
+    e_drift = db.session.query(
+        models.Scores.id, models.Scores.e_score, averages.c.e_score
+    ).join(averages, averages.c.score_id == models.Scores.id).filter(
+        db.func.abs(models.Scores.e_score - averages.c.e_score) >= TOLERANCE
+    )
+
+    total = _total_expr()
+    total_drift = db.session.query(
+        models.Scores.id, models.Scores.total, total
+    ).filter(
+        models.Scores.entry_id.in_(
+            entries_in_scope(competition_id, season_id)
+        ),
+        db.func.abs(models.Scores.total - total) >= TOLERANCE
+    )
+
+    drift = [Drift(score_id, 'e_score', stored, round(expected, 3))
+             for score_id, stored, expected in e_drift]
+    drift += [Drift(score_id, 'total', stored, round(expected, 3))
+              for score_id, stored, expected in total_drift]
+    return sorted(drift)
+
+
+def recompute_scores(competition_id=None, season_id=None):
+    """Rebuild ``e_score`` and ``total`` for every score in scope.
+
+    Runs one UPDATE joined to the judge averages, then one UPDATE for the
+    totals, touching only rows whose value changes; both are rounded to
+    the thousandth as ``Scores.update_final_score`` rounds them. When
+    anything changed, season rankings, entry totals and ``scores_version``
+    are brought up to date, and after the commit the cached pages of the
+    competitions in scope are invalidated. Returns
+    ``(e_scores_fixed, totals_fixed)``.
+    """
+    averages = _judge_averages(competition_id, season_id)
+    e_fixed = db.session.execute(
+        db.update(models.Scores)
+        .where(models.Scores.id == averages.c.score_id,
+               models.Scores.e_score != averages.c.e_score)
+        .values(e_score=averages.c.e_score)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    total = _rounded_total_expr()
+    totals_fixed = db.session.execute(
+        db.update(models.Scores)
+        .where(models.Scores.entry_id.in_(
+                   entries_in_scope(competition_id, season_id)
+               ),
+               models.Scores.total != total)
+        .values(total=total)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    if e_fixed or totals_fixed:
+        if competition_id is not None and season_id is None:
+            season_id = db.session.query(
+                models.Competitions.season_id
+            ).filter_by(id=competition_id).scalar()
+        rebuild_season_rankings(season_id)
+        rebuild_entry_totals(competition_id, season_id)
+
+        competitions = db.session.query(models.Competitions)
+        if competition_id is not None:
+            competitions = competitions.filter_by(id=competition_id)
+        if season_id is not None:
+            competitions = competitions.filter_by(season_id=season_id)
+        competitions.update(
+            {models.Competitions.scores_version:
+                models.Competitions.scores_version + 1},
+            synchronize_session=False
+        )
+        gymnast_ids = [gymnast_id for (gymnast_id,) in db.session.query(
+            models.Entries.gymnast_id
+        ).filter(models.Entries.id.in_(
+            entries_in_scope(competition_id, season_id)
+        )).distinct()]
+        tags = [tag for competition in competitions
+                for tag in score_tags(competition, gymnast_ids)]
+    else:
+        tags = []
+
+    db.session.commit()
+    page_cache.invalidate(*tags)
+    return e_fixed, totals_fixed
@@ -29,3 +29,4 @@ from . import admin
 from . import calendar
 from . import topnz
 from . import profiles
+from . import monitoring
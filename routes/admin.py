@@ -1,7 +1,11 @@
 """Admin routes for competition management"""
-from flask import redirect, url_for, flash
+from flask import redirect, url_for, flash, jsonify
 from extensions import db
 import models
+from page_cache import (page_cache, competition_tag, gymnast_tag,
+                        season_tag, COMPETITIONS_TAG)
+from rankings import refresh_season_rankings
+from single_flight import flights
 from . import main
 from .login import admin_required
 
@@ -10,16 +14,22 @@ from .login import admin_required
 @admin_required
 def start_competition(competition_id):
     """Start a competition and set it as live."""
+    tags = [COMPETITIONS_TAG, competition_tag(competition_id)]
     current_live = models.Competitions.query.filter_by(status='live').first()
     if current_live:
         current_live.status = 'ended'
         current_live.ended_at = db.func.now()
+        models.Competitions.bump_scores_version(current_live.id)
+        tags.append(competition_tag(current_live.id))
 
     competition = models.Competitions.query.get_or_404(competition_id)
     competition.status = 'live'
     competition.started_at = db.func.now()
+    # The leaderboard API reports the status, so its ETag must change
+    models.Competitions.bump_scores_version(competition_id)
 
     db.session.commit()
+    page_cache.invalidate(*tags)
     flash(f'Competition "{competition.name}" is now live!', 'success')
     return redirect(url_for('main.competitions'))
 
@@ -31,8 +41,18 @@ def end_competition(competition_id):
     competition = models.Competitions.query.get_or_404(competition_id)
     competition.status = 'ended'
     competition.ended_at = db.func.now()
+    models.Competitions.bump_scores_version(competition_id)
+
+    # Settle the season rankings for everyone who competed
+    refresh_season_rankings(
+        [entry.gymnast_id for entry in competition.entries],
+        competition.season_id
+    )
+    tags = [COMPETITIONS_TAG, competition_tag(competition_id),
+            season_tag(competition.season.year)]
 
     db.session.commit()
+    page_cache.invalidate(*tags)
     flash(f'Competition "{competition.name}" has ended.', 'success')
     return redirect(url_for('main.competitions'))
 
@@ -44,26 +64,42 @@ def delete_competition(competition_id):
     competition = models.Competitions.query.get_or_404(competition_id)
     competition_name = competition.name
     
-    # Delete related entries first (due to foreign key constraints)
-    entries = models.Entries.query.filter_by(
-        competition_id=competition_id
-    ).all()
-    for entry in entries:
-        db.session.delete(entry)
-    
-    # Delete related scores
+    # Delete related scores first (due to foreign key constraints)
     scores = models.Scores.query.filter_by(
         competition_id=competition_id
     ).all()
     for score in scores:
         db.session.delete(score)
+
+    # Then the entries and their panel submissions
+    entries = models.Entries.query.filter_by(
+        competition_id=competition_id
+    ).all()
+    models.PanelScores.query.filter(
+        models.PanelScores.entry_id.in_([entry.id for entry in entries])
+    ).delete(synchronize_session=False)
+    for entry in entries:
+        db.session.delete(entry)
     
+    tags = [COMPETITIONS_TAG, competition_tag(competition_id),
+            season_tag(competition.season.year),
+            *(gymnast_tag(entry.gymnast_id) for entry in entries)]
+
     # Now delete the competition
     db.session.delete(competition)
+    db.session.flush()
+    refresh_season_rankings([entry.gymnast_id for entry in entries],
+                            competition.season_id)
     db.session.commit()
+    page_cache.invalidate(*tags)
     
     flash(f'Competition "{competition_name}" and all related data have been '
           f'deleted.', 'success')
     return redirect(url_for('main.competitions'))
 
 
+@main.route('/admin/coalescing')
+@admin_required
+def coalescing_stats():
+    """How many requests shared another request's computation, by kind."""
+    return jsonify(flights.stats())
@@ -3,10 +3,12 @@ from datetime import datetime, timedelta
 import calendar
 from extensions import db
 import models
+from page_cache import page_cache, competition_tag, COMPETITIONS_TAG
 from . import main
 
 
 @main.route('/calendar')
+@page_cache.cached(lambda: [COMPETITIONS_TAG])
 def calendar_view():
     # Get current date or date from query parameters
     year = request.args.get('year', datetime.now().year, type=int)
@@ -67,6 +69,9 @@ def calendar_view():
 
 
 @main.route('/competition/<int:competition_id>')
+@page_cache.cached(
+    lambda competition_id: [competition_tag(competition_id)]
+)
 def competition_details(competition_id):
     """Display detailed information about a specific competition."""
     competition = models.Competitions.query.get_or_404(competition_id)
@@ -76,29 +81,14 @@ def competition_details(competition_id):
         competition_id=competition_id
     ).count()
 
-    # Level ordering case for proper sorting
-    level_order_case = db.case(
-        (models.Gymnasts.level == 'Level 1', 1),
-        (models.Gymnasts.level == 'Level 2', 2),
-        (models.Gymnasts.level == 'Level 3', 3),
-        (models.Gymnasts.level == 'Level 4', 4),
-        (models.Gymnasts.level == 'Level 5', 5),
-        (models.Gymnasts.level == 'Level 6', 6),
-        (models.Gymnasts.level == 'Level 7', 7),
-        (models.Gymnasts.level == 'Level 8', 8),
-        (models.Gymnasts.level == 'Level 9', 9),
-        (models.Gymnasts.level == 'Junior Inter', 10),
-        (models.Gymnasts.level == 'Senior Inter', 11),
-        else_=999
-    )
-
     # Get entries with gymnast and club details, ordered by level
     entries = db.session.query(models.Entries, models.Gymnasts, models.Clubs)\
         .join(models.Gymnasts,
               models.Entries.gymnast_id == models.Gymnasts.id)\
         .join(models.Clubs, models.Gymnasts.club_id == models.Clubs.id)\
+        .join(models.Levels, models.Gymnasts.level_id == models.Levels.id)\
         .filter(models.Entries.competition_id == competition_id)\
-        .order_by(level_order_case, models.Gymnasts.name)\
+        .order_by(models.Levels.sort_order, models.Gymnasts.name)\
         .all()
 
     return render_template(
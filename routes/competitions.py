@@ -3,6 +3,7 @@ from datetime import datetime
 from extensions import db
 import models
 import forms
+from page_cache import page_cache, COMPETITIONS_TAG
 from .login import login_required
 from . import main
 
@@ -35,6 +36,7 @@ def competitions():
 
         db.session.add(new_competition)
         db.session.commit()
+        page_cache.invalidate(COMPETITIONS_TAG)
         flash('Competition added successfully!', 'success')
         return redirect(url_for('main.competitions'))
 
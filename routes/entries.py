@@ -2,6 +2,9 @@ from flask import render_template, redirect, url_for, session, flash
 from extensions import db
 import models
 import forms
+from page_cache import page_cache, competition_tag, score_tags
+from rankings import refresh_season_rankings
+from scores import clear_panel
 from . import main
 
 
@@ -40,11 +43,11 @@ def entries():
     # Get additional data needed for template
     clubs = models.Clubs.query.order_by(models.Clubs.name).all()
 
-    # Get unique levels
+    # Levels that have gymnasts, in competition order
     levels = (
-        db.session.query(models.Gymnasts.level)
-        .distinct()
-        .order_by(models.Gymnasts.level)
+        db.session.query(models.Levels.name)
+        .filter(models.Levels.id.in_(db.select(models.Gymnasts.level_id)))
+        .order_by(models.Levels.sort_order)
         .all()
     )
     levels = [level[0] for level in levels]
@@ -114,30 +117,46 @@ def entries():
 
             added, duplicates, missing = [], [], []
 
+            # Two queries for the whole selection, not two per gymnast
+            selected = {
+                gymnast.id: gymnast for gymnast in models.Gymnasts.query
+                .filter(models.Gymnasts.id.in_(gymnast_ids))
+            }
+            entered = {
+                gymnast_id for (gymnast_id,) in db.session.query(
+                    models.Entries.gymnast_id
+                ).filter(
+                    models.Entries.competition_id == form.competition_id.data,
+                    models.Entries.gymnast_id.in_(gymnast_ids)
+                )
+            }
+
             for gid in gymnast_ids:
-                gymnast = models.Gymnasts.query.get(gid)
+                gymnast = selected.get(gid)
                 if not gymnast:
                     missing.append(str(gid))
                     continue
 
-                existing_entry = models.Entries.query.filter_by(
-                    competition_id=form.competition_id.data,
-                    gymnast_id=gid
-                ).first()
-
-                if existing_entry:
+                if gid in entered:
                     duplicates.append(gymnast.name)
                     continue
 
                 new_entry = models.Entries(
                     competition_id=form.competition_id.data,
-                    gymnast_id=gid
+                    gymnast_id=gid,
+                    totals=models.EntryTotals()
                 )
                 db.session.add(new_entry)
                 added.append(gymnast.name)
 
             if added:
+                models.Competitions.bump_scores_version(
+                    form.competition_id.data
+                )
                 db.session.commit()
+                page_cache.invalidate(
+                    competition_tag(form.competition_id.data)
+                )
                 flash(
                     f"Added {len(added)} gymnast(s) to "
                     f"{selected_competition.name}: " + ', '.join(added),
@@ -198,18 +217,24 @@ def delete_entry(entry_id):
 
     entry = models.Entries.query.get_or_404(entry_id)
     
-    # Delete related scores first
+    # Delete related scores and panel submissions first
     scores = models.Scores.query.filter_by(entry_id=entry_id).all()
     for score in scores:
         db.session.delete(score)
+    clear_panel(entry_id)
     
     # Store info for flash message
     gymnast_name = entry.gymnasts.name
     competition_name = entry.competitions.name
+    tags = score_tags(entry.competitions, [entry.gymnast_id])
     
     # Delete the entry
     db.session.delete(entry)
+    refresh_season_rankings([entry.gymnast_id],
+                            entry.competitions.season_id)
+    models.Competitions.bump_scores_version(entry.competition_id)
     db.session.commit()
+    page_cache.invalidate(*tags)
     
     flash(f'Entry for {gymnast_name} in {competition_name} has been deleted.',
           'success')
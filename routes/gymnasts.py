@@ -2,6 +2,7 @@ from flask import render_template, redirect, url_for, session, flash, request
 from extensions import db
 import models
 import forms
+from page_cache import page_cache, gymnast_tags
 from .login import login_required
 from . import main
 
@@ -16,9 +17,17 @@ def gymnasts():
         return redirect(url_for('main.home'))
 
     # Get all gymnasts with their club information
-    gymnasts = models.Gymnasts.query.order_by(models.Gymnasts.name).all()
+    gymnasts = models.Gymnasts.query.options(
+        db.joinedload(models.Gymnasts.clubs)
+    ).order_by(models.Gymnasts.name).all()
 
-    return render_template('view_gymnasts.html', gymnasts=gymnasts)
+    levels = [
+        name for (name,) in db.session.query(models.Levels.name)
+        .order_by(models.Levels.sort_order)
+    ]
+
+    return render_template('view_gymnasts.html', gymnasts=gymnasts,
+                           levels=levels)
 
 
 @main.route('/gymnasts/<int:gymnast_id>/delete', methods=['POST'])
@@ -33,9 +42,11 @@ def delete_gymnast(gymnast_id):
     try:
         gymnast = models.Gymnasts.query.get_or_404(gymnast_id)
         gymnast_name = gymnast.name
+        tags = gymnast_tags(gymnast_id)
         
         db.session.delete(gymnast)
         db.session.commit()
+        page_cache.invalidate(*tags)
         
         flash(f'Gymnast "{gymnast_name}" deleted successfully!', 'success')
     except Exception as e:
@@ -149,7 +160,9 @@ def admin_edit_gymnast_bio(gymnast_id):
             gymnast.club_id = club.id
         
         # Update level
-        if form.level.data:
+        # Scores keep the level they were recorded at, so rankings are
+        # unaffected
+        if form.level.data and form.level.data != gymnast.level:
             gymnast.level = form.level.data
         
         # Update age
@@ -167,7 +180,9 @@ def admin_edit_gymnast_bio(gymnast_id):
         gymnast.injuries = form.injuries.data
         
         try:
+            tags = gymnast_tags(gymnast.id)
             db.session.commit()
+            page_cache.invalidate(*tags)
             flash(f'Bio updated successfully for {gymnast.name}!', 'success')
             return redirect(url_for('main.gymnasts'))
         except Exception as e:
@@ -1,10 +1,12 @@
 from flask import render_template, session, redirect, url_for
 from datetime import datetime
 import models
+from page_cache import page_cache, COMPETITIONS_TAG
 from . import main
 
 
 @main.route('/')
+@page_cache.cached(lambda: [COMPETITIONS_TAG])
 def home():
     # If user is logged in, redirect to dashboard
     if 'user_id' in session:
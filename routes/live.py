@@ -1,11 +1,75 @@
-from flask import render_template, request
+import json
+import queue
+import threading
+import time
+from flask import (render_template, request, current_app, Response,
+                   stream_with_context, jsonify, abort)
 from extensions import db
 import models
+from leaderboard import (get_live_board, build_board, ranked,
+                         rows_to_dicts, ALL_AROUND)
+from page_cache import page_cache, COMPETITIONS_TAG
 from .login import login_required
 from . import main
 
 
+def _apparatus_key(selected_apparatus_id):
+    """Map the ``apparatus`` query arg to a leaderboard key (None if bad)."""
+    if not selected_apparatus_id or selected_apparatus_id == 'all_around':
+        return ALL_AROUND
+    try:
+        return int(selected_apparatus_id)
+    except ValueError:
+        return None
+
+
+class _StreamSlots:
+    """Streams open in this process, up to ``LIVE_STREAM_MAX_CLIENTS``.
+
+    Every open stream holds a worker thread for its whole life, so past
+    the limit spectators poll the JSON API instead and judges' requests
+    still find a free worker.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+
+    def take(self, limit):
+        """Claim a slot; False when ``limit`` streams are already open."""
+        with self._lock:
+            if self.open >= limit:
+                return False
+            self.open += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.open -= 1
+
+
+stream_slots = _StreamSlots()
+
+
+def _sse(event, data):
+    """Format one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _live_version():
+    """The live competition's id and scores version, or None.
+
+    Part of the page cache key, so every worker serves a page built from
+    the current scores whichever worker recorded them.
+    """
+    row = db.session.query(
+        models.Competitions.id, models.Competitions.scores_version
+    ).filter_by(status='live').first()
+    return tuple(row) if row else None
+
+
 @main.route('/live')
+@page_cache.cached(lambda: [COMPETITIONS_TAG], vary=_live_version)
 def live():
     selected_level = request.args.get('level')
     selected_apparatus_id = request.args.get('apparatus')
@@ -18,77 +82,23 @@ def live():
     if not live_competition:
         return render_template('live.html', no_live_competition=True)
 
-    # Fetch all distinct levels from the live competition
-    levels = db.session.query(
-        models.Gymnasts.level
-    ).join(models.Entries).filter(
-        models.Entries.competition_id == live_competition.id
-    ).distinct().order_by(models.Gymnasts.level).all()
-    levels = [lvl[0] for lvl in levels]
-
-    desired_order = [
-        'Level 1', 'Level 2', 'Level 3', 'Level 4', 'Level 5',
-        'Level 6', 'Level 7', 'Level 8', 'Level 9',
-        'Junior International', 'Senior International'
-    ]
+    # Standings are kept in memory and updated as judges submit scores
+    board = get_live_board(live_competition)
 
-    # Sort levels to match the desired order
-    levels = sorted(levels, key=lambda x: desired_order.index(x)
-                    if x in desired_order else 100)
+    # Levels entered in the live competition, in competition order
+    levels = board.levels()
 
     apparatus_list = models.Apparatus.query.all()
 
     leaderboard_data = []
 
     if selected_level:
-        if selected_apparatus_id and selected_apparatus_id != 'all_around':
-
-            leaderboard_data = (
-                db.session.query(models.Scores, models.Gymnasts, models.Clubs)
-                .join(models.Entries,
-                      models.Scores.entry_id == models.Entries.id)
-                .join(models.Gymnasts,
-                      models.Entries.gymnast_id == models.Gymnasts.id
-                      )
-                .join(models.Clubs, models.Gymnasts.club_id == models.Clubs.id)
-                .filter(models.Entries.competition_id == live_competition.id)
-                .filter(models.Gymnasts.level == selected_level)
-                .filter(models.Scores.apparatus_id == selected_apparatus_id)
-                .order_by(models.Scores.total.desc())
-                .all()
-            )
-        else:
-            # Show all-around scores (total of all apparatus)
-            # or when no apparatus selected
-            # Get all gymnasts for the selected level with their
-            # total scores across all apparatus
-            leaderboard_data = (
-                db.session.query(
-                    models.Gymnasts.id,
-                    models.Gymnasts.name,
-                    models.Gymnasts.level,
-                    models.Clubs.name.label('club_name'),
-                    db.func.sum(models.Scores.e_score).label('total_e_score'),
-                    db.func.sum(models.Scores.d_score).label('total_d_score'),
-                    db.func.sum(models.Scores.penalty).label('total_penalty'),
-                    db.func.sum(models.Scores.total).label('total_score')
-                )
-                .join(models.Entries,
-                      models.Entries.gymnast_id == models.Gymnasts.id)
-                .join(models.Clubs, models.Gymnasts.club_id == models.Clubs.id)
-                .join(models.Scores,
-                      models.Scores.entry_id == models.Entries.id)
-                .filter(models.Entries.competition_id == live_competition.id)
-                .filter(models.Gymnasts.level == selected_level)
-                .group_by(
-                    models.Gymnasts.id,
-                    models.Gymnasts.name,
-                    models.Gymnasts.level,
-                    models.Clubs.name
-                )
-                .order_by(db.func.sum(models.Scores.total).desc())
-                .all()
-            )
+        apparatus_key = _apparatus_key(selected_apparatus_id)
+        if apparatus_key is not None:
+            # (rank, row) pairs; tied totals share a rank
+            leaderboard_data = list(ranked(
+                board.standings(selected_level, apparatus_key)
+            ))
 
     return render_template(
             'live.html',
@@ -99,3 +109,134 @@ def live():
             leaderboard_data=leaderboard_data,
             live_competition=live_competition
         )
+
+
+@main.route('/live/stream')
+def live_stream():
+    """Push leaderboard changes for one level/apparatus as they happen.
+
+    The first message is a full snapshot; after that only rows that were
+    added, changed or re-ranked are sent, plus the entries that dropped
+    off the board. A worker holds at most ``LIVE_STREAM_MAX_CLIENTS``
+    streams; past that (and when there is nothing to stream) the answer is
+    204, and the page polls ``/api/live/<id>/leaderboard`` instead.
+    """
+    selected_level = request.args.get('level')
+    apparatus_key = _apparatus_key(request.args.get('apparatus'))
+
+    live_competition = models.Competitions.query.filter_by(
+        status='live'
+        ).first()
+
+    # 204 tells EventSource clients to stop reconnecting
+    if not live_competition or not selected_level or apparatus_key is None:
+        return Response(status=204)
+    if not stream_slots.take(
+        current_app.config.get('LIVE_STREAM_MAX_CLIENTS', 0)
+    ):
+        return Response(status=204)
+
+    heartbeat = current_app.config.get('LIVE_STREAM_HEARTBEAT', 15)
+    lifetime = current_app.config.get('LIVE_STREAM_MAX_SECONDS', 300)
+
+    try:
+        board = get_live_board(live_competition)
+        subscriber, rows = board.subscribe(selected_level, apparatus_key)
+    except Exception:
+        stream_slots.release()
+        raise
+
+    # Don't hold a pooled connection for the life of the stream
+    db.session.close()
+
+    def generate():
+        try:
+            # Clients reconnect a few seconds after the stream is recycled
+            yield "retry: 3000\n\n"
+            yield _sse('snapshot', {'rows': rows_to_dicts(rows)})
+
+            deadline = time.time() + lifetime
+            while time.time() < deadline:
+                try:
+                    kind, data = subscriber.events.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    board.refresh()
+                    db.session.close()
+                    continue
+
+                if kind == 'end':
+                    yield _sse('end', {})
+                    return
+                if kind == 'resync':
+                    current = board.standings(selected_level, apparatus_key)
+                    yield _sse('snapshot', {'rows': rows_to_dicts(current)})
+                    continue
+                yield _sse('delta', data)
+        finally:
+            board.unsubscribe(subscriber)
+
+    def close():
+        # Runs even if the client left before the first message
+        board.unsubscribe(subscriber)
+        stream_slots.release()
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+        }
+    )
+    response.call_on_close(close)
+    return response
+
+
+@main.route('/api/live/<int:competition_id>/leaderboard')
+def live_leaderboard_api(competition_id):
+    """JSON leaderboard for scoreboard displays and polling clients.
+
+    The ETag is derived from the competition's ``scores_version``, so a
+    client sending ``If-None-Match`` gets a 304 after a single primary-key
+    lookup whenever no score, entry or status has changed.
+    """
+    selected_level = request.args.get('level')
+    selected_apparatus_id = request.args.get('apparatus') or 'all_around'
+    apparatus_key = _apparatus_key(selected_apparatus_id)
+    if apparatus_key is None:
+        abort(400)
+
+    competition = models.Competitions.query.get_or_404(competition_id)
+
+    etag = (
+        f"c{competition.id}-v{competition.scores_version}"
+        f"-{selected_level or ''}-{selected_apparatus_id}"
+    )
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    if competition.status == 'live':
+        board = get_live_board(competition)
+    else:
+        board = build_board(competition)
+
+    rows = []
+    if selected_level:
+        rows = rows_to_dicts(board.standings(selected_level, apparatus_key))
+
+    response = jsonify({
+        'competition_id': competition.id,
+        'version': competition.scores_version,
+        'status': competition.status,
+        'levels': board.levels(),
+        'level': selected_level,
+        'apparatus': selected_apparatus_id,
+        'rows': rows,
+    })
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -5,6 +5,7 @@ from extensions import db
 from models import Users, Gymnasts, AthleteApplications, Clubs
 from forms import (RegistorForm, LoginForm, EditGymnastProfileForm,
                    AthleteApplicationForm)
+from page_cache import page_cache, gymnast_tags
 from . import main
 
 
@@ -149,7 +150,9 @@ def edit_profile():
             linked_gymnast.club_id = club.id
         
         # Update level
-        if form.level.data:
+        # Scores keep the level they were recorded at, so rankings are
+        # unaffected
+        if form.level.data and form.level.data != linked_gymnast.level:
             linked_gymnast.level = form.level.data
         
         # Update age
@@ -167,7 +170,9 @@ def edit_profile():
         linked_gymnast.injuries = form.injuries.data
 
         try:
+            tags = gymnast_tags(linked_gymnast.id)
             db.session.commit()
+            page_cache.invalidate(*tags)
             flash('Profile updated successfully!', 'success')
             return redirect(url_for('main.dashboard'))
         except Exception:
@@ -259,7 +264,9 @@ def review_applications():
         flash('Access denied. Admin only.', 'error')
         return redirect(url_for('main.dashboard'))
     
-    pending_apps = AthleteApplications.query.filter_by(status='pending').all()
+    pending_apps = AthleteApplications.query.filter_by(
+        status='pending'
+    ).order_by(AthleteApplications.submitted_at).all()
     
     return render_template('admin_applications.html', applications=pending_apps)
 
@@ -0,0 +1,20 @@
+"""Metrics for Prometheus"""
+from flask import Response, abort, request, session
+import metrics
+from . import main
+
+
+def _may_scrape():
+    """Admins, and scrapers on this host that did not come via a proxy."""
+    if session.get('role_id') == 1:
+        return True
+    return (request.remote_addr in ('127.0.0.1', '::1')
+            and 'X-Forwarded-For' not in request.headers)
+
+
+@main.route('/metrics')
+def prometheus_metrics():
+    if not _may_scrape():
+        abort(403)
+    return Response(metrics.render(),
+                    mimetype='text/plain; version=0.0.4')
@@ -1,89 +1,109 @@
 from flask import render_template, redirect, url_for, session, flash, request
 from extensions import db
 import models
+from page_cache import page_cache, gymnast_tag
+from stale_cache import stale_cache
 from . import main
 
 
+def _best_scores(gymnast_id):
+    """A gymnast's best all-around total and best score per apparatus.
+
+    Returns plain rows, so the result can be computed outside a request.
+    """
+    best_per_app = (
+        db.session.query(
+            models.Scores.gymnast_id.label('id'),
+            models.Scores.apparatus_id,
+            db.func.max(models.Scores.total).label('best_score')
+        )
+        .filter(models.Scores.gymnast_id == gymnast_id)
+        .group_by(models.Scores.gymnast_id, models.Scores.apparatus_id)
+        .subquery()
+    )
+
+    # One row: best_per_app only holds this gymnast's scores
+    all_around_data = (
+        db.session.query(
+            models.Gymnasts.id,
+            models.Gymnasts.name,
+            models.Clubs.name.label('club_name'),
+            db.func.sum(best_per_app.c.best_score).label('total_score')
+        )
+        .join(best_per_app, best_per_app.c.id == models.Gymnasts.id)
+        .join(models.Clubs, models.Clubs.id == models.Gymnasts.club_id)
+        .group_by(
+            models.Gymnasts.id,
+            models.Gymnasts.name,
+            models.Clubs.name
+        )
+        .all()
+    )
+
+    # The best-total routine on each apparatus, with the E, D and penalty
+    # it was scored with
+    best = (
+        db.session.query(
+            models.Scores.gymnast_id,
+            models.Scores.apparatus_id,
+            models.Scores.e_score,
+            models.Scores.d_score,
+            models.Scores.penalty,
+            models.Scores.total,
+            db.func.row_number().over(
+                partition_by=models.Scores.apparatus_id,
+                order_by=(models.Scores.total.desc(), models.Scores.id)
+            ).label('pick')
+        )
+        .filter(models.Scores.gymnast_id == gymnast_id)
+        .subquery()
+    )
+    best_routines = (
+        db.session.query(
+            models.Apparatus.name.label('apparatus'),
+            models.Gymnasts.id,
+            models.Gymnasts.name,
+            models.Clubs.name.label('club_name'),
+            best.c.e_score,
+            best.c.d_score,
+            best.c.penalty,
+            best.c.total
+        )
+        .select_from(best)
+        .join(models.Gymnasts, models.Gymnasts.id == best.c.gymnast_id)
+        .join(models.Clubs, models.Clubs.id == models.Gymnasts.club_id)
+        .join(models.Apparatus, models.Apparatus.id == best.c.apparatus_id)
+        .filter(best.c.pick == 1)
+        .all()
+    )
+
+    # Every apparatus is listed, with no rows where there is no score
+    apparatus_data = {
+        name: [] for (name,) in db.session.query(
+            models.Apparatus.name
+        ).order_by(models.Apparatus.id)
+    }
+    for row in best_routines:
+        apparatus_data[row.apparatus].append(row)
+    return all_around_data, apparatus_data
+
+
 @main.route('/gymnast/<int:gymnast_id>')
+@page_cache.cached(lambda gymnast_id: [gymnast_tag(gymnast_id)])
 def gymnast_profile(gymnast_id):
     # Get the specific gymnast or return 404 if not found
     gymnast = models.Gymnasts.query.get_or_404(gymnast_id)
 
     # TODO: Add queries for:
-    # - Best scores per apparatus
     # - Competition history
     # - Recent results
 
-    apparatus_list = models.Apparatus.query.all()
-    apparatus_data = {}
-    all_around_data = []
-
-    if gymnast.id:
-
-        best_per_app = (
-            db.session.query(
-                models.Gymnasts.id,
-                models.Scores.apparatus_id,
-                db.func.max(models.Scores.total).label('best_score')
-            )
-            .join(
-                models.Entries,
-                models.Entries.gymnast_id == models.Gymnasts.id
-                )
-            .join(
-                models.Scores,
-                models.Scores.entry_id == models.Entries.id
-                )
-            .filter(models.Gymnasts.id == gymnast.id)
-            .subquery()
-        )
-
-        all_around_data = (
-            db.session.query(
-                models.Gymnasts.id,
-                models.Gymnasts.name,
-                models.Clubs.name.label('club_name'),
-                db.func.sum(best_per_app.c.best_score).label('total_score')
-            )
-            .join(best_per_app, best_per_app.c.id == models.Gymnasts.id)
-            .join(models.Clubs, models.Clubs.id == models.Gymnasts.club_id)
-            .group_by(
-                models.Gymnasts.id,
-                models.Gymnasts.name,
-                models.Clubs.name
-            )
-            .order_by(db.func.sum(best_per_app.c.best_score).desc())
-            .limit(24)
-            .all()
-        )
-
-        for apparatus in apparatus_list:
-            apparatus_data[apparatus.name] = (
-                db.session.query(
-                    models.Gymnasts.id,
-                    models.Gymnasts.name,
-                    models.Clubs.name.label('club_name'),
-                    db.func.max(models.Scores.e_score).label('e_score'),
-                    db.func.max(models.Scores.d_score).label('d_score'),
-                    db.func.max(models.Scores.penalty).label('penalty'),
-                    db.func.max(models.Scores.total).label('total')
-                )
-                .join(models.Entries,
-                      models.Entries.gymnast_id == models.Gymnasts.id
-                      )
-                .join(models.Scores,
-                      models.Scores.entry_id == models.Entries.id
-                      )
-                .join(models.Clubs, models.Clubs.id == models.Gymnasts.club_id)
-                .filter(models.Gymnasts.id == gymnast.id)
-                .group_by(models.Gymnasts.id,
-                          models.Gymnasts.name,
-                          models.Clubs.name
-                          )
-                .order_by(db.func.max(models.Scores.total).desc())
-                .limit(8)
-                .all()
-            )
+    # Served from the cache, refreshed in the background once it is a few
+    # seconds old and purged when the gymnast's scores change
+    all_around_data, apparatus_data = stale_cache.get(
+        ('profile', gymnast.id), [gymnast_tag(gymnast.id)],
+        lambda: _best_scores(gymnast_id)
+    )
 
     return render_template('profiles.html',
                            gymnast=gymnast,
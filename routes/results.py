@@ -1,11 +1,241 @@
-from flask import render_template, request
+import base64
+import csv
+import io
+import json
+from collections import namedtuple
+from flask import (render_template, request, abort, Response,
+                   stream_with_context)
 from extensions import db
 import models
 import forms
+from search import results_filter
+from single_flight import flights
 from .login import login_required
 from . import main
 
 
+# One page of results. Pages are addressed by opaque cursors rather than
+# page numbers so that deep pages cost the same as the first one.
+ResultsPage = namedtuple(
+    'ResultsPage',
+    'items per_page total has_prev has_next prev_cursor next_cursor'
+)
+
+# Rows shown at once for "All". Bigger result sets page on from there,
+# so "All" costs no more than any other page; the export has everything.
+ALL_PAGE_SIZE = 1000
+
+
+def _join_results(query):
+    """Join scores to everything shown in a results row."""
+    return (
+        query
+        .join(models.Entries, models.Scores.entry_id == models.Entries.id)
+        .join(models.Gymnasts, models.Entries.gymnast_id == models.Gymnasts.id)
+        .join(models.Clubs, models.Gymnasts.club_id == models.Clubs.id)
+        .join(models.Levels, models.Gymnasts.level_id == models.Levels.id)
+        .join(
+            models.Competitions,
+            models.Entries.competition_id == models.Competitions.id
+        )
+        .join(
+            models.Apparatus,
+            models.Scores.apparatus_id == models.Apparatus.id
+        )
+    )
+
+
+def _result_columns():
+    """The plain columns of a results row, named as in the export."""
+    return (
+        models.Scores.id.label('score_id'),
+        models.Entries.id.label('entry_id'),
+        models.Competitions.name.label('competition'),
+        models.Gymnasts.id.label('gymnast_id'),
+        models.Gymnasts.name.label('gymnast'),
+        models.Clubs.name.label('club'),
+        models.Levels.name.label('level'),
+        models.Apparatus.name.label('apparatus'),
+        models.Scores.e_score,
+        models.Scores.d_score,
+        models.Scores.penalty,
+        models.Scores.total,
+    )
+
+
+def _sort_map():
+    """Sortable results columns keyed by the ``sort_by`` argument."""
+    return {
+        'total': models.Scores.total,
+        'e_score': models.Scores.e_score,
+        'd_score': models.Scores.d_score,
+        'penalty': models.Scores.penalty,
+        'gymnast_name': models.Gymnasts.name,
+        'club_name': models.Clubs.name,
+        'competition_name': models.Competitions.name,
+        'apparatus_name': models.Apparatus.name,
+        'level': models.Levels.sort_order,
+        'id': models.Gymnasts.id,
+        'entry_id': models.Entries.id,
+    }
+
+
+def _ordering(sort_col, sort_order):
+    """ORDER BY clauses for a sort, with Scores.id as the tiebreaker."""
+    if sort_order == 'desc':
+        return db.desc(sort_col), models.Scores.id.desc()
+    return db.asc(sort_col), models.Scores.id.asc()
+
+
+def _encode_cursor(sort_by, sort_order, direction, sort_value, score_id):
+    """Pack the position of a boundary row into an opaque token."""
+    payload = json.dumps(
+        [sort_by, sort_order, direction, sort_value, score_id],
+        separators=(',', ':')
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(token, sort_by, sort_order):
+    """Return (direction, sort_value, score_id), or None if unusable.
+
+    Tokens minted for a different sort are ignored so changing the sort
+    starts again from the first page.
+    """
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        token_sort_by, token_order, direction, sort_value, score_id = data
+    except (ValueError, TypeError):
+        return None
+    if (token_sort_by, token_order) != (sort_by, sort_order):
+        return None
+    if direction not in ('next', 'prev'):
+        return None
+    # A tampered token must not put nulls, lists, objects or booleans into
+    # the keyset filter; every sort column is NOT NULL
+    for value, types in ((sort_value, (str, int, float)), (score_id, int)):
+        if not isinstance(value, types) or isinstance(value, bool):
+            return None
+    return direction, sort_value, score_id
+
+
+def _approximate_total():
+    """Cheap estimate of the number of scores, or None if unavailable.
+
+    MySQL keeps a row estimate in information_schema; elsewhere the scores
+    table alone is counted, which avoids the joins of the results query.
+    """
+    try:
+        if db.engine.dialect.name == 'mysql':
+            return db.session.execute(db.text(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'scores'"
+            )).scalar()
+        return db.session.query(db.func.count(models.Scores.id)).scalar()
+    except Exception:
+        return None
+
+
+def _keyset_page(query, sort_by, sort_order, sort_col, per_page, cursor):
+    """Fetch one page after/before ``cursor`` using a keyset predicate.
+
+    Rows are ordered by the sort column with ``Scores.id`` as a stable
+    tiebreaker, and the page boundary is a (sort value, id) pair, so the
+    database seeks straight to it instead of counting and skipping rows.
+    """
+    position = _decode_cursor(cursor, sort_by, sort_order)
+    descending = sort_order == 'desc'
+    direction = position[0] if position else 'next'
+
+    # Walking backwards means reading the opposite order and flipping
+    reverse = direction == 'prev'
+    scan_desc = descending != reverse
+
+    query = query.add_columns(sort_col.label('sort_key'))
+    if position:
+        _, sort_value, score_id = position
+        if scan_desc:
+            query = query.filter(db.or_(
+                sort_col < sort_value,
+                db.and_(sort_col == sort_value,
+                        models.Scores.id < score_id)
+            ))
+        else:
+            query = query.filter(db.or_(
+                sort_col > sort_value,
+                db.and_(sort_col == sort_value,
+                        models.Scores.id > score_id)
+            ))
+
+    if scan_desc:
+        query = query.order_by(db.desc(sort_col), models.Scores.id.desc())
+    else:
+        query = query.order_by(db.asc(sort_col), models.Scores.id.asc())
+
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if reverse:
+        rows.reverse()
+
+    if reverse:
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = position is not None, has_more
+
+    prev_cursor = next_cursor = None
+    if rows:
+        first, last = rows[0], rows[-1]
+        if has_prev:
+            prev_cursor = _encode_cursor(sort_by, sort_order, 'prev',
+                                         first.sort_key, first.score_id)
+        if has_next:
+            next_cursor = _encode_cursor(sort_by, sort_order, 'next',
+                                         last.sort_key, last.score_id)
+
+    return rows, has_prev, has_next, prev_cursor, next_cursor
+
+
+def _results_page(search_query, sort_by, sort_order, per_page, cursor):
+    """Build one page of results as plain rows.
+
+    The rows are immutable tuples rather than ORM objects, so a page can
+    be shared between requests.
+    """
+    query = _join_results(
+        db.session.query(*_result_columns()).select_from(models.Scores)
+    )
+
+    # Search filter: every word must prefix-match an indexed name
+    # (or, for numbers, equal a gymnast/entry id)
+    if search_query:
+        query = query.filter(results_filter(search_query))
+
+    sort_col = _sort_map()[sort_by]
+
+    show_all = per_page == -1
+    page_size = ALL_PAGE_SIZE if show_all else per_page
+    items, has_prev, has_next, prev_cursor, next_cursor = _keyset_page(
+        query, sort_by, sort_order, sort_col, page_size, cursor
+    )
+    if show_all and not (has_prev or has_next):
+        # Everything fit on the page, so the count is exact
+        total = len(items)
+    elif search_query:
+        # Only an estimate, and only when it doesn't need the search
+        total = None
+    else:
+        total = _approximate_total()
+    return ResultsPage(
+        items=items, per_page=page_size, total=total,
+        has_prev=has_prev, has_next=has_next,
+        prev_cursor=prev_cursor, next_cursor=next_cursor
+    )
+
+
 @main.route('/results')
 @login_required
 def results():
@@ -38,105 +268,21 @@ def results():
     per_page = form.per_page.data if form.per_page.data is not None else 5
     sort_by = form.sort_by.data or 'total'
     sort_order = form.sort_order.data or request.args.get('sort_order', 'desc')
+    if sort_order not in ('asc', 'desc'):
+        sort_order = 'desc'
 
-    query = (
-        models.Scores.query
-        .join(models.Entries, models.Scores.entry_id == models.Entries.id)
-        .join(models.Gymnasts, models.Entries.gymnast_id == models.Gymnasts.id)
-        .join(models.Clubs, models.Gymnasts.club_id == models.Clubs.id)
-        .join(
-            models.Competitions,
-            models.Entries.competition_id == models.Competitions.id
-        )
-        .join(
-            models.Apparatus,
-            models.Scores.apparatus_id == models.Apparatus.id
-        )
-        .options(
-            db.joinedload(models.Scores.entry)
-              .joinedload(models.Entries.gymnasts)
-              .joinedload(models.Gymnasts.clubs),
-            db.joinedload(models.Scores.entry)
-              .joinedload(models.Entries.competitions),
-            db.joinedload(models.Scores.apparatus),
-        )
-    )
-
-    # Search filter
-    if search_query:
-        like = f"%{search_query}%"
-        query = query.filter(
-            db.or_(
-                models.Gymnasts.name.ilike(like),
-                models.Clubs.name.ilike(like),
-                models.Competitions.name.ilike(like),
-                models.Apparatus.name.ilike(like),
-                models.Gymnasts.level.ilike(like),
-                db.cast(models.Entries.id, db.String).ilike(like),
-                db.cast(models.Gymnasts.id, db.String).ilike(like),
-            )
-        )
-
-    # Sorting
-    # for others use columns/related columns
-    total_expr = (
-        models.Scores.e_score + models.Scores.d_score - models.Scores.penalty
-    )
+    if sort_by not in _sort_map():
+        sort_by = 'total'
 
-    level_order_case = db.case(
-        (models.Gymnasts.level == 'Level 1', 1),
-        (models.Gymnasts.level == 'Level 2', 2),
-        (models.Gymnasts.level == 'Level 3', 3),
-        (models.Gymnasts.level == 'Level 4', 4),
-        (models.Gymnasts.level == 'Level 5', 5),
-        (models.Gymnasts.level == 'Level 6', 6),
-        (models.Gymnasts.level == 'Level 7', 7),
-        (models.Gymnasts.level == 'Level 8', 8),
-        (models.Gymnasts.level == 'Level 9', 9),
-        (models.Gymnasts.level == 'Junior Inter', 10),
-        (models.Gymnasts.level == 'Senior Inter', 11),
-        else_=999
-    )
-
-    sort_map = {
-        'total': total_expr,
-        'e_score': models.Scores.e_score,
-        'd_score': models.Scores.d_score,
-        'penalty': models.Scores.penalty,
-        'gymnast_name': models.Gymnasts.name,
-        'club_name': models.Clubs.name,
-        'competition_name': models.Competitions.name,
-        'apparatus_name': models.Apparatus.name,
-        'level': level_order_case,
-        'id': models.Gymnasts.id,
-        'entry_id': models.Entries.id,
-    }
-    sort_col = sort_map.get(sort_by, total_expr)
-    query = query.order_by(
-        db.desc(sort_col) if sort_order == 'desc' else db.asc(sort_col)
+    # Identical requests arriving together (a results link shared with a
+    # whole club) wait for one query instead of running their own
+    cursor = request.args.get('cursor')
+    page = flights.do(
+        ('results', search_query, sort_by, sort_order, per_page, cursor),
+        lambda: _results_page(search_query, sort_by, sort_order, per_page,
+                              cursor)
     )
 
-    # Pagination
-    if per_page == -1:  # show all
-        results = query.all()
-        pagination = None
-    else:
-        page = request.args.get('page', 1, type=int)
-        try:
-            pagination = query.paginate(
-                page=page,
-                per_page=per_page,
-                error_out=False
-            )
-        except AttributeError:
-            pagination = db.paginate(
-                query,
-                page=page,
-                per_page=per_page,
-                error_out=False
-            )
-        results = pagination.items
-
     return render_template(
         'results.html',
         search_query=search_query,
@@ -144,17 +290,84 @@ def results():
         current_sort_order=sort_order,
         per_page=per_page,
         form=form,
-        results=pagination if pagination else type('obj', (object,), {
-            'items': results,
-            'page': 1,
-            'pages': 1,
-            'per_page': len(results),
-            'total': len(results),
-            'has_prev': False,
-            'has_next': False,
-            'prev_num': None,
-            'next_num': None
-        })(),
+        results=page,
         pagination_options=pagination_options,
         sort_options=sort_options,
     )
+
+
+EXPORT_COLUMNS = [
+    'score_id', 'entry_id', 'competition', 'gymnast_id', 'gymnast',
+    'club', 'level', 'apparatus', 'e_score', 'd_score', 'penalty', 'total',
+]
+
+# Rows fetched from the server-side cursor (and written) per chunk
+EXPORT_BATCH_SIZE = 500
+
+
+@main.route('/results/export.<fmt>')
+@login_required
+def export_results(fmt):
+    """Stream every result matching the search and sort as CSV or NDJSON.
+
+    Rows are read as plain columns through a server-side cursor in
+    batches, so memory stays flat and the download starts immediately
+    however large the season is.
+    """
+    if fmt not in ('csv', 'ndjson'):
+        abort(404)
+
+    search_query = request.args.get('search', '')
+    sort_map = _sort_map()
+    sort_by = request.args.get('sort_by', 'total')
+    if sort_by not in sort_map:
+        sort_by = 'total'
+    sort_order = request.args.get('sort_order', 'desc')
+    if sort_order not in ('asc', 'desc'):
+        sort_order = 'desc'
+
+    query = _join_results(
+        db.session.query(*_result_columns()).select_from(models.Scores)
+    )
+    if search_query:
+        query = query.filter(results_filter(search_query))
+    query = query.order_by(*_ordering(sort_map[sort_by], sort_order))
+    query = query.execution_options(
+        stream_results=True, yield_per=EXPORT_BATCH_SIZE
+    )
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        for count, row in enumerate(query, 1):
+            writer.writerow(row)
+            if count % EXPORT_BATCH_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    def generate_ndjson():
+        lines = []
+        for row in query:
+            lines.append(json.dumps(dict(zip(EXPORT_COLUMNS, row))))
+            if len(lines) == EXPORT_BATCH_SIZE:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
+
+    if fmt == 'csv':
+        body, mimetype = generate_csv(), 'text/csv'
+    else:
+        body, mimetype = generate_ndjson(), 'application/x-ndjson'
+
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename=results.{fmt}',
+            'X-Accel-Buffering': 'no',
+        }
+    )
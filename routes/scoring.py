@@ -1,10 +1,51 @@
-from flask import render_template, redirect, url_for, session, flash, request
+from flask import (render_template, redirect, url_for, session, flash,
+                   request, jsonify, current_app)
+from flask_wtf.csrf import validate_csrf
+from wtforms.validators import ValidationError
 from extensions import db
 import models
 import forms
+import scores
+from leaderboard import live_board
+from page_cache import page_cache, score_tags
+from rankings import refresh_season_rankings
+from totals import lock_entries, refresh_entry_totals
 from . import main
 
 
+# Largest batch accepted by the rotation endpoint
+MAX_ROTATION_ROWS = 100
+
+
+def _score_message(score, judge_count):
+    """Confirmation shown to the judge after a score is saved."""
+    if judge_count == 1:
+        return f'Score submitted! Total: {score.total:.3f}'
+    return (f'Multi-judge score submitted! Average E-score: '
+            f'{score.e_score:.3f}, Total: {score.total:.3f}')
+
+
+def _parse_number(data, key, default=None):
+    """Read an optional number from a JSON body (ScoreError if malformed)."""
+    value = data.get(key)
+    if value is None or value == '':
+        return default
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise scores.ScoreError(
+            f"{key.replace('_', ' ').title()} must be a number."
+        )
+
+
+def _parse_id(data, key):
+    """Read an id from a JSON body; anything else counts as not chosen."""
+    try:
+        return int(data.get(key) or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
 @main.route('/scoring', methods=['GET', 'POST'])
 def scoring():
 
@@ -26,49 +67,37 @@ def scoring():
               'Please contact an admin.', 'warning')
         return render_template('scoring.html', no_live_competition=True)
 
+    # Load every score, its apparatus and judge scores up front so the
+    # progress loop and template don't lazy-load per entry
     entries = db.session.query(models.Entries, models.Gymnasts, models.Clubs)\
         .join(models.Gymnasts,
               models.Entries.gymnast_id == models.Gymnasts.id)\
         .join(models.Clubs,
               models.Gymnasts.club_id == models.Clubs.id)\
         .filter(models.Entries.competition_id == live_competition.id)\
+        .options(
+            db.selectinload(models.Entries.scores)
+              .selectinload(models.Scores.apparatus),
+            db.selectinload(models.Entries.scores)
+              .selectinload(models.Scores.judge_scores),
+        )\
         .all()
 
     apparatus_list = models.Apparatus.query.order_by(models.Apparatus.id).all()
+    total_apparatus = len(apparatus_list)
 
     scoring_progress = {}
-    total_gymnasts = len(entries)
     fully_scored_gymnasts = 0
 
     for entry, gymnast, club in entries:
-        scored_apparatus = set()
-        for score in entry.scores:
-            scored_apparatus.add(score.apparatus_id)
-
-        total_apparatus = len(apparatus_list)
-        scored_count = len(scored_apparatus)
-        # Treat as complete only when there is at least one apparatus
-        # and all are scored
-        is_complete = total_apparatus > 0 and scored_count == total_apparatus
-
-        if is_complete:
+        scored_apparatus = {score.apparatus_id for score in entry.scores}
+        scoring_progress[entry.id] = scores.progress(
+            len(scored_apparatus), total_apparatus
+        )
+        if scoring_progress[entry.id]['is_complete']:
             fully_scored_gymnasts += 1
 
-        scoring_progress[entry.id] = {
-            'scored_count': scored_count,
-            'total_count': total_apparatus,
-            'is_complete': is_complete
-        }
-
-    overall_progress = {
-        'total_gymnasts': total_gymnasts,
-        'fully_scored': fully_scored_gymnasts,
-        'percentage': (
-            (fully_scored_gymnasts / total_gymnasts * 100)
-            if total_gymnasts > 0 else 0
-        ),
-        'is_complete': fully_scored_gymnasts == total_gymnasts
-    }
+    overall_progress = scores.overall(fully_scored_gymnasts, len(entries))
 
     form = forms.AddScores()
 
@@ -82,107 +111,32 @@ def scoring():
 
     if request.method == 'POST':
         if form.validate_on_submit():
-            entry_id = form.entry_id.data
-            apparatus_id = form.apparatus_id.data
-            d_score = form.d_score.data
-            penalty = form.penalty.data if form.penalty.data else 0.0
-
-            # Handle execution scores (dynamic JavaScript input)
-            execution_scores = request.form.getlist('execution_scores')
-
             try:
-                # Convert to floats and filter out empty values
-                execution_scores = [
-                    float(score) for score in execution_scores
-                    if score and score.strip()
-                ]
-
-                if not execution_scores:
-                    flash(
-                        'Please enter at least one execution score.',
-                        'warning'
-                    )
-                    return redirect(url_for('main.scoring'))
-
-                # Validate execution scores are in valid range
-                for score in execution_scores:
-                    if score < 0 or score > 10:
-                        flash(
-                            'Execution scores must be between 0 and 10.',
-                            'danger'
-                        )
-                        return redirect(url_for('main.scoring'))
-
-                # Find existing score or create new one
-                existing_score = models.Scores.query.filter_by(
-                    entry_id=entry_id,
-                    apparatus_id=apparatus_id
-                ).first()
-
-                if existing_score:
-                    # Clear existing judge scores
-                    models.JudgeScores.query.filter_by(
-                        score_id=existing_score.id
-                    ).delete()
-                else:
-                    # Create new score record
-                    existing_score = models.Scores(
-                        entry_id=entry_id,
-                        apparatus_id=apparatus_id,
-                        e_score=0.0,
-                        d_score=d_score,
-                        penalty=penalty,
-                        total=0.0
-                    )
-                    db.session.add(existing_score)
-                    db.session.flush()
-
-                existing_score.d_score = d_score
-                existing_score.penalty = penalty
-
-                if len(execution_scores) == 1:
-                    # Single judge scoring
-                    existing_score.e_score = execution_scores[0]
-                    existing_score.total = (existing_score.e_score +
-                                            existing_score.d_score -
-                                            existing_score.penalty)
-                    flash(
-                        f'Score submitted! Total: {existing_score.total:.3f}',
-                        'success'
-                    )
-                else:
-                    # Multiple judge scoring - save individual scores
-                    for judge_num, e_score in enumerate(execution_scores, 1):
-                        judge_score = models.JudgeScores(
-                            score_id=existing_score.id,
-                            judge_number=judge_num,
-                            e_score=round(e_score, 3)
-                        )
-                        db.session.add(judge_score)
-
-                    existing_score.update_final_score()
-                    flash(
-                        f'Multi-judge score submitted! Average E-score: '
-                        f'{existing_score.e_score:.3f}, Total: '
-                        f'{existing_score.total:.3f}',
-                        'success'
-                    )
-
-                db.session.commit()
-
-                # Check if this completed scoring for a gymnast
-                updated_entry = models.Entries.query.get(entry_id)
-                if updated_entry:
-                    scored_apparatus_count = len(updated_entry.scores)
-                    if scored_apparatus_count == len(apparatus_list):
-                        gymnast_name = updated_entry.gymnasts.name
-                        flash(f'✅ {gymnast_name} scoring complete!', 'info')
-
+                # Execution scores come from the dynamic judge inputs
+                execution_scores = scores.parse_execution_scores(
+                    request.form.getlist('execution_scores')
+                )
+                score = scores.save_score(
+                    live_competition,
+                    form.entry_id.data,
+                    form.apparatus_id.data,
+                    form.d_score.data,
+                    form.penalty.data,
+                    execution_scores
+                )
+            except scores.ScoreError as e:
+                flash(str(e), 'danger')
                 return redirect(url_for('main.scoring'))
 
-            except ValueError as e:
-                flash(f'Invalid score values: {str(e)}', 'danger')
-                return redirect(url_for('main.scoring'))
+            flash(_score_message(score, len(execution_scores)), 'success')
+
+            # Check if this completed scoring for a gymnast
+            progress = scores.entry_progress(score.entry_id, total_apparatus)
+            if progress['is_complete']:
+                flash(f'✅ {score.entry.gymnasts.name} scoring complete!',
+                      'info')
+
+            return redirect(url_for('main.scoring'))
         else:
             # Form validation failed - show specific error messages
             for field, errors in form.errors.items():
@@ -197,10 +151,290 @@ def scoring():
         live_competition=live_competition,
         scoring_progress=scoring_progress,
         overall_progress=overall_progress,
+        # Levels load with each gymnast, so ordering them is free
+        rotation_levels=[
+            level.name for level in sorted(
+                {gymnast.level_ref for entry, gymnast, club in entries},
+                key=lambda level: level.sort_order
+            )
+        ],
         form=form
     )
 
 
+def _api_live_competition():
+    """Checks shared by the scoring API endpoints.
+
+    Returns ``(live_competition, None)`` when the request may write scores,
+    otherwise ``(None, error_response)``.
+    """
+    if 'user_id' not in session:
+        return None, (jsonify({'errors': ['Please log in.']}), 401)
+
+    # Check if user is judge or admin (role_id 1 or 2)
+    if session.get('role_id') not in [1, 2]:
+        return None, (jsonify({'errors': ['Only judges and administrators '
+                                          'can submit scores.']}), 403)
+
+    # The console sends the form's CSRF token as a header
+    if current_app.config.get('WTF_CSRF_ENABLED', True):
+        try:
+            validate_csrf(request.headers.get('X-CSRFToken'))
+        except ValidationError:
+            return None, (jsonify({'errors': ['Your session has expired. '
+                                              'Please reload the page.']}),
+                          400)
+
+    live_competition = models.Competitions.query.filter_by(
+        status='live'
+    ).first()
+    if not live_competition:
+        return None, (jsonify({'errors': ['No live competition is '
+                                          'currently running.']}), 409)
+    return live_competition, None
+
+
+def _row_from_json(data):
+    """Build a ScoreRow from one JSON object (ScoreError if malformed)."""
+    if not isinstance(data, dict):
+        raise scores.ScoreError('Expected a JSON object.')
+    execution_scores = data.get('execution_scores') or []
+    if not isinstance(execution_scores, list):
+        execution_scores = [execution_scores]
+    return scores.ScoreRow(
+        entry_id=_parse_id(data, 'entry_id'),
+        apparatus_id=_parse_id(data, 'apparatus_id'),
+        d_score=_parse_number(data, 'd_score'),
+        penalty=_parse_number(data, 'penalty', 0.0),
+        execution_scores=scores.parse_execution_scores(execution_scores)
+    )
+
+
+def _total_apparatus():
+    """Number of apparatus a gymnast must be scored on to be complete."""
+    return db.session.query(db.func.count(models.Apparatus.id)).scalar()
+
+
+@main.route('/api/scoring/rotation', methods=['POST'])
+def api_submit_rotation():
+    """Save a whole rotation of scores in one transaction.
+
+    Takes ``{"rows": [...]}`` where each row has the scoring form's fields.
+    Rows are validated together and either all saved or none are; the
+    response has one result per row, in order, so the console can mark
+    each gymnast as saved or show what needs fixing.
+    """
+    live_competition, error = _api_live_competition()
+    if error:
+        return error
+
+    data = request.get_json(silent=True)
+    items = data.get('rows') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify({'errors': ['Expected a list of scores.']}), 400
+    if len(items) > MAX_ROTATION_ROWS:
+        return jsonify({'errors': [f'A rotation can hold at most '
+                                   f'{MAX_ROTATION_ROWS} scores.']}), 400
+
+    rows = []
+    errors = {}
+    for index, item in enumerate(items):
+        try:
+            rows.append(_row_from_json(item))
+        except scores.ScoreError as e:
+            errors[index] = str(e)
+            rows.append(None)
+
+    if errors:
+        # Still check the rows that parsed, so every problem is reported
+        # in one go
+        parsed = [(index, row) for index, row in enumerate(rows) if row]
+        row_errors = scores.validate_scores(
+            live_competition, [row for index, row in parsed]
+        )[1]
+        for position, message in row_errors.items():
+            errors[parsed[position][0]] = message
+    else:
+        try:
+            saved = scores.save_scores(live_competition, rows)
+        except scores.ScoreError as e:
+            errors = e.errors
+
+    if errors:
+        return jsonify({
+            'results': [
+                {'index': index, 'status': 'invalid',
+                 'errors': [errors[index]]}
+                if index in errors else
+                {'index': index, 'status': 'not_saved'}
+                for index in range(len(items))
+            ],
+            'errors': [f'{len(errors)} of {len(items)} scores need fixing. '
+                       f'Nothing was saved.'],
+        }), 400
+
+    total_apparatus = _total_apparatus()
+    progress = scores.entries_progress(
+        list({score.entry_id for score in saved}), total_apparatus
+    )
+    messages = [f'Rotation submitted! {len(saved)} scores saved.']
+    for score in saved:
+        if progress[score.entry_id]['is_complete']:
+            messages.append(
+                f'✅ {score.entry.gymnasts.name} scoring complete!'
+            )
+
+    return jsonify({
+        'results': [
+            {'index': index, 'status': 'saved',
+             'score': scores.score_to_dict(score),
+             'progress': progress[score.entry_id]}
+            for index, score in enumerate(saved)
+        ],
+        'overall_progress': scores.overall_progress(live_competition.id,
+                                                    total_apparatus),
+        'messages': messages,
+    })
+
+
+@main.route('/api/scoring/sync', methods=['POST'])
+def api_sync_scores():
+    """Apply a batch of scores queued on a judge's tablet.
+
+    Takes ``{"scores": [...]}`` where each score has the scoring form's
+    fields plus a client-generated ``key``. Resending a key that was already
+    applied is harmless, so the tablet can retry freely after a dropped
+    connection. Returns one result per score, in order, with its key.
+    """
+    live_competition, error = _api_live_competition()
+    if error:
+        return error
+
+    data = request.get_json(silent=True)
+    items = data.get('scores') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify({'errors': ['Expected a list of scores.']}), 400
+    if len(items) > MAX_ROTATION_ROWS:
+        return jsonify({'errors': [f'Send at most {MAX_ROTATION_ROWS} '
+                                   f'scores at a time.']}), 400
+
+    results = [None] * len(items)
+    parsed = []
+    for index, item in enumerate(items):
+        key = item.get('key') if isinstance(item, dict) else None
+        try:
+            if not isinstance(key, str) or not 0 < len(key) <= 64:
+                raise scores.ScoreError('Missing submission key.')
+            parsed.append((index, key, _row_from_json(item)))
+        except scores.ScoreError as e:
+            results[index] = {'key': key, 'status': 'invalid',
+                              'errors': [str(e)]}
+
+    outcomes = []
+    if parsed:
+        outcomes = scores.sync_scores(
+            live_competition,
+            [row for index, key, row in parsed],
+            [key for index, key, row in parsed]
+        )
+
+    total_apparatus = _total_apparatus()
+    progress = scores.entries_progress(
+        list({outcome.score.entry_id for outcome in outcomes
+              if outcome.score is not None}),
+        total_apparatus
+    )
+    messages = []
+    for (index, key, row), outcome in zip(parsed, outcomes):
+        result = {'key': key, 'status': outcome.status}
+        if outcome.error:
+            result['errors'] = [outcome.error]
+        if outcome.score is not None:
+            result['score'] = scores.score_to_dict(outcome.score)
+            result['progress'] = progress[outcome.score.entry_id]
+        if outcome.status == 'saved':
+            messages.append(_score_message(outcome.score,
+                                           len(row.execution_scores)))
+            if result['progress']['is_complete']:
+                messages.append(f'✅ {outcome.score.entry.gymnasts.name} '
+                                f'scoring complete!')
+        results[index] = result
+
+    return jsonify({
+        'results': results,
+        'overall_progress': scores.overall_progress(live_competition.id,
+                                                    total_apparatus),
+        'messages': messages,
+    })
+
+
+@main.route('/api/scoring/panel', methods=['POST'])
+def api_submit_panel_score():
+    """Take one judge's E-score in panel mode.
+
+    Each judge sends their own ``judge_number`` and ``e_score`` with the
+    ``panel_size`` their device is set to; judge 1 also sends ``d_score``
+    and ``penalty``. The score is saved once the whole panel is in; until
+    then the response says which judges are still to come.
+    """
+    live_competition, error = _api_live_competition()
+    if error:
+        return error
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'errors': ['Expected a JSON object.']}), 400
+
+    try:
+        result = scores.submit_panel_score(
+            live_competition,
+            _parse_id(data, 'entry_id'),
+            _parse_id(data, 'apparatus_id'),
+            _parse_id(data, 'judge_number'),
+            _parse_id(data, 'panel_size'),
+            _parse_number(data, 'e_score'),
+            _parse_number(data, 'd_score'),
+            _parse_number(data, 'penalty', 0.0)
+        )
+    except scores.ScoreError as e:
+        return jsonify({'errors': [str(e)]}), 400
+
+    waiting_for = [
+        number for number in range(1, result.panel_size + 1)
+        if number not in result.submitted
+    ]
+    response = {
+        'status': 'complete' if result.score else 'waiting',
+        'panel_size': result.panel_size,
+        'submitted': result.submitted,
+        'waiting_for': waiting_for,
+    }
+
+    if result.score is None:
+        response['messages'] = [
+            'Score received. Waiting for judge'
+            f'{"s" if len(waiting_for) > 1 else ""} '
+            f'{", ".join(str(number) for number in waiting_for)}.'
+        ]
+        return jsonify(response)
+
+    total_apparatus = _total_apparatus()
+    progress = scores.entry_progress(result.score.entry_id, total_apparatus)
+    messages = [_score_message(result.score, result.panel_size)]
+    if progress['is_complete']:
+        messages.append(
+            f'✅ {result.score.entry.gymnasts.name} scoring complete!'
+        )
+    response.update({
+        'score': scores.score_to_dict(result.score),
+        'progress': progress,
+        'overall_progress': scores.overall_progress(live_competition.id,
+                                                    total_apparatus),
+        'messages': messages,
+    })
+    return jsonify(response)
+
+
 @main.route('/scoring/delete/<int:score_id>', methods=['POST'])
 def delete_score(score_id):
     """Delete a score."""
@@ -216,12 +450,28 @@ def delete_score(score_id):
     score = models.Scores.query.get_or_404(score_id)
     
     # Store info for flash message
-    gymnast_name = score.entries.gymnasts.name
+    gymnast_name = score.entry.gymnasts.name
     apparatus_name = score.apparatus.name
+    competition_id = score.entry.competition_id
+    entry_id = score.entry_id
+    apparatus_id = score.apparatus_id
+    gymnast_id = score.entry.gymnast_id
+    season_id = score.entry.competitions.season_id
+    tags = score_tags(score.entry.competitions, [gymnast_id])
     
-    # Delete the score
+    # Delete the score, and any panel submissions it was built from
+    lock_entries([entry_id])
     db.session.delete(score)
+    db.session.flush()
+    scores.clear_panel(entry_id, apparatus_id)
+    totals = refresh_entry_totals([entry_id])[entry_id]
+    refresh_season_rankings([gymnast_id], season_id)
+    models.Competitions.bump_scores_version(competition_id)
+    version = models.Competitions.current_scores_version(competition_id)
     db.session.commit()
+    live_board.remove_score(competition_id, entry_id, apparatus_id, version,
+                            totals)
+    page_cache.invalidate(*tags)
     
     flash(f'Score for {gymnast_name} on {apparatus_name} has been deleted.',
           'success')
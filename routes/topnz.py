@@ -1,101 +1,138 @@
+from collections import namedtuple
+from datetime import datetime
 from flask import render_template, request
 from extensions import db
+from leaderboard import ranked
 import models
+from page_cache import page_cache, season_tag
+from stale_cache import stale_cache
 from . import main
 
 
+ALL_AROUND_LIMIT = 24
+APPARATUS_LIMIT = 8
+
+AllAroundRow = namedtuple('AllAroundRow', 'rank id name club_name total_score')
+ApparatusRow = namedtuple(
+    'ApparatusRow', 'rank id name club_name e_score d_score penalty total'
+)
+
+
+def _top(rows, limit):
+    """Yield (rank, row) for rows sorted by total, keeping ties at the cut.
+
+    Tied totals share a rank, so more than ``limit`` rows can be returned.
+    """
+    for rank, row in ranked(rows):
+        if rank > limit:
+            return
+        yield rank, row
+
+
+def _rankings(season_id, selected_level):
+    """All-around and per-apparatus tables for one season and level.
+
+    Returns plain rows, so the result can be shared between requests and
+    computed outside of one.
+    """
+    apparatus_list = db.session.query(
+        models.Apparatus.id, models.Apparatus.name
+    ).all()
+
+    # Precomputed best scores; one indexed range scan per page
+    rows = (
+        db.session.query(
+            models.SeasonRankings.apparatus_id,
+            models.SeasonRankings.e_score,
+            models.SeasonRankings.d_score,
+            models.SeasonRankings.penalty,
+            models.SeasonRankings.total,
+            models.Gymnasts.id,
+            models.Gymnasts.name,
+            models.Clubs.name.label('club_name')
+        )
+        .join(models.Gymnasts,
+              models.SeasonRankings.gymnast_id == models.Gymnasts.id)
+        .join(models.Clubs, models.Clubs.id == models.Gymnasts.club_id)
+        .filter(models.SeasonRankings.season_id == season_id)
+        .filter(models.SeasonRankings.level == selected_level)
+        .order_by(models.SeasonRankings.total.desc(),
+                  models.Gymnasts.name)
+        .all()
+    )
+
+    by_apparatus = {app.id: [] for app in apparatus_list}
+    all_around_rows = []
+    for row in rows:
+        if row.apparatus_id is None:
+            all_around_rows.append(row)
+        elif row.apparatus_id in by_apparatus:
+            by_apparatus[row.apparatus_id].append(row)
+
+    all_around_data = [
+        AllAroundRow(rank=rank, id=row.id, name=row.name,
+                     club_name=row.club_name, total_score=row.total)
+        for rank, row in _top(all_around_rows, ALL_AROUND_LIMIT)
+    ]
+    apparatus_data = {}
+    for apparatus in apparatus_list:
+        apparatus_data[apparatus.name] = [
+            ApparatusRow(rank=rank, id=row.id, name=row.name,
+                         club_name=row.club_name, e_score=row.e_score,
+                         d_score=row.d_score, penalty=row.penalty,
+                         total=row.total)
+            for rank, row in _top(by_apparatus[apparatus.id],
+                                  APPARATUS_LIMIT)
+        ]
+    return all_around_data, apparatus_data
+
+
+def _selected_year():
+    return request.args.get('season', datetime.now().year, type=int)
+
+
 @main.route('/topnz')
+@page_cache.cached(lambda: [season_tag(_selected_year())])
 def topnz():
     selected_level = request.args.get('level')
+    selected_year = _selected_year()
 
-    levels = [
-        'Level 7', 'Level 8', 'Level 9',
-        'Junior International', 'Senior International'
+    seasons = [
+        year for (year,) in db.session.query(models.Seasons.year)
+        .join(models.SeasonRankings,
+              models.SeasonRankings.season_id == models.Seasons.id)
+        .distinct().order_by(models.Seasons.year.desc()).all()
     ]
+    season = models.Seasons.query.filter_by(year=selected_year).first()
+    season_id = season.id if season else None
 
+    # Every Top NZ level with rankings this season, in competition order
     level = db.session.query(
-        models.Gymnasts.level
-    ).join(models.Entries
-           ).join(models.Scores
-                  ).filter(models.Gymnasts.level.in_(levels)
-                           ).distinct().order_by(models.Gymnasts.level).all()
+        models.Levels.name
+    ).filter(models.Levels.top_nz).filter(models.Levels.name.in_(
+        db.select(models.SeasonRankings.level).where(
+            models.SeasonRankings.season_id == season_id
+        ))).order_by(models.Levels.sort_order).all()
     level = [lvl[0] for lvl in level]
 
     apparatus_list = models.Apparatus.query.all()
     apparatus_data = {}
     all_around_data = []
 
-    if selected_level:
-
-        best_per_app = (
-            db.session.query(
-                models.Gymnasts.id,
-                models.Scores.apparatus_id,
-                db.func.max(models.Scores.total).label('best_score')
-            )
-            .join(
-                models.Entries,
-                models.Entries.gymnast_id == models.Gymnasts.id
-                )
-            .join(
-                models.Scores,
-                models.Scores.entry_id == models.Entries.id
-                )
-            .filter(models.Gymnasts.level == selected_level)
-            .group_by(models.Gymnasts.id, models.Scores.apparatus_id)
-            .subquery()
+    # Only a listed level is ranked, so other levels can't be asked for
+    if selected_level in level:
+        # Served from the cache, refreshed in the background once it is a
+        # few seconds old and purged when the season's scores change
+        all_around_data, apparatus_data = stale_cache.get(
+            ('topnz', season_id, selected_level),
+            [season_tag(selected_year)],
+            lambda: _rankings(season_id, selected_level)
         )
 
-        all_around_data = (
-            db.session.query(
-                models.Gymnasts.id,
-                models.Gymnasts.name,
-                models.Clubs.name.label('club_name'),
-                db.func.sum(best_per_app.c.best_score).label('total_score')
-            )
-            .join(best_per_app, best_per_app.c.id == models.Gymnasts.id)
-            .join(models.Clubs, models.Clubs.id == models.Gymnasts.club_id)
-            .group_by(
-                models.Gymnasts.id,
-                models.Gymnasts.name,
-                models.Clubs.name
-            )
-            .order_by(db.func.sum(best_per_app.c.best_score).desc())
-            .limit(24)
-            .all()
-        )
-
-        for apparatus in apparatus_list:
-            apparatus_data[apparatus.name] = (
-                db.session.query(
-                    models.Gymnasts.id,
-                    models.Gymnasts.name,
-                    models.Clubs.name.label('club_name'),
-                    db.func.max(models.Scores.e_score).label('e_score'),
-                    db.func.max(models.Scores.d_score).label('d_score'),
-                    db.func.max(models.Scores.penalty).label('penalty'),
-                    db.func.max(models.Scores.total).label('total')
-                )
-                .join(models.Entries,
-                      models.Entries.gymnast_id == models.Gymnasts.id
-                      )
-                .join(models.Scores,
-                      models.Scores.entry_id == models.Entries.id
-                      )
-                .join(models.Clubs, models.Clubs.id == models.Gymnasts.club_id)
-                .filter(models.Gymnasts.level == selected_level)
-                .filter(models.Scores.apparatus_id == apparatus.id)
-                .group_by(models.Gymnasts.id,
-                          models.Gymnasts.name,
-                          models.Clubs.name
-                          )
-                .order_by(db.func.max(models.Scores.total).desc())
-                .limit(8)
-                .all()
-            )
-
     return render_template('topnz.html', level=level,
                            selected_level=selected_level,
+                           seasons=seasons,
+                           selected_year=selected_year,
                            all_around_data=all_around_data,
                            apparatus_data=apparatus_data,
                            apparatus_list=apparatus_list)
@@ -5,6 +5,10 @@ from create_app import create_app
 app = create_app()
 
 if __name__ == '__main__':
+    from migrations import check as check_migrations
+    with app.app_context():
+        check_migrations()
+
     debug = os.environ.get('FLASK_DEBUG', '0') in {'1', 'true', 'True'}
     host = os.environ.get('FLASK_HOST', '127.0.0.1')
     port = int(os.environ.get('FLASK_PORT', '5000'))
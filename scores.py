@@ -0,0 +1,610 @@
+"""Recording judges' scores for the live competition.
+
+The scoring console form, rotation batches and the judges' offline
+queue (which the console also sends single scores through) all validate
+with ``validate_scores`` and write through ``_write_scores``, so the
+upsert and the bookkeeping that has to happen in the same transaction
+(season rankings and the competition's ``scores_version``) live in one
+place. A batch is written with a fixed number of statements however many
+rows it holds.
+
+``sync_scores`` is the entry point for judges' tablets replaying an offline
+queue: every score carries an idempotency key, and keys already applied
+are acknowledged instead of being written again.
+
+After the commit the live board is updated in place and the cached public
+pages that show the scores are invalidated.
+
+``submit_panel_score`` handles panel mode, where each E-judge sends their
+own score from their own device and the panel is combined into a score
+once every judge is in.
+
+The progress helpers answer "how far through is this gymnast / the whole
+competition" from ``entry_totals``, so a single submission does not need
+every entry and score loaded to report back.
+"""
+
+from collections import namedtuple
+
+from flask import url_for
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+import models
+from leaderboard import live_board
+from metrics import record_score_writes
+from page_cache import page_cache, score_tags
+from rankings import refresh_season_rankings
+from totals import lock_entries, refresh_entry_totals
+
+
+class ScoreError(ValueError):
+    """A submitted score that cannot be saved; the message is for the judge."""
+
+
+def parse_execution_scores(values):
+    """Convert submitted execution scores to floats, ignoring blanks."""
+    execution_scores = []
+    for value in values:
+        if value is None or str(value).strip() == '':
+            continue
+        try:
+            execution_scores.append(float(value))
+        except (TypeError, ValueError):
+            raise ScoreError('Execution scores must be numbers.')
+    return execution_scores
+
+
+# One submitted apparatus score. ``execution_scores`` is a list of floats;
+# a single value is the E-score, several are individual judges.
+ScoreRow = namedtuple(
+    'ScoreRow', 'entry_id apparatus_id d_score penalty execution_scores'
+)
+
+
+def _check_values(row):
+    """Range-check the numbers in one row."""
+    if row.d_score is None:
+        raise ScoreError('Please enter a difficulty score.')
+    if row.d_score < 0 or row.d_score > 10:
+        raise ScoreError('Difficulty score must be between 0 and 10.')
+
+    if row.penalty < 0 or row.penalty > 10:
+        raise ScoreError('Penalty must be between 0 and 10.')
+
+    if not row.execution_scores:
+        raise ScoreError('Please enter at least one execution score.')
+    for score in row.execution_scores:
+        if score < 0 or score > 10:
+            raise ScoreError('Execution scores must be between 0 and 10.')
+
+
+def validate_scores(competition, rows):
+    """Check a batch of rows against the live competition.
+
+    Entries and apparatus for the whole batch are looked up in one query
+    each. Returns ``(entries, errors)`` where ``entries`` maps entry id to
+    ``Entries`` and ``errors`` maps row index to a message for the judge.
+    """
+    entry_ids = {row.entry_id for row in rows if row.entry_id}
+    entries = {}
+    if entry_ids:
+        entries = {
+            entry.id: entry
+            for entry in models.Entries.query.options(
+                db.joinedload(models.Entries.gymnasts)
+            ).filter(
+                models.Entries.id.in_(entry_ids),
+                models.Entries.competition_id == competition.id
+            )
+        }
+    apparatus_ids = {
+        apparatus_id for (apparatus_id,) in db.session.query(
+            models.Apparatus.id
+        )
+    }
+
+    errors = {}
+    seen = set()
+    for index, row in enumerate(rows):
+        try:
+            if row.entry_id not in entries:
+                raise ScoreError('Please select a gymnast entered in this '
+                                 'competition.')
+            if row.apparatus_id not in apparatus_ids:
+                raise ScoreError('Please select an apparatus.')
+            key = (row.entry_id, row.apparatus_id)
+            if key in seen:
+                raise ScoreError('This gymnast is already scored on this '
+                                 'apparatus earlier in the batch.')
+            seen.add(key)
+            _check_values(row)
+        except ScoreError as e:
+            errors[index] = str(e)
+
+    return entries, errors
+
+
+def save_scores(competition, rows):
+    """Validate and insert or replace a batch of scores in one transaction.
+
+    Nothing is written unless every row is valid; otherwise ``ScoreError``
+    is raised with ``errors`` mapping row index to message. Scores and judge
+    scores are each written with one native upsert, whether they are new or
+    replace earlier submissions. Returns the saved ``Scores`` rows in the
+    order given.
+    """
+    rows = [row._replace(penalty=row.penalty or 0.0) for row in rows]
+    entries, errors = validate_scores(competition, rows)
+    if errors:
+        error = ScoreError(next(iter(errors.values())))
+        error.errors = errors
+        raise error
+    if not rows:
+        return []
+    return _write_scores(competition, rows, entries)
+
+
+def _write_scores(competition, rows, entries, submissions=()):
+    """Upsert already validated rows, commit and update the live board.
+
+    ``submissions`` is a list of ``(idempotency_key, row_index)`` to record
+    against the score each row produced, in the same transaction.
+    """
+    # Writes to the same gymnast wait for each other, so the entry totals
+    # below are summed from a complete set of scores
+    lock_entries(row.entry_id for row in rows)
+
+    values = []
+    for row in rows:
+        # Scores are stored to the thousandth; rounding here keeps the
+        # stored total equal to its stored parts
+        d_score = round(row.d_score, 3)
+        penalty = round(row.penalty, 3)
+        if len(row.execution_scores) == 1:
+            # Single judge scoring
+            e_score = round(row.execution_scores[0], 3)
+        else:
+            # Multiple judge scoring - average the rounded judge scores,
+            # as Scores.calculate_average_e_score does
+            judge_scores = [round(e, 3) for e in row.execution_scores]
+            e_score = round(sum(judge_scores) / len(judge_scores), 3)
+        entry = entries[row.entry_id]
+        values.append({
+            'entry_id': row.entry_id,
+            'apparatus_id': row.apparatus_id,
+            'competition_id': entry.competition_id,
+            'gymnast_id': entry.gymnast_id,
+            'level': entry.gymnasts.level,
+            'e_score': e_score,
+            'd_score': d_score,
+            'penalty': penalty,
+            'total': round(e_score + d_score - penalty, 3),
+        })
+
+    # One upsert for every score in the batch. It takes the row lock on
+    # any score being replaced, so a concurrent write to the same gymnast
+    # and apparatus waits for this transaction instead of interleaving
+    # with the judge score rewrite below. A replaced score keeps the level
+    # it was first recorded at.
+    db.session.execute(
+        _upsert(models.Scores.__table__, ['entry_id', 'apparatus_id'],
+                ['e_score', 'd_score', 'penalty', 'total']),
+        values
+    )
+    existing = _score_ids(rows)
+    score_ids = [existing[(row.entry_id, row.apparatus_id)] for row in rows]
+
+    # Judges beyond the new panel size are left over from a previous
+    # submission; single-judge scores keep none
+    panel_sizes = {}
+    for score_id, row in zip(score_ids, rows):
+        judges = len(row.execution_scores)
+        panel_sizes.setdefault(0 if judges == 1 else judges, []).append(
+            score_id
+        )
+    models.JudgeScores.query.filter(db.or_(*(
+        db.and_(models.JudgeScores.score_id.in_(ids),
+                models.JudgeScores.judge_number > judges)
+        for judges, ids in panel_sizes.items()
+    ))).delete(synchronize_session=False)
+
+    judge_rows = [
+        {'score_id': score_id, 'judge_number': judge_num,
+         'e_score': round(e_score, 3)}
+        for score_id, row in zip(score_ids, rows)
+        if len(row.execution_scores) > 1
+        for judge_num, e_score in enumerate(row.execution_scores, 1)
+    ]
+    if judge_rows:
+        db.session.execute(
+            _upsert(models.JudgeScores.__table__,
+                    ['score_id', 'judge_number'], ['e_score']),
+            judge_rows
+        )
+
+    if submissions:
+        db.session.execute(db.insert(models.ScoreSubmissions), [
+            {'idempotency_key': key, 'score_id': score_ids[index]}
+            for key, index in submissions
+        ])
+
+    gymnast_ids = list({entries[row.entry_id].gymnast_id for row in rows})
+    refresh_entry_totals(row.entry_id for row in rows)
+    refresh_season_rankings(gymnast_ids, competition.season_id)
+    models.Competitions.bump_scores_version(competition.id)
+    version = models.Competitions.current_scores_version(competition.id)
+    tags = score_tags(competition, gymnast_ids)
+    competition_id = competition.id
+    db.session.commit()
+    page_cache.invalidate(*tags)
+    record_score_writes(competition_id, len(rows))
+
+    loaded = _load_scores(score_ids)
+    saved = [loaded[score_id] for score_id in score_ids]
+    live_board.apply_scores(saved, version)
+    return saved
+
+
+def _upsert(table, key_columns, update_columns):
+    """INSERT that updates ``update_columns`` when the unique key exists.
+
+    Uses ``ON DUPLICATE KEY UPDATE`` on MySQL and ``ON CONFLICT DO UPDATE``
+    on SQLite and PostgreSQL, so replacing a row is a single statement.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('mysql', 'mariadb'):
+        stmt = mysql_insert(table)
+        return stmt.on_duplicate_key_update(
+            {column: stmt.inserted[column] for column in update_columns}
+        )
+    if dialect == 'sqlite':
+        stmt = sqlite_insert(table)
+    elif dialect == 'postgresql':
+        stmt = postgresql_insert(table)
+    else:
+        raise NotImplementedError(f'No upsert for {dialect}')
+    return stmt.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={column: stmt.excluded[column] for column in update_columns}
+    )
+
+
+def _load_scores(score_ids):
+    """Load scores with everything the board and the console show.
+
+    Returns a dict by id; scores deleted in the meantime are missing.
+    """
+    if not score_ids:
+        return {}
+    return {
+        score.id: score
+        for score in models.Scores.query.options(
+            db.selectinload(models.Scores.judge_scores),
+            db.joinedload(models.Scores.apparatus),
+            db.joinedload(models.Scores.entry)
+              .joinedload(models.Entries.gymnasts)
+              .joinedload(models.Gymnasts.clubs),
+            db.joinedload(models.Scores.entry)
+              .joinedload(models.Entries.totals),
+        ).filter(models.Scores.id.in_(set(score_ids)))
+    }
+
+
+def _score_ids(rows):
+    """Map ``(entry_id, apparatus_id)`` to score id for a batch's rows."""
+    keys = {(row.entry_id, row.apparatus_id) for row in rows}
+    candidates = db.session.query(
+        models.Scores.entry_id,
+        models.Scores.apparatus_id,
+        models.Scores.id
+    ).filter(
+        models.Scores.entry_id.in_({key[0] for key in keys}),
+        models.Scores.apparatus_id.in_({key[1] for key in keys})
+    )
+    return {
+        (entry_id, apparatus_id): score_id
+        for entry_id, apparatus_id, score_id in candidates
+        if (entry_id, apparatus_id) in keys
+    }
+
+
+def save_score(competition, entry_id, apparatus_id, d_score, penalty,
+               execution_scores):
+    """Validate and insert or replace one apparatus score, then commit.
+
+    A single execution score is stored as the E-score directly; several are
+    stored as individual judge scores and averaged. Returns the saved
+    ``Scores`` row.
+    """
+    return save_scores(competition, [ScoreRow(
+        entry_id, apparatus_id, d_score, penalty, execution_scores
+    )])[0]
+
+
+# Outcome of one queued score. ``status`` is saved, duplicate (the key was
+# applied before), superseded (a later queued score for the same gymnast
+# and apparatus replaced it) or invalid (``error`` says why).
+SyncResult = namedtuple('SyncResult', 'status score error')
+
+
+def sync_scores(competition, rows, keys, retry=True):
+    """Apply scores queued on a judge's tablet, each with an idempotency key.
+
+    Keys applied before are acknowledged without writing. When the queue
+    holds several scores for the same gymnast and apparatus the last one
+    wins. Invalid rows are reported and skipped rather than holding up the
+    rest. Everything that is written goes in one transaction, together with
+    its keys. Returns a ``SyncResult`` per row.
+    """
+    rows = [row._replace(penalty=row.penalty or 0.0) for row in rows]
+    applied = dict(
+        db.session.query(
+            models.ScoreSubmissions.idempotency_key,
+            models.ScoreSubmissions.score_id
+        ).filter(models.ScoreSubmissions.idempotency_key.in_(set(keys)))
+    )
+
+    # Decide which row of each gymnast and apparatus gets written
+    pending = []
+    seen_keys = set()
+    latest = {}
+    for index, key in enumerate(keys):
+        if key in applied or key in seen_keys:
+            continue
+        seen_keys.add(key)
+        pending.append(index)
+        latest[(rows[index].entry_id, rows[index].apparatus_id)] = index
+    winners = sorted(latest.values())
+
+    entries, errors = validate_scores(
+        competition, [rows[index] for index in winners]
+    )
+    errors = {winners[position]: message
+              for position, message in errors.items()}
+    to_write = [index for index in winners if index not in errors]
+    position = {index: n for n, index in enumerate(to_write)}
+
+    submissions = []
+    for index in pending:
+        winner = latest[(rows[index].entry_id, rows[index].apparatus_id)]
+        if winner in position:
+            submissions.append((keys[index], position[winner]))
+
+    saved = []
+    if to_write:
+        try:
+            saved = _write_scores(competition,
+                                  [rows[index] for index in to_write],
+                                  entries, submissions)
+        except IntegrityError:
+            # Another request applied some of these keys first; start over
+            # so they are reported as duplicates
+            db.session.rollback()
+            if not retry:
+                raise
+            return sync_scores(competition, rows, keys, retry=False)
+
+    duplicates = _load_scores([
+        score_id for score_id in applied.values() if score_id is not None
+    ])
+    first_index = {}
+    for index, key in enumerate(keys):
+        first_index.setdefault(key, index)
+
+    results = []
+    for index, key in enumerate(keys):
+        winner = latest.get((rows[index].entry_id, rows[index].apparatus_id))
+        if key in applied:
+            results.append(SyncResult(
+                'duplicate', duplicates.get(applied[key]), None
+            ))
+        elif first_index[key] != index:
+            # The same key twice in one batch: report the first outcome
+            results.append(results[first_index[key]]._replace(
+                status='duplicate'
+            ))
+        elif index in errors:
+            results.append(SyncResult('invalid', None, errors[index]))
+        elif winner in errors:
+            results.append(SyncResult(
+                'invalid', None,
+                'Replaced by a later score that could not be saved.'
+            ))
+        elif winner == index:
+            results.append(SyncResult('saved', saved[position[index]], None))
+        else:
+            results.append(SyncResult(
+                'superseded', saved[position[winner]], None
+            ))
+    return results
+
+
+# Most E-judges a panel can have, as on the scoring form
+MAX_PANEL_SIZE = 6
+
+# Where a panel stands after a submission. ``submitted`` is the sorted
+# judge numbers received so far; ``score`` is the combined ``Scores`` row
+# once every judge is in, otherwise None.
+PanelResult = namedtuple('PanelResult', 'panel_size submitted score')
+
+
+def submit_panel_score(competition, entry_id, apparatus_id, judge_number,
+                       panel_size, e_score, d_score=None, penalty=None):
+    """Record one judge's E-score and combine the panel once it is complete.
+
+    Each judge upserts only their own ``PanelScores`` row, so judges never
+    overwrite each other and resending is harmless. The gymnast's entry
+    row is locked while the panel is checked: when the last two judges
+    submit at the same moment, one waits for the other and exactly one
+    sees the full panel, without holding up any other gymnast. A judge who
+    corrects a score after the panel is complete causes a recompute.
+    Returns a ``PanelResult``; raises ``ScoreError`` for a bad submission.
+    """
+    entries, errors = validate_scores(competition, [ScoreRow(
+        entry_id, apparatus_id, 0.0, 0.0, [0.0]
+    )])
+    if errors:
+        raise ScoreError(errors[0])
+    if not panel_size or not 1 <= panel_size <= MAX_PANEL_SIZE:
+        raise ScoreError(f'A panel has between 1 and {MAX_PANEL_SIZE} '
+                         f'judges.')
+    if not judge_number or not 1 <= judge_number <= panel_size:
+        raise ScoreError(f'Judge number must be between 1 and '
+                         f'{panel_size}.')
+    if e_score is None or e_score < 0 or e_score > 10:
+        raise ScoreError('Execution score must be between 0 and 10.')
+    if judge_number == 1:
+        # The chair's D-score and penalty go through the usual checks
+        _check_values(ScoreRow(entry_id, apparatus_id, d_score,
+                               penalty or 0.0, [e_score]))
+    else:
+        d_score = penalty = None
+
+    # Row lock on the entry serialises this gymnast's panel only
+    lock_entries([entry_id])
+
+    # Locking read, so judges committed since this transaction began are
+    # seen even under REPEATABLE READ
+    panel = {
+        row.judge_number: row
+        for row in models.PanelScores.query.filter_by(
+            entry_id=entry_id, apparatus_id=apparatus_id
+        ).with_for_update()
+    }
+    sizes = {row.panel_size for number, row in panel.items()
+             if number != judge_number}
+    if sizes and sizes != {panel_size}:
+        db.session.rollback()
+        raise ScoreError(f'This panel has {sizes.pop()} judges; check the '
+                         f'panel size on this device.')
+
+    db.session.execute(
+        _upsert(models.PanelScores.__table__,
+                ['entry_id', 'apparatus_id', 'judge_number'],
+                ['panel_size', 'e_score', 'd_score', 'penalty']),
+        [{
+            'entry_id': entry_id,
+            'apparatus_id': apparatus_id,
+            'judge_number': judge_number,
+            'panel_size': panel_size,
+            'e_score': e_score,
+            'd_score': d_score,
+            'penalty': penalty,
+        }]
+    )
+    panel[judge_number] = models.PanelScores(
+        judge_number=judge_number, panel_size=panel_size, e_score=e_score,
+        d_score=d_score, penalty=penalty
+    )
+    submitted = sorted(panel)
+
+    if not all(number in panel for number in range(1, panel_size + 1)):
+        db.session.commit()
+        return PanelResult(panel_size, submitted, None)
+
+    chair = panel[1]
+    score = _write_scores(competition, [ScoreRow(
+        entry_id, apparatus_id, chair.d_score, chair.penalty or 0.0,
+        [panel[number].e_score for number in range(1, panel_size + 1)]
+    )], entries)[0]
+    return PanelResult(panel_size, submitted, score)
+
+
+def clear_panel(entry_id, apparatus_id=None):
+    """Forget panel submissions when their score or entry is deleted."""
+    query = models.PanelScores.query.filter_by(entry_id=entry_id)
+    if apparatus_id is not None:
+        query = query.filter_by(apparatus_id=apparatus_id)
+    query.delete(synchronize_session=False)
+
+
+def progress(scored_count, total_count):
+    """Progress of one gymnast through the apparatus."""
+    return {
+        'scored_count': scored_count,
+        'total_count': total_count,
+        # Treat as complete only when there is at least one apparatus
+        # and all are scored
+        'is_complete': total_count > 0 and scored_count == total_count
+    }
+
+
+def overall(fully_scored, total_gymnasts):
+    """Progress of the whole competition, counted in finished gymnasts."""
+    return {
+        'total_gymnasts': total_gymnasts,
+        'fully_scored': fully_scored,
+        'percentage': (
+            (fully_scored / total_gymnasts * 100)
+            if total_gymnasts > 0 else 0
+        ),
+        'is_complete': fully_scored == total_gymnasts
+    }
+
+
+def entry_progress(entry_id, total_apparatus):
+    """Progress for one entry, counted in the database."""
+    return entries_progress([entry_id], total_apparatus)[entry_id]
+
+
+def entries_progress(entry_ids, total_apparatus):
+    """Progress for several entries, read from their entry totals."""
+    counts = dict(
+        db.session.query(
+            models.EntryTotals.entry_id,
+            models.EntryTotals.apparatus_count
+        )
+        .filter(models.EntryTotals.entry_id.in_(entry_ids))
+        .all()
+    )
+    return {
+        entry_id: progress(counts.get(entry_id, 0), total_apparatus)
+        for entry_id in entry_ids
+    }
+
+
+def overall_progress(competition_id, total_apparatus):
+    """Progress for a competition, counted in the database."""
+    total_gymnasts = db.session.query(db.func.count(models.Entries.id))\
+        .filter(models.Entries.competition_id == competition_id)\
+        .scalar()
+
+    fully_scored = 0
+    if total_apparatus > 0:
+        fully_scored = db.session.query(db.func.count(models.Entries.id))\
+            .join(models.EntryTotals,
+                  models.EntryTotals.entry_id == models.Entries.id)\
+            .filter(models.Entries.competition_id == competition_id,
+                    models.EntryTotals.apparatus_count == total_apparatus)\
+            .scalar()
+
+    return overall(fully_scored, total_gymnasts)
+
+
+def score_to_dict(score):
+    """Serialise a saved score the way the scoring console displays it."""
+    gymnast = score.entry.gymnasts
+    return {
+        'id': score.id,
+        'entry_id': score.entry_id,
+        'apparatus_id': score.apparatus_id,
+        'apparatus_name': score.apparatus.name,
+        'gymnast_id': gymnast.id,
+        'gymnast_name': gymnast.name,
+        'level': gymnast.level,
+        'judge_scores': [
+            {'judge_number': judge_score.judge_number,
+             'e_score': round(judge_score.e_score, 3)}
+            for judge_score in sorted(score.judge_scores,
+                                      key=lambda j: j.judge_number)
+        ],
+        'e_score': round(score.e_score, 3),
+        'd_score': round(score.d_score, 3),
+        'penalty': round(score.penalty, 3),
+        'total': round(score.total, 3),
+        'delete_url': url_for('main.delete_score', score_id=score.id),
+    }
@@ -0,0 +1,139 @@
+"""Token index behind the results search box.
+
+Searching with ``ILIKE '%term%'`` across the joined results tables can't
+use an index, so every search scanned every score. Instead the words of
+each gymnast, club, competition and apparatus name (and gymnast level) are
+kept in ``search_index``. Each query word becomes an indexed prefix
+lookup there, run as a subquery of the results query itself, so a search
+is one statement however many names match.
+
+The index is kept current by mapper events, so any code path that writes
+those models updates it in the same flush.
+"""
+
+import re
+
+from extensions import db
+import models
+
+
+TOKEN_LENGTH = 50
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """Split text into lowercase search words."""
+    if not text:
+        return []
+    return [w[:TOKEN_LENGTH] for w in _WORD.findall(text.lower())]
+
+
+def _searchable_text(kind, target):
+    if kind == 'gymnast':
+        return f"{target.name or ''} {target.level or ''}"
+    return target.name
+
+
+# kind -> (model, attributes that feed the index)
+INDEXED = {
+    'gymnast': (models.Gymnasts, ('name', 'level_id')),
+    'club': (models.Clubs, ('name',)),
+    'competition': (models.Competitions, ('name',)),
+    'apparatus': (models.Apparatus, ('name',)),
+}
+
+
+def _token_rows(kind, target):
+    return [
+        {'token': token, 'kind': kind, 'ref_id': target.id}
+        for token in sorted(set(tokenize(_searchable_text(kind, target))))
+    ]
+
+
+def _write_tokens(connection, kind, target):
+    table = models.SearchIndex.__table__
+    connection.execute(
+        table.delete()
+        .where(table.c.kind == kind)
+        .where(table.c.ref_id == target.id)
+    )
+    rows = _token_rows(kind, target)
+    if rows:
+        connection.execute(table.insert(), rows)
+
+
+def _register(kind, model, attributes):
+    @db.event.listens_for(model, 'after_insert')
+    def after_insert(mapper, connection, target):
+        _write_tokens(connection, kind, target)
+
+    @db.event.listens_for(model, 'after_update')
+    def after_update(mapper, connection, target):
+        state = db.inspect(target)
+        if any(state.attrs[attr].history.has_changes()
+               for attr in attributes):
+            _write_tokens(connection, kind, target)
+
+    @db.event.listens_for(model, 'after_delete')
+    def after_delete(mapper, connection, target):
+        table = models.SearchIndex.__table__
+        connection.execute(
+            table.delete()
+            .where(table.c.kind == kind)
+            .where(table.c.ref_id == target.id)
+        )
+
+
+for _kind, (_model, _attributes) in INDEXED.items():
+    _register(_kind, _model, _attributes)
+
+
+def rebuild_search_index():
+    """Re-tokenise every indexed row. Returns rows written; caller commits."""
+    models.SearchIndex.query.delete(synchronize_session=False)
+    rows = []
+    for kind, (model, _) in INDEXED.items():
+        for target in model.query.all():
+            rows.extend(_token_rows(kind, target))
+    if rows:
+        db.session.execute(models.SearchIndex.__table__.insert(), rows)
+    return len(rows)
+
+
+def _matching(kind, word):
+    """Select the ids of ``kind`` with an index token starting with
+    ``word``."""
+    escaped = (word.replace('\\', '\\\\')
+               .replace('%', '\\%').replace('_', '\\_'))
+    return (
+        db.select(models.SearchIndex.ref_id)
+        .where(models.SearchIndex.kind == kind)
+        .where(models.SearchIndex.token.like(escaped + '%', escape='\\'))
+    )
+
+
+def results_filter(search_query):
+    """Build a filter for the results query (scores joined to entries,
+    gymnasts and so on) matching every word of ``search_query``.
+
+    All-digit words also match gymnast and entry ids exactly.
+    """
+    conditions = []
+    for word in tokenize(search_query):
+        options = [
+            models.Gymnasts.id.in_(_matching('gymnast', word)),
+            models.Gymnasts.club_id.in_(_matching('club', word)),
+            models.Entries.competition_id.in_(
+                _matching('competition', word)
+            ),
+            models.Scores.apparatus_id.in_(_matching('apparatus', word)),
+        ]
+        if word.isdigit():
+            options.append(models.Gymnasts.id == int(word))
+            options.append(models.Entries.id == int(word))
+        conditions.append(db.or_(*options))
+
+    if not conditions:
+        return db.false()
+    return db.and_(*conditions)
@@ -0,0 +1,80 @@
+"""Request coalescing: one computation per key, shared by concurrent callers.
+
+When a competition goes live many spectators ask for the same leaderboard
+in the same second, and without coordination each request runs the same
+queries. ``flights.do(key, function)`` runs ``function`` in the first
+request to ask (the leader); requests for the same key that arrive while
+it is running wait for it and get its result (or its exception) instead
+of running their own. Nothing is kept once the leader finishes, so this
+only removes duplicate work done at the same moment; keeping results for
+longer is the page cache's job.
+
+Results are handed to other threads, so functions must return plain data
+(tuples, namedtuples, dicts) or objects that are safe to share, never ORM
+instances bound to the leader's session.
+
+Keys are tuples whose first item names the kind of work; ``stats`` counts
+leaders and coalesced requests per kind.
+"""
+
+import threading
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that have the same key."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._counts = {}
+
+    def _count(self, kind, field):
+        # Caller holds the lock
+        counts = self._counts.setdefault(kind, {'leaders': 0, 'coalesced': 0})
+        counts[field] += 1
+
+    def do(self, key, function):
+        """Return ``function()``, sharing one call among concurrent callers.
+
+        ``key`` must be hashable and identify everything the result
+        depends on.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            self._count(key[0], 'leaders' if leader else 'coalesced')
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = function()
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+    def stats(self):
+        """Leaders and coalesced requests so far, by kind of work."""
+        with self._lock:
+            return {kind: dict(counts)
+                    for kind, counts in self._counts.items()}
+
+
+flights = SingleFlight()
@@ -0,0 +1,168 @@
+"""Per-request SQL statistics and N+1 detection.
+
+For a sample of requests (``SQL_STATS_SAMPLE_RATE``, 0 to 1) the engine's
+cursor events record how many statements the request ran, the time spent
+in them and the slowest one. Statements are grouped by shape, the SQL with
+every parameter (and every ``IN`` list) reduced to ``?``; a SELECT shape
+that runs ``SQL_STATS_REPEAT_THRESHOLD`` times or more in one request is
+reported as a likely N+1, a query run once per row of an earlier one.
+(Repeated INSERTs are how the ORM flushes new rows, so they are counted
+but not reported.)
+
+Each sampled request logs one JSON line to the ``sql_stats`` logger, at
+WARNING when it has a likely N+1 and INFO otherwise. With
+``SQL_STATS_HEADER`` the response also carries an ``X-SQL-Stats`` header.
+Requests that are not sampled only pay for a ``g`` lookup per statement,
+and with a sample rate of 0 no listeners are installed at all.
+
+Statements run while a streamed response is being sent (``/live/stream``,
+the results export) come after the request is logged and are not counted.
+"""
+
+from collections import Counter
+import json
+import logging
+import random
+import re
+import time
+
+from flask import g, has_app_context, request
+from flask.logging import default_handler
+from sqlalchemy import event
+
+from extensions import db
+
+
+logger = logging.getLogger('sql_stats')
+
+# Logged statements are cut to this many characters
+STATEMENT_LENGTH = 300
+
+# Bound parameters in any paramstyle, string and number literals
+_PLACEHOLDER = re.compile(
+    r"\?|%\(\w+\)s|%s|(?<!:):\w+|'(?:[^']|'')*'|\b\d+\b"
+)
+_LIST = re.compile(r'\?(?:\s*,\s*\?)+')
+_SPACE = re.compile(r'\s+')
+
+
+def statement_shape(statement):
+    """``statement`` with parameters, literals and ``IN`` lists as ``?``."""
+    shape = _PLACEHOLDER.sub('?', statement)
+    shape = _LIST.sub('?', shape)
+    return _SPACE.sub(' ', shape).strip()
+
+
+class RequestQueries:
+    """The statements one request ran."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest = None
+        self.slowest_seconds = 0.0
+        self.shapes = Counter()
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        if seconds >= self.slowest_seconds:
+            self.slowest = statement
+            self.slowest_seconds = seconds
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold):
+        """(shape, count) for the SELECT shapes run ``threshold`` times or
+        more."""
+        return [(shape, count) for shape, count in self.shapes.most_common()
+                if count >= threshold and shape.startswith('SELECT')]
+
+
+def _current():
+    return g.get('_sql_stats') if has_app_context() else None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    if _current() is not None:
+        conn.info.setdefault('sql_stats_start', []).append(
+            time.perf_counter()
+        )
+
+
+def _record_statement(conn, statement):
+    queries = _current()
+    starts = conn.info.get('sql_stats_start')
+    if queries is not None and starts:
+        queries.record(statement, time.perf_counter() - starts.pop())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    _record_statement(conn, statement)
+
+
+def _handle_error(context):
+    # A failed statement still ran, and its start time must come off the
+    # stack
+    if context.connection is not None and context.statement is not None:
+        _record_statement(context.connection, context.statement)
+
+
+def init_app(app):
+    """Install the listeners and request hooks if sampling is on."""
+    rate = app.config.get('SQL_STATS_SAMPLE_RATE', 0)
+    if rate <= 0:
+        return
+    threshold = app.config.get('SQL_STATS_REPEAT_THRESHOLD', 5)
+    header = app.config.get('SQL_STATS_HEADER', False)
+
+    if logger.level == logging.NOTSET:
+        logger.setLevel(logging.INFO)
+    if not logger.handlers:
+        logger.addHandler(default_handler)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute',
+                     _before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute',
+                     _after_cursor_execute)
+        event.listen(db.engine, 'handle_error', _handle_error)
+
+    @app.before_request
+    def start_sql_stats():
+        if rate >= 1 or random.random() < rate:
+            g._sql_stats = RequestQueries()
+
+    @app.after_request
+    def report_sql_stats(response):
+        queries = g.pop('_sql_stats', None)
+        if queries is None:
+            return response
+
+        repeated = queries.repeated(threshold)
+        logger.log(
+            logging.WARNING if repeated else logging.INFO,
+            json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'endpoint': request.endpoint,
+                'status': response.status_code,
+                'queries': queries.count,
+                'db_ms': round(queries.seconds * 1000, 2),
+                'slowest_ms': round(queries.slowest_seconds * 1000, 2),
+                'slowest': (queries.slowest or '')[:STATEMENT_LENGTH],
+                'likely_n_plus_one': [
+                    {'count': count, 'statement': shape[:STATEMENT_LENGTH]}
+                    for shape, count in repeated
+                ],
+            })
+        )
+        if header:
+            response.headers['X-SQL-Stats'] = (
+                f'queries={queries.count}; '
+                f'db_ms={queries.seconds * 1000:.2f}; '
+                f'slowest_ms={queries.slowest_seconds * 1000:.2f}; '
+                f'repeated={len(repeated)}'
+            )
+        return response
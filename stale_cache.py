@@ -0,0 +1,157 @@
+"""Stale-while-revalidate cache for data that may lag a few seconds.
+
+Top NZ rankings and a gymnast's best scores are slow to compute. A value
+cached here is fresh for ``STALE_CACHE_SOFT_TTL`` seconds. After that it is
+still served at once, and one background thread recomputes it with the
+same function. A value is never served more than ``STALE_CACHE_HARD_TTL``
+seconds after it was computed; a request that finds none waits for it to
+be computed (once, however many requests are waiting).
+
+Values are tagged like pages in ``page_cache`` and share its tag tokens,
+so the ``page_cache.invalidate`` call every write makes after committing
+(``score_tags`` for score changes) purges them as well. A purged value is
+never served stale, and a refresh that was running during the purge is
+thrown away.
+
+Values are computed outside the request that first asked for them, so the
+functions take plain arguments, query for themselves and return plain
+rows (see ``single_flight``).
+
+Under uWSGI without ``enable-threads`` threads started by the app never
+run, so there the request that finds a value stale refreshes it itself
+while concurrent requests keep getting the stale value.
+"""
+
+from collections import namedtuple
+import queue
+import sys
+import threading
+import time
+
+from page_cache import MemoryBackend, page_cache
+from single_flight import flights
+
+
+# ``tokens`` maps each tag to its page cache token when computed
+StaleEntry = namedtuple('StaleEntry', 'value fresh_until expires tokens')
+
+
+def _threads_run():
+    """False under uWSGI without ``enable-threads`` (or ``threads``)."""
+    uwsgi = sys.modules.get('uwsgi')
+    if uwsgi is None:
+        return True
+    return bool(uwsgi.opt.get('enable-threads') or uwsgi.opt.get('threads'))
+
+
+class StaleCache:
+    """In-process stale-while-revalidate cache; see ``init_app``."""
+
+    def __init__(self):
+        self.app = None
+        self.soft_ttl = 10
+        self.hard_ttl = 300
+        self.entries = MemoryBackend()
+        self.background = True
+        self.stale_hits = 0
+        self.refreshes = 0
+        self._queue = queue.Queue()
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def init_app(self, app):
+        """Read ``STALE_CACHE_*`` config.
+
+        ``STALE_CACHE_SOFT_TTL`` is how long a value is fresh and
+        ``STALE_CACHE_HARD_TTL`` how long it may be served at all, in
+        seconds; a hard TTL of 0 turns the cache off.
+        ``STALE_CACHE_SIZE`` is how many values are kept. Refreshes run in
+        a background thread wherever threads run.
+        """
+        self.app = app
+        self.soft_ttl = app.config.get('STALE_CACHE_SOFT_TTL', 10)
+        self.hard_ttl = app.config.get('STALE_CACHE_HARD_TTL', 300)
+        self.entries = MemoryBackend(app.config.get('STALE_CACHE_SIZE', 1000))
+        self.background = _threads_run()
+
+    def get(self, key, tags, function):
+        """Return the cached ``function()`` for ``key``.
+
+        ``key`` is a hashable tuple naming the kind of value first, as for
+        ``flights.do``. ``tags`` are the page cache tags whose invalidation
+        purges the value.
+        """
+        if self.hard_ttl <= 0:
+            return function()
+
+        entry = self.entries.get(key)
+        now = time.time()
+        if (entry is not None and entry.expires > now
+                and page_cache.tokens(entry.tokens) == entry.tokens):
+            if entry.fresh_until <= now:
+                with self._lock:
+                    self.stale_hits += 1
+                if self._claim(key):
+                    if not self.background:
+                        return self._refresh(key, tags, function,
+                                             entry.value)
+                    self._schedule(key, tags, function)
+            return entry.value
+
+        return flights.do(key, lambda: self._compute(key, tags, function))
+
+    def _compute(self, key, tags, function):
+        tokens = page_cache.tokens(tags)
+        value = function()
+        now = time.time()
+        self.entries.set(key, StaleEntry(
+            value, now + self.soft_ttl, now + self.hard_ttl, tokens
+        ))
+        return value
+
+    def _claim(self, key):
+        """Mark ``key`` as being refreshed; False if it already is."""
+        with self._lock:
+            if key in self._queued:
+                return False
+            self._queued.add(key)
+            return True
+
+    def _schedule(self, key, tags, function):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._refresh_forever, name='stale-cache',
+                    daemon=True
+                )
+                self._worker.start()
+        self._queue.put((key, tags, function))
+
+    def _refresh(self, key, tags, function, stale=None):
+        """Recompute a claimed value; returns it, or ``stale`` on error."""
+        try:
+            value = self._compute(key, tags, function)
+            with self._lock:
+                self.refreshes += 1
+            return value
+        except Exception:
+            # The stale value stays until its hard TTL; the next request
+            # for it tries again
+            self.app.logger.exception('Refreshing %r failed', key)
+            return stale
+        finally:
+            with self._lock:
+                self._queued.discard(key)
+
+    def _refresh_forever(self):
+        while True:
+            key, tags, function = self._queue.get()
+            with self.app.app_context():
+                self._refresh(key, tags, function)
+
+    def clear(self):
+        self.entries.clear()
+
+
+stale_cache = StaleCache()
@@ -50,6 +50,7 @@ document.addEventListener("DOMContentLoaded", () => {
   initializeEntriesPage();
   initializeScoringPage();
   initializeResultsPage();
+  initializeLiveStream();
 });
 
 /*
@@ -187,6 +188,614 @@ function initializeScoringPage() {
   document.querySelectorAll('.execution-input').forEach(input => {
     input.addEventListener('input', updateAverage);
   });
+
+  initializeScoreSubmission();
+}
+
+/*
+ * SCORING PAGE IN-PLACE SUBMISSION
+ * ================================
+ * Queues each score from the form on the device and sends the queue to /api/scoring/sync
+ * as JSON instead of posting the whole page. Saved scores are added to (or replaced in)
+ * the Recent Scores table and the gymnast's and competition's progress are updated from
+ * the response, so the console never reloads. Rotation mode submits a whole apparatus
+ * rotation for one level in a single request.
+ */
+function initializeScoreSubmission() {
+  const form = document.getElementById('scoring-form');
+  const table = document.getElementById('scores-table');
+
+  if (!form || !form.dataset.syncUrl || !table || !window.fetch) return;
+
+  const tbody = table.querySelector('tbody');
+  const messages = document.getElementById('scoring-messages');
+  const csrfInput = form.querySelector('input[name="csrf_token"]');
+
+  function formatScore(value) {
+    return Number(value).toFixed(3);
+  }
+
+  function showMessages(texts, category) {
+    messages.innerHTML = '';
+    texts.forEach(text => {
+      const div = document.createElement('div');
+      div.className = `flash-message flash-${category}`;
+      div.textContent = text;
+      messages.appendChild(div);
+    });
+  }
+
+  function statusCell(cell, progress) {
+    const span = document.createElement('span');
+    if (progress.is_complete) {
+      span.className = 'status-complete';
+    } else {
+      span.className = 'status-progress';
+      span.textContent = `${progress.scored_count}/${progress.total_count}`;
+    }
+    cell.innerHTML = '';
+    cell.appendChild(span);
+  }
+
+  function buildRow(score) {
+    const tr = document.createElement('tr');
+    tr.dataset.scoreId = score.id;
+    tr.dataset.entryId = score.entry_id;
+    for (let i = 0; i < 11; i++) {
+      tr.appendChild(document.createElement('td'));
+    }
+    tr.cells[0].className = 'score-status';
+    tr.cells[5].className = 'judge-scores';
+    tr.cells[10].className = 'actions';
+
+    const deleteForm = document.createElement('form');
+    deleteForm.method = 'POST';
+    deleteForm.action = score.delete_url;
+    deleteForm.style.display = 'inline';
+    deleteForm.addEventListener('submit', e => {
+      if (!confirm('Delete this score?')) e.preventDefault();
+    });
+    if (csrfInput) deleteForm.appendChild(csrfInput.cloneNode());
+    const deleteButton = document.createElement('button');
+    deleteButton.type = 'submit';
+    deleteButton.className = 'btn btn-danger btn-sm';
+    deleteButton.textContent = 'Delete';
+    deleteForm.appendChild(deleteButton);
+    tr.cells[10].appendChild(deleteForm);
+    return tr;
+  }
+
+  function fillRow(tr, score) {
+    tr.cells[1].textContent = `#${String(score.gymnast_id).padStart(3, '0')}`;
+    tr.cells[2].textContent = score.gymnast_name;
+    tr.cells[3].textContent = score.level;
+    tr.cells[4].textContent = score.apparatus_name;
+
+    const judgeCell = tr.cells[5];
+    judgeCell.innerHTML = '';
+    if (score.judge_scores.length) {
+      score.judge_scores.forEach(judge => {
+        const span = document.createElement('span');
+        span.className = 'judge-score';
+        span.textContent = `J${judge.judge_number}: ${formatScore(judge.e_score)}`;
+        judgeCell.appendChild(span);
+      });
+    } else {
+      const span = document.createElement('span');
+      span.className = 'no-judge-scores';
+      span.textContent = 'No judge scores';
+      judgeCell.appendChild(span);
+    }
+
+    tr.cells[6].textContent = formatScore(score.e_score);
+    tr.cells[7].textContent = formatScore(score.d_score);
+    tr.cells[8].textContent = formatScore(score.penalty);
+    const total = document.createElement('strong');
+    total.textContent = formatScore(score.total);
+    tr.cells[9].innerHTML = '';
+    tr.cells[9].appendChild(total);
+  }
+
+  function placeRow(score) {
+    let tr = tbody.querySelector(`tr[data-score-id="${score.id}"]`);
+    if (!tr) {
+      tr = buildRow(score);
+      // Keep each gymnast's scores together, as the page renders them
+      const siblings = tbody.querySelectorAll(`tr[data-entry-id="${score.entry_id}"]`);
+      if (siblings.length) {
+        siblings[siblings.length - 1].after(tr);
+      } else {
+        tbody.appendChild(tr);
+      }
+    }
+    fillRow(tr, score);
+  }
+
+  function updateEntryProgress(entryId, progress) {
+    tbody.querySelectorAll(`tr[data-entry-id="${entryId}"]`).forEach(tr => {
+      tr.classList.toggle('complete-row', progress.is_complete);
+      statusCell(tr.cells[0], progress);
+    });
+  }
+
+  function updateOverallProgress(overall) {
+    const badge = document.getElementById('overall-progress-badge');
+    if (badge) {
+      badge.className = overall.is_complete ? 'completion-badge' : 'progress-badge';
+      badge.textContent = overall.is_complete
+        ? 'Complete'
+        : `${overall.fully_scored}/${overall.total_gymnasts}`;
+    }
+
+    const fill = document.getElementById('overall-progress-fill');
+    if (fill) fill.style.width = `${overall.percentage}%`;
+
+    const text = document.getElementById('overall-progress-text');
+    if (text) text.textContent = `${Math.round(overall.percentage)}% Complete`;
+
+    const completion = document.getElementById('completion-message');
+    if (completion) {
+      completion.style.display = overall.is_complete ? '' : 'none';
+      document.getElementById('completion-total').textContent = overall.total_gymnasts;
+    }
+  }
+
+  function postJson(url, payload) {
+    return fetch(url, {
+      method: 'POST',
+      credentials: 'same-origin',
+      headers: {
+        'Content-Type': 'application/json',
+        'X-CSRFToken': csrfInput ? csrfInput.value : ''
+      },
+      body: JSON.stringify(payload)
+    }).then(response => response.json().then(data => ({ ok: response.ok, data })));
+  }
+
+  function resetScoreInputs() {
+    form.querySelectorAll('.execution-input, #d_score, #penalty').forEach(input => {
+      input.value = '';
+    });
+    const firstInput = form.querySelector('.execution-input');
+    if (firstInput) firstInput.dispatchEvent(new Event('input'));
+  }
+
+  /*
+   * Offline queue: each score is stored on the device with a generated key and
+   * sent to /api/scoring/sync in batches. Anything the server has not
+   * acknowledged stays queued and is retried with backoff, so judges can keep
+   * scoring through Wi-Fi drops. Resending a key the server has already applied
+   * is harmless, so a retry after a lost response never writes a score twice.
+   */
+  const queueStorageKey = 'stagScoreQueue';
+  const queueBatchSize = 20;
+  const queueStatus = document.getElementById('score-queue-status');
+  let queue = loadQueue();
+  let flushing = false;
+  let retryDelay = 0;
+  let retryTimer = null;
+
+  function loadQueue() {
+    try {
+      return JSON.parse(localStorage.getItem(queueStorageKey)) || [];
+    } catch (err) {
+      return [];
+    }
+  }
+
+  function saveQueue() {
+    try {
+      localStorage.setItem(queueStorageKey, JSON.stringify(queue));
+    } catch (err) {
+      // Storage unavailable (e.g. private browsing); keep the queue in memory
+    }
+    updateQueueStatus();
+  }
+
+  function updateQueueStatus() {
+    if (!queueStatus) return;
+    queueStatus.style.display = queue.length ? '' : 'none';
+    queueStatus.querySelector('.queue-count').textContent =
+      `${queue.length} score${queue.length === 1 ? '' : 's'} waiting to send`;
+  }
+
+  function newKey() {
+    if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+  }
+
+  function scheduleRetry() {
+    retryDelay = Math.min(retryDelay ? retryDelay * 2 : 2000, 60000);
+    clearTimeout(retryTimer);
+    retryTimer = setTimeout(flushQueue, retryDelay);
+  }
+
+  function flushQueue() {
+    if (flushing || !queue.length) return;
+    flushing = true;
+    clearTimeout(retryTimer);
+
+    const batch = queue.slice(0, queueBatchSize);
+    let sendMore = false;
+
+    postJson(form.dataset.syncUrl, { scores: batch })
+      .then(({ ok, data }) => {
+        if (!ok) {
+          // Logged out, no live competition or an expired page: retrying
+          // will not help until the judge acts, so keep the queue and wait
+          showMessages(data.errors || ['The queued scores could not be sent.'], 'danger');
+          return;
+        }
+
+        const byKey = {};
+        batch.forEach(item => { byKey[item.key] = item; });
+        const problems = [];
+
+        data.results.forEach(result => {
+          if (result.score) {
+            placeRow(result.score);
+            updateEntryProgress(result.score.entry_id, result.progress);
+          }
+          if (result.status === 'invalid') {
+            const item = byKey[result.key];
+            problems.push(`${item ? item.label : 'Score'}: ${result.errors.join(' ')}`);
+          }
+        });
+
+        // Every score in the batch has been answered, including invalid
+        // ones, which would only fail again
+        const answered = new Set(batch.map(item => item.key));
+        queue = queue.filter(item => !answered.has(item.key));
+        saveQueue();
+
+        updateOverallProgress(data.overall_progress);
+        if (problems.length) {
+          showMessages(problems, 'danger');
+        } else if (data.messages.length) {
+          showMessages(data.messages, 'success');
+        }
+
+        retryDelay = 0;
+        sendMore = queue.length > 0;
+      })
+      .catch(() => {
+        // Offline or the server is struggling; try again later
+        scheduleRetry();
+      })
+      .finally(() => {
+        flushing = false;
+        if (sendMore) flushQueue();
+      });
+  }
+
+  function checkScoreInputs(item) {
+    const inRange = value => !isNaN(value) && value >= 0 && value <= 10;
+    if (item.entry_id === '0' || item.apparatus_id === '0') {
+      return 'Please select a gymnast and an apparatus.';
+    }
+    if (item.d_score === '' || !inRange(Number(item.d_score))) {
+      return 'Difficulty score must be between 0 and 10.';
+    }
+    if (item.penalty !== '' && !inRange(Number(item.penalty))) {
+      return 'Penalty must be between 0 and 10.';
+    }
+    if (!item.execution_scores.length ||
+        !item.execution_scores.every(value => inRange(Number(value)))) {
+      return 'Execution scores must be between 0 and 10.';
+    }
+    return null;
+  }
+
+  form.addEventListener('submit', e => {
+    e.preventDefault();
+
+    const entrySelect = form.querySelector('#entry_id');
+    const apparatusSelect = form.querySelector('#apparatus_id');
+    const item = {
+      key: newKey(),
+      entry_id: entrySelect.value,
+      apparatus_id: apparatusSelect.value,
+      d_score: form.querySelector('#d_score').value.trim(),
+      penalty: form.querySelector('#penalty').value.trim(),
+      execution_scores: Array.from(form.querySelectorAll('.execution-input'))
+        .map(input => input.value)
+        .filter(value => value !== ''),
+      label: `${entrySelect.selectedOptions[0].textContent} on ` +
+        apparatusSelect.selectedOptions[0].textContent
+    };
+
+    const problem = checkScoreInputs(item);
+    if (problem) {
+      showMessages([problem], 'danger');
+      return;
+    }
+
+    queue.push(item);
+    saveQueue();
+    resetScoreInputs();
+
+    if (!navigator.onLine) {
+      showMessages(['Offline: the score is saved on this device and will be sent when ' +
+        'the connection returns.'], 'warning');
+    }
+    flushQueue();
+  });
+
+  if (queueStatus) {
+    queueStatus.querySelector('.queue-send').addEventListener('click', () => {
+      retryDelay = 0;
+      flushQueue();
+    });
+  }
+  window.addEventListener('online', () => {
+    retryDelay = 0;
+    flushQueue();
+  });
+  updateQueueStatus();
+  flushQueue();
+
+  initializeModeToggle();
+  initializeRotationMode();
+  initializePanelMode();
+
+  /*
+   * Mode toggle: switches between the single score form, rotation mode and
+   * panel mode. Only shown once the script is running, as the other modes
+   * need it.
+   */
+  function initializeModeToggle() {
+    const toggle = document.getElementById('scoring-mode-toggle');
+    if (!toggle) return;
+
+    const sections = {
+      single: form,
+      rotation: document.getElementById('rotation-entry'),
+      panel: document.getElementById('panel-entry')
+    };
+
+    toggle.style.display = '';
+    toggle.querySelectorAll('button').forEach(button => {
+      button.addEventListener('click', () => {
+        Object.keys(sections).forEach(mode => {
+          if (sections[mode]) {
+            sections[mode].style.display = mode === button.dataset.mode ? '' : 'none';
+          }
+        });
+        toggle.querySelectorAll('button').forEach(other => {
+          other.classList.toggle('btn-primary', other === button);
+        });
+      });
+    });
+  }
+
+  /*
+   * Rotation mode: one row per gymnast at the chosen level, all sent to
+   * /api/scoring/rotation together. The server saves every row or none, and
+   * returns a result per row which is shown next to that gymnast.
+   */
+  function initializeRotationMode() {
+    const rotation = document.getElementById('rotation-entry');
+
+    if (!rotation) return;
+
+    const levelSelect = document.getElementById('rotation-level');
+    const apparatusSelect = document.getElementById('rotation-apparatus');
+    const judgesSelect = document.getElementById('rotation-judges');
+    const rotationButton = document.getElementById('rotation-submit');
+    const rows = Array.from(rotation.querySelectorAll('tbody tr'));
+
+    function showLevel() {
+      rows.forEach(tr => {
+        tr.style.display = tr.dataset.level === levelSelect.value ? '' : 'none';
+      });
+    }
+
+    function renderJudgeInputs() {
+      const count = Number(judgesSelect.value);
+      rows.forEach(tr => {
+        const cell = tr.querySelector('.rotation-execution');
+        while (cell.children.length < count) {
+          const input = document.createElement('input');
+          input.type = 'number';
+          input.step = '0.001';
+          input.min = '0';
+          input.max = '10';
+          input.placeholder = `J${cell.children.length + 1}`;
+          input.className = 'form-control rotation-e';
+          cell.appendChild(input);
+        }
+        while (cell.children.length > count) {
+          cell.lastElementChild.remove();
+        }
+      });
+    }
+
+    function rowInputs(tr) {
+      return Array.from(tr.querySelectorAll('input'));
+    }
+
+    function setResult(tr, text, className) {
+      const cell = tr.querySelector('.rotation-result');
+      cell.textContent = text;
+      cell.className = `rotation-result ${className || ''}`;
+    }
+
+    levelSelect.addEventListener('change', showLevel);
+    judgesSelect.addEventListener('change', renderJudgeInputs);
+    showLevel();
+    renderJudgeInputs();
+
+    rotationButton.addEventListener('click', () => {
+      // Only gymnasts with something entered are part of the rotation
+      const filled = rows.filter(tr =>
+        tr.style.display !== 'none' && rowInputs(tr).some(input => input.value !== '')
+      );
+
+      if (!filled.length) {
+        showMessages(['Enter at least one score for the rotation.'], 'warning');
+        return;
+      }
+
+      const payload = {
+        rows: filled.map(tr => ({
+          entry_id: tr.dataset.entryId,
+          apparatus_id: apparatusSelect.value,
+          d_score: tr.querySelector('.rotation-d').value,
+          penalty: tr.querySelector('.rotation-penalty').value,
+          execution_scores: Array.from(tr.querySelectorAll('.rotation-e'))
+            .map(input => input.value)
+        }))
+      };
+
+      rotationButton.disabled = true;
+
+      postJson(rotation.dataset.apiUrl, payload)
+        .then(({ ok, data }) => {
+          (data.results || []).forEach(result => {
+            const tr = filled[result.index];
+            if (result.status === 'saved') {
+              setResult(tr, `✓ ${formatScore(result.score.total)}`, 'rotation-saved');
+              rowInputs(tr).forEach(input => { input.value = ''; });
+              placeRow(result.score);
+              updateEntryProgress(result.score.entry_id, result.progress);
+            } else if (result.status === 'invalid') {
+              setResult(tr, result.errors.join(' '), 'rotation-invalid');
+            } else {
+              setResult(tr, '');
+            }
+          });
+
+          if (!ok) {
+            showMessages(data.errors || ['The rotation could not be saved.'], 'danger');
+            return;
+          }
+          updateOverallProgress(data.overall_progress);
+          showMessages(data.messages, 'success');
+        })
+        .catch(() => {
+          showMessages(['Could not reach the server. Nothing was saved; please try again.'], 'danger');
+        })
+        .finally(() => {
+          rotationButton.disabled = false;
+        });
+    });
+  }
+
+  /*
+   * Panel mode: each judge sends only their own E-score to /api/scoring/panel.
+   * The judge number and panel size are remembered on the device, since a
+   * tablet stays with one judge for the whole competition. The server saves
+   * the score once the last judge is in and returns it for the table.
+   */
+  function initializePanelMode() {
+    const panel = document.getElementById('panel-entry');
+
+    if (!panel) return;
+
+    const judgeSelect = document.getElementById('panel-judge');
+    const sizeSelect = document.getElementById('panel-size');
+    const entrySelect = document.getElementById('panel-entry-id');
+    const apparatusSelect = document.getElementById('panel-apparatus');
+    const eInput = document.getElementById('panel-e');
+    const dInput = document.getElementById('panel-d');
+    const penaltyInput = document.getElementById('panel-penalty');
+    const status = document.getElementById('panel-status');
+    const panelButton = document.getElementById('panel-submit');
+    const panelStorageKey = 'stagPanelSetup';
+
+    function restoreSetup() {
+      try {
+        const setup = JSON.parse(localStorage.getItem(panelStorageKey)) || {};
+        if (setup.judge) judgeSelect.value = setup.judge;
+        if (setup.size) sizeSelect.value = setup.size;
+      } catch (err) {
+        // Nothing saved yet
+      }
+    }
+
+    function saveSetup() {
+      try {
+        localStorage.setItem(panelStorageKey, JSON.stringify({
+          judge: judgeSelect.value,
+          size: sizeSelect.value
+        }));
+      } catch (err) {
+        // Storage unavailable; the judge picks again next time
+      }
+    }
+
+    function showChairFields() {
+      const isChair = judgeSelect.value === '1';
+      panel.querySelectorAll('.panel-chair-field').forEach(field => {
+        field.style.display = isChair ? '' : 'none';
+      });
+    }
+
+    judgeSelect.addEventListener('change', () => { saveSetup(); showChairFields(); });
+    sizeSelect.addEventListener('change', saveSetup);
+    restoreSetup();
+    showChairFields();
+
+    panelButton.addEventListener('click', () => {
+      const isChair = judgeSelect.value === '1';
+      const inRange = value => value !== '' && !isNaN(value) && value >= 0 && value <= 10;
+
+      if (entrySelect.value === '0' || apparatusSelect.value === '0') {
+        showMessages(['Please select a gymnast and an apparatus.'], 'danger');
+        return;
+      }
+      if (!inRange(eInput.value)) {
+        showMessages(['Execution score must be between 0 and 10.'], 'danger');
+        return;
+      }
+      if (isChair && !inRange(dInput.value)) {
+        showMessages(['Difficulty score must be between 0 and 10.'], 'danger');
+        return;
+      }
+
+      const payload = {
+        entry_id: entrySelect.value,
+        apparatus_id: apparatusSelect.value,
+        judge_number: judgeSelect.value,
+        panel_size: sizeSelect.value,
+        e_score: eInput.value
+      };
+      if (isChair) {
+        payload.d_score = dInput.value;
+        payload.penalty = penaltyInput.value;
+      }
+
+      panelButton.disabled = true;
+
+      postJson(panel.dataset.apiUrl, payload)
+        .then(({ ok, data }) => {
+          if (!ok) {
+            showMessages(data.errors || ['Your score could not be sent.'], 'danger');
+            return;
+          }
+
+          [eInput, dInput, penaltyInput].forEach(input => { input.value = ''; });
+          if (data.status === 'complete') {
+            status.textContent = '';
+            placeRow(data.score);
+            updateEntryProgress(data.score.entry_id, data.progress);
+            updateOverallProgress(data.overall_progress);
+            showMessages(data.messages, 'success');
+          } else {
+            status.textContent = `${entrySelect.selectedOptions[0].textContent} on ` +
+              `${apparatusSelect.selectedOptions[0].textContent}: waiting for judge` +
+              `${data.waiting_for.length === 1 ? '' : 's'} ${data.waiting_for.join(', ')}`;
+            showMessages(data.messages, 'info');
+          }
+        })
+        .catch(() => {
+          showMessages(['Could not reach the server. Your score was not sent; please try again.'], 'danger');
+        })
+        .finally(() => {
+          panelButton.disabled = false;
+        });
+    });
+  }
 }
 
 /*
@@ -237,6 +846,151 @@ function initializeResultsPage() {
   });
 }
 
+/*
+ * LIVE LEADERBOARD STREAM
+ * =======================
+ * Subscribes to /live/stream for the selected level and apparatus and patches the
+ * leaderboard table in place. The server sends a full snapshot first, then only the
+ * rows that were added, changed or re-ranked, so the page never needs reloading.
+ * When the server has no stream to spare it answers 204, which closes the
+ * EventSource; the page then polls the JSON leaderboard, which answers 304 until
+ * something changes.
+ */
+const LIVE_POLL_INTERVAL = 5000;
+
+function initializeLiveStream() {
+  const table = document.getElementById('leaderboard-table');
+
+  if (!table || !table.dataset.streamUrl) return;
+
+  const tbody = table.querySelector('tbody');
+  const wrapper = table.closest('.live-table');
+  const emptyMessage = document.getElementById('leaderboard-empty');
+
+  function formatScore(value) {
+    return Number(value).toFixed(3);
+  }
+
+  function buildRow(data) {
+    const tr = document.createElement('tr');
+    tr.className = 'leaderboard-row';
+    tr.tabIndex = 0;
+    tr.dataset.entryId = data.entry_id;
+    for (let i = 0; i < 7; i++) {
+      tr.appendChild(document.createElement('td'));
+    }
+    return tr;
+  }
+
+  function fillRow(tr, data) {
+    const values = [
+      data.rank, data.name, data.club_name,
+      formatScore(data.e_score), formatScore(data.d_score),
+      formatScore(data.penalty), formatScore(data.total)
+    ];
+    tr.querySelectorAll('td').forEach((cell, index) => {
+      cell.textContent = values[index];
+    });
+
+    tr.dataset.rank = data.rank;
+    tr.dataset.gymnastId = data.gymnast_id;
+    tr.dataset.gymnastName = data.name;
+    tr.dataset.eScore = formatScore(data.e_score);
+    tr.dataset.dScore = formatScore(data.d_score);
+    tr.dataset.penalty = formatScore(data.penalty);
+    tr.dataset.total = formatScore(data.total);
+  }
+
+  function findRow(entryId) {
+    return tbody.querySelector(`tr[data-entry-id="${entryId}"]`);
+  }
+
+  function reorderRows() {
+    const rows = Array.from(tbody.querySelectorAll('tr.leaderboard-row'));
+    // Tied totals share a rank; the server lists them by name
+    rows.sort((a, b) => Number(a.dataset.rank) - Number(b.dataset.rank) ||
+      (a.dataset.gymnastName > b.dataset.gymnastName) -
+      (a.dataset.gymnastName < b.dataset.gymnastName));
+    rows.forEach(row => tbody.appendChild(row));
+
+    const hasRows = rows.length > 0;
+    if (wrapper) wrapper.style.display = hasRows ? '' : 'none';
+    if (emptyMessage) emptyMessage.style.display = hasRows ? 'none' : '';
+  }
+
+  function applyRows(rows) {
+    rows.forEach(data => {
+      let tr = findRow(data.entry_id);
+      if (!tr) {
+        tr = buildRow(data);
+        tbody.appendChild(tr);
+      }
+      fillRow(tr, data);
+    });
+  }
+
+  function showSnapshot(rows) {
+    tbody.innerHTML = '';
+    applyRows(rows);
+    reorderRows();
+  }
+
+  let etag = null;
+
+  function poll() {
+    if (!table.dataset.pollUrl || !window.fetch) return;
+    const headers = etag ? { 'If-None-Match': etag } : {};
+    fetch(table.dataset.pollUrl, { headers, cache: 'no-store' })
+      .then(response => {
+        if (response.status === 304) return null;
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        etag = response.headers.get('ETag');
+        return response.json();
+      })
+      .then(payload => {
+        if (payload) {
+          showSnapshot(payload.rows);
+          // Nothing changes once the competition is over
+          if (payload.status !== 'live') return;
+        }
+        setTimeout(poll, LIVE_POLL_INTERVAL);
+      })
+      .catch(() => setTimeout(poll, LIVE_POLL_INTERVAL));
+  }
+
+  if (!window.EventSource) {
+    setTimeout(poll, LIVE_POLL_INTERVAL);
+    return;
+  }
+
+  const source = new EventSource(table.dataset.streamUrl);
+
+  source.addEventListener('snapshot', e => {
+    showSnapshot(JSON.parse(e.data).rows);
+  });
+
+  source.addEventListener('delta', e => {
+    const payload = JSON.parse(e.data);
+    payload.removed.forEach(entryId => {
+      const tr = findRow(entryId);
+      if (tr) tr.remove();
+    });
+    applyRows(payload.rows);
+    reorderRows();
+  });
+
+  source.addEventListener('end', () => {
+    source.close();
+  });
+
+  // A dropped connection is retried by the browser; a 204 closes the source
+  source.addEventListener('error', () => {
+    if (source.readyState === EventSource.CLOSED) {
+      setTimeout(poll, LIVE_POLL_INTERVAL);
+    }
+  });
+}
+
 /*
  * ADVANCED SEARCHABLE GYMNAST SELECTOR
  * ====================================
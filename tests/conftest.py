@@ -0,0 +1,122 @@
+"""Shared fixtures: an app on a throwaway SQLite database, and a live
+competition to score."""
+
+from collections import namedtuple
+
+import pytest
+
+from create_app import create_app, initialize_levels, initialize_seasons
+from extensions import db
+from leaderboard import live_board
+import migrations
+import models
+
+
+# Ids of a competition made by ``make_competition``; ``entry_ids`` and
+# ``gymnast_ids`` are in the same order
+Competition = namedtuple(
+    'Competition', 'id season_id apparatus_ids gymnast_ids entry_ids'
+)
+
+
+@pytest.fixture
+def app_factory(tmp_path):
+    """Make apps on SQLite files in ``tmp_path``, by file name."""
+    apps = []
+
+    def make_app(name='test.db'):
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / name}',
+            'TESTING': True,
+            'WTF_CSRF_ENABLED': False,
+            'PAGE_CACHE_BACKEND': 'none',
+            'STALE_CACHE_HARD_TTL': 0,
+        })
+        apps.append(app)
+        with app.app_context():
+            # As "flask migrate" does on a deploy
+            migrations.upgrade()
+            initialize_seasons()
+            initialize_levels()
+            # The live board is kept per process; forget the last test's
+            live_board.rebuild(None)
+        return app
+
+    yield make_app
+    for app in apps:
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+
+@pytest.fixture
+def app(app_factory):
+    return app_factory()
+
+
+@pytest.fixture
+def admin(app):
+    """A test client signed in as an administrator."""
+    with app.app_context():
+        db.session.add(models.Roles(id=1, name='admin'))
+        db.session.add(models.Users(id=1, email='admin@example.com',
+                                    password='x', role_id=1,
+                                    first_name='Admin'))
+        db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+        session['role_id'] = 1
+    return client
+
+
+@pytest.fixture
+def make_competition():
+    """Make a competition with gymnasts entered in it.
+
+    The club and the Floor, Pommel Horse and Rings apparatus are made with
+    the first competition. Gymnasts are named ``<name> <n>``.
+    """
+    def make(app, gymnast_count=4, status='live', name='Nationals',
+             level='Level 7'):
+        with app.app_context():
+            season = models.Seasons.query.order_by(models.Seasons.year).first()
+            club = models.Clubs.query.first()
+            if club is None:
+                club = models.Clubs(name='Club')
+                db.session.add_all([club, *(
+                    models.Apparatus(name=apparatus)
+                    for apparatus in ('Floor', 'Pommel Horse', 'Rings')
+                )])
+                db.session.flush()
+            competition = models.Competitions(
+                name=name, address='Hall', season_id=season.id,
+                status=status
+            )
+            db.session.add(competition)
+            db.session.flush()
+
+            gymnasts = [
+                models.Gymnasts(name=f'{name} {number}', club_id=club.id,
+                                level=level)
+                for number in range(1, gymnast_count + 1)
+            ]
+            db.session.add_all(gymnasts)
+            db.session.flush()
+            # Entered as the entries page does, with empty totals
+            entries = [
+                models.Entries(competition_id=competition.id,
+                               gymnast_id=gymnast.id,
+                               totals=models.EntryTotals())
+                for gymnast in gymnasts
+            ]
+            db.session.add_all(entries)
+            db.session.commit()
+            return Competition(
+                competition.id, season.id,
+                [apparatus_id for (apparatus_id,) in db.session.query(
+                    models.Apparatus.id).order_by(models.Apparatus.id)],
+                [gymnast.id for gymnast in gymnasts],
+                [entry.id for entry in entries],
+            )
+    return make
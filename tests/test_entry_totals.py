@@ -0,0 +1,86 @@
+"""``entry_totals`` keeps up with every score write and delete, and
+``flask rebuild-entry-totals --verify`` reports any drift that the rebuild
+then repairs."""
+
+from extensions import db
+import models
+import scores
+from totals import find_totals_drift
+
+
+def _save(app, competition, rows):
+    with app.app_context():
+        live = db.session.get(models.Competitions, competition.id)
+        return [score.id for score in scores.save_scores(live, [
+            scores.ScoreRow(competition.entry_ids[entry],
+                            competition.apparatus_ids[apparatus], 5.0, 0.2,
+                            e_scores)
+            for entry, apparatus, e_scores in rows
+        ])]
+
+
+def _row(entry_id):
+    return models.EntryTotals.query.filter_by(entry_id=entry_id).one()
+
+
+def _totals(app, entry_id):
+    with app.app_context():
+        row = _row(entry_id)
+        return row.apparatus_count, float(row.total)
+
+
+def _invoke(app, *args):
+    return app.test_cli_runner().invoke(args=['rebuild-entry-totals',
+                                              *args])
+
+
+def test_writes_keep_entry_totals_current(app, admin, make_competition):
+    competition = make_competition(app, gymnast_count=2)
+    first, second = competition.entry_ids
+    score_id, *_ = _save(app, competition, [
+        (0, 0, [8.0]), (0, 1, [7.0, 7.5]), (1, 0, [9.0]),
+    ])
+    assert _totals(app, first) == (2, 24.85)
+    assert _totals(app, second) == (1, 13.8)
+
+    _save(app, competition, [(0, 1, [8.0])])
+    assert _totals(app, first) == (2, 25.6)
+
+    admin.post(f'/scoring/delete/{score_id}')
+    assert _totals(app, first) == (1, 12.8)
+    with app.app_context():
+        assert find_totals_drift() == []
+
+
+def test_verify_reports_drift_and_rebuild_repairs_it(app, make_competition):
+    competition = make_competition(app, gymnast_count=2)
+    other = make_competition(app, gymnast_count=1, name='Regionals')
+    _save(app, competition, [(0, 0, [8.0]), (1, 0, [9.0])])
+
+    result = _invoke(app, '--verify')
+    assert result.exit_code == 0
+    assert 'Entry totals match the scores' in result.output
+
+    first, second = competition.entry_ids
+    with app.app_context():
+        _row(first).total = 1.5
+        db.session.delete(_row(second))
+        db.session.commit()
+
+    result = _invoke(app, '--verify')
+    assert result.exit_code == 1
+    assert f'Entry {first}: total is 1.5, expected 12.8' in result.output
+    assert f'Entry {second}: total is missing, expected 13.8' \
+        in result.output
+    assert '2 entry totals are out of date' in result.output
+
+    # Other competitions are fine
+    assert _invoke(app, '--verify', '--competition',
+                   str(other.id)).exit_code == 0
+
+    result = _invoke(app, '--competition', str(competition.id))
+    assert result.exit_code == 0
+    assert 'Wrote 2 entry totals' in result.output
+    assert _invoke(app, '--verify').exit_code == 0
+    assert _totals(app, first) == (1, 12.8)
+    assert _totals(app, second) == (1, 13.8)
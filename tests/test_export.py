@@ -0,0 +1,75 @@
+"""The results export streams every matching row in batches, in the sort
+asked for, as CSV or NDJSON."""
+
+import csv
+import io
+import json
+
+from extensions import db
+import models
+from routes import results
+import scores
+
+
+def _seed(app, competition, e_scores):
+    with app.app_context():
+        live = db.session.get(models.Competitions, competition.id)
+        scores.save_scores(live, [
+            scores.ScoreRow(entry_id, competition.apparatus_ids[0], 5.0,
+                            0.0, [e_score])
+            for entry_id, e_score in zip(competition.entry_ids, e_scores)
+        ])
+
+
+def _chunks(response):
+    return [chunk.decode() if isinstance(chunk, bytes) else chunk
+            for chunk in response.response]
+
+
+def test_csv_is_streamed_in_batches(app, admin, make_competition,
+                                    monkeypatch):
+    monkeypatch.setattr(results, 'EXPORT_BATCH_SIZE', 2)
+    competition = make_competition(app, gymnast_count=5)
+    _seed(app, competition, [8.0, 9.0, 7.0, 6.0, 5.0])
+
+    response = admin.get('/results/export.csv?sort_by=total&sort_order=asc',
+                         buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'] == \
+        'attachment; filename=results.csv'
+    assert response.is_streamed
+
+    chunks = _chunks(response)
+    # Header and two rows, two rows, the last row
+    assert [chunk.count('\n') for chunk in chunks] == [3, 2, 1]
+    rows = list(csv.DictReader(io.StringIO(''.join(chunks))))
+    assert list(rows[0]) == results.EXPORT_COLUMNS
+    assert [float(row['total']) for row in rows] == [10, 11, 12, 13, 14]
+    assert [row['gymnast'] for row in rows] == [
+        'Nationals 5', 'Nationals 4', 'Nationals 3', 'Nationals 1',
+        'Nationals 2',
+    ]
+
+
+def test_ndjson_honours_the_search(app, admin, make_competition,
+                                   monkeypatch):
+    monkeypatch.setattr(results, 'EXPORT_BATCH_SIZE', 2)
+    competition = make_competition(app, gymnast_count=3)
+    _seed(app, competition, [8.0, 9.0, 7.0])
+    other = make_competition(app, gymnast_count=2, name='Regionals')
+    _seed(app, other, [9.5, 6.5])
+
+    response = admin.get('/results/export.ndjson?search=regionals',
+                         buffered=False)
+    assert response.mimetype == 'application/x-ndjson'
+    lines = ''.join(_chunks(response)).splitlines()
+    rows = [json.loads(line) for line in lines]
+    assert [(row['gymnast'], row['total']) for row in rows] == [
+        ('Regionals 1', 14.5), ('Regionals 2', 11.5),
+    ]
+    assert set(rows[0]) == set(results.EXPORT_COLUMNS)
+
+
+def test_other_formats_are_not_found(app, admin):
+    assert admin.get('/results/export.xlsx').status_code == 404
@@ -0,0 +1,144 @@
+"""The in-memory live board follows score writes and deletes, rebuilds
+when another worker has written, pushes deltas to streams and ranks ties
+the way Top NZ does."""
+
+from collections import namedtuple
+
+from extensions import db
+from leaderboard import ALL_AROUND, get_live_board, ranked, rows_to_dicts
+import models
+import scores
+
+
+def _score(competition_id, entry_id, apparatus_id, e_score, d_score=5.0,
+           penalty=0.0):
+    competition = db.session.get(models.Competitions, competition_id)
+    return scores.save_scores(competition, [scores.ScoreRow(
+        entry_id, apparatus_id, d_score, penalty, [e_score]
+    )])[0]
+
+
+def _board(competition_id):
+    return get_live_board(db.session.get(models.Competitions,
+                                         competition_id))
+
+
+def _totals(board, apparatus_id=ALL_AROUND):
+    return [(row['name'], row['rank'], row['total'])
+            for row in rows_to_dicts(board.standings('Level 7',
+                                                     apparatus_id))]
+
+
+def test_ties_share_a_rank():
+    Row = namedtuple('Row', 'name total')
+    rows = [Row('A', 13.0), Row('B', 12.5), Row('C', 12.5), Row('D', 12.0),
+            Row('E', 0.1 + 0.2), Row('F', 0.3)]
+
+    assert [rank for rank, row in ranked(rows)] == [1, 2, 2, 4, 5, 5]
+
+
+def test_written_scores_update_the_board_in_place(app, make_competition):
+    competition = make_competition(app)
+    floor, pommel, rings = competition.apparatus_ids
+    first, second, third = competition.entry_ids[:3]
+    with app.app_context():
+        board = _board(competition.id)
+        assert _totals(board) == []
+
+        _score(competition.id, first, floor, 8.0)
+        _score(competition.id, second, floor, 8.5)
+        _score(competition.id, third, floor, 8.0, d_score=4.5)
+        _score(competition.id, first, pommel, 7.0)
+
+        # Applied without a rebuild: the board kept up with each version
+        version = models.Competitions.current_scores_version(competition.id)
+        assert board.is_current(competition.id, version)
+        assert _totals(board, floor) == [
+            ('Nationals 2', 1, 13.5),
+            ('Nationals 1', 2, 13.0),
+            ('Nationals 3', 3, 12.5),
+        ]
+        assert _totals(board) == [
+            ('Nationals 1', 1, 25.0),
+            ('Nationals 2', 2, 13.5),
+            ('Nationals 3', 3, 12.5),
+        ]
+
+        # A tie with the gymnast above shares their rank
+        _score(competition.id, third, floor, 8.5)
+        assert _totals(board, floor) == [
+            ('Nationals 2', 1, 13.5),
+            ('Nationals 3', 1, 13.5),
+            ('Nationals 1', 3, 13.0),
+        ]
+
+
+def test_deleted_scores_leave_the_board(app, admin, make_competition):
+    competition = make_competition(app)
+    floor, pommel, rings = competition.apparatus_ids
+    first, second = competition.entry_ids[:2]
+    with app.app_context():
+        board = _board(competition.id)
+        score_id = _score(competition.id, first, floor, 8.0).id
+        _score(competition.id, first, pommel, 7.0)
+        _score(competition.id, second, floor, 8.5)
+
+    response = admin.post(f'/scoring/delete/{score_id}')
+    assert response.status_code == 302
+
+    with app.app_context():
+        version = models.Competitions.current_scores_version(competition.id)
+        assert board.is_current(competition.id, version)
+        assert _totals(board, floor) == [('Nationals 2', 1, 13.5)]
+        assert _totals(board) == [
+            ('Nationals 2', 1, 13.5),
+            ('Nationals 1', 2, 12.0),
+        ]
+
+
+def test_writes_from_another_worker_cause_a_rebuild(app, make_competition):
+    competition = make_competition(app)
+    floor = competition.apparatus_ids[0]
+    first = competition.entry_ids[0]
+    with app.app_context():
+        _score(competition.id, first, floor, 8.0)
+        board = _board(competition.id)
+        assert _totals(board) == [('Nationals 1', 1, 13.0)]
+
+        # Another worker changes the score: this board never sees it
+        score = models.Scores.query.one()
+        score.e_score, score.total = 9.0, 14.0
+        score.entry.totals.e_score, score.entry.totals.total = 9.0, 14.0
+        models.Competitions.bump_scores_version(competition.id)
+        db.session.commit()
+        version = models.Competitions.current_scores_version(competition.id)
+        assert not board.is_current(competition.id, version)
+
+        board = _board(competition.id)
+        assert board.is_current(competition.id, version)
+        assert _totals(board) == [('Nationals 1', 1, 14.0)]
+
+
+def test_streams_get_one_delta_per_change(app, make_competition):
+    competition = make_competition(app)
+    floor = competition.apparatus_ids[0]
+    first, second = competition.entry_ids[:2]
+    with app.app_context():
+        _score(competition.id, first, floor, 8.0)
+        board = _board(competition.id)
+        subscriber, rows = board.subscribe('Level 7', floor)
+        assert [row.name for row in rows] == ['Nationals 1']
+
+        _score(competition.id, second, floor, 8.5)
+        kind, delta = subscriber.events.get_nowait()
+        assert kind == 'delta'
+        assert delta['removed'] == []
+        # The new leader, and the old one moved down a place
+        assert [(row['name'], row['rank']) for row in delta['rows']] == [
+            ('Nationals 2', 1), ('Nationals 1', 2),
+        ]
+        assert subscriber.events.empty()
+
+        # Scoring another apparatus doesn't change this board
+        _score(competition.id, first, competition.apparatus_ids[1], 7.0)
+        assert subscriber.events.empty()
@@ -0,0 +1,92 @@
+"""The JSON leaderboard answers 304 while nothing has changed, without
+reading scores, and changes its ETag on every score, entry or status
+change."""
+
+from sqlalchemy import event
+
+from extensions import db
+import models
+import scores
+
+
+def _get(client, competition_id, etag=None):
+    headers = {'If-None-Match': etag} if etag else {}
+    return client.get(f'/api/live/{competition_id}/leaderboard'
+                      f'?level=Level 7', headers=headers)
+
+
+def _score(app, competition, entry_id, e_score):
+    with app.app_context():
+        live = db.session.get(models.Competitions, competition.id)
+        return scores.save_scores(live, [scores.ScoreRow(
+            entry_id, competition.apparatus_ids[0], 5.0, 0.0, [e_score]
+        )])[0].id
+
+
+def test_unchanged_leaderboard_is_not_modified(app, make_competition):
+    competition = make_competition(app)
+    _score(app, competition, competition.entry_ids[0], 8.0)
+    client = app.test_client()
+
+    response = _get(client, competition.id)
+    assert response.status_code == 200
+    assert [row['total'] for row in response.json['rows']] == [13.0]
+    etag = response.headers['ETag']
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = _get(client, competition.id, etag)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert len(statements) == 1
+    assert 'scores' not in statements[0].split('FROM')[1]
+
+
+def test_every_change_gives_a_new_etag(app, admin, make_competition):
+    competition = make_competition(app)
+    spare = make_competition(app, gymnast_count=1, status='draft',
+                             name='Spare')
+    client = app.test_client()
+    etags = [_get(client, competition.id).headers['ETag']]
+
+    def changed():
+        previous = etags[-1]
+        response = _get(client, competition.id, previous)
+        assert response.status_code == 200
+        etag = response.headers['ETag']
+        assert etag != previous
+        assert _get(client, competition.id, etag).status_code == 304
+        etags.append(etag)
+        return response.json
+
+    score_id = _score(app, competition, competition.entry_ids[0], 8.0)
+    assert changed()['rows'][0]['total'] == 13.0
+
+    # Rewriting a score with the same values still counts as a write
+    _score(app, competition, competition.entry_ids[0], 8.0)
+    changed()
+
+    admin.post(f'/scoring/delete/{score_id}')
+    assert changed()['rows'] == []
+
+    admin.post('/entries', data={'competition_id': competition.id,
+                                 'gymnast_ids': str(spare.gymnast_ids[0])})
+    changed()
+
+    admin.post(f'/entries/delete/{competition.entry_ids[1]}')
+    changed()
+
+    admin.get(f'/admin/competition/{competition.id}/end')
+    assert changed()['status'] == 'ended'
+
+    assert len(set(etags)) == 7
@@ -0,0 +1,91 @@
+"""/live/stream sends a snapshot, then deltas, then an end event, and
+turns spectators away with a 204 once the worker's streams are taken."""
+
+import json
+
+from extensions import db
+import models
+import scores
+
+
+def _events(response):
+    """Yield (event, data) for each message of a stream; comments as
+    ('comment', text)."""
+    for chunk in response.response:
+        text = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if text.startswith(':'):
+            yield 'comment', text[1:].strip()
+            continue
+        fields = dict(line.split(': ', 1) for line in text.strip().split('\n'))
+        if 'event' in fields:
+            yield fields['event'], json.loads(fields['data'])
+
+
+def _score(app, competition, entry_id, e_score):
+    with app.app_context():
+        live = db.session.get(models.Competitions, competition.id)
+        scores.save_scores(live, [scores.ScoreRow(
+            entry_id, competition.apparatus_ids[0], 5.0, 0.0, [e_score]
+        )])
+
+
+def _stream(app, client, competition):
+    app.config.update(LIVE_STREAM_MAX_CLIENTS=1, LIVE_STREAM_HEARTBEAT=0.05)
+    return client.get(f'/live/stream?level=Level 7'
+                      f'&apparatus={competition.apparatus_ids[0]}',
+                      buffered=False)
+
+
+def test_snapshot_delta_and_end(app, admin, make_competition):
+    competition = make_competition(app)
+    first, second = competition.entry_ids[:2]
+    _score(app, competition, first, 8.0)
+
+    response = _stream(app, app.test_client(), competition)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    events = _events(response)
+
+    kind, snapshot = next(events)
+    assert kind == 'snapshot'
+    assert [(row['name'], row['rank']) for row in snapshot['rows']] == [
+        ('Nationals 1', 1),
+    ]
+
+    _score(app, competition, second, 9.0)
+    kind, delta = next(events)
+    assert kind == 'delta'
+    assert [(row['name'], row['rank']) for row in delta['rows']] == [
+        ('Nationals 2', 1), ('Nationals 1', 2),
+    ]
+    assert delta['removed'] == []
+
+    admin.get(f'/admin/competition/{competition.id}/end')
+    # The idle stream notices on its next keepalive
+    assert next(events) == ('comment', 'keepalive')
+    assert next(events) == ('end', {})
+    response.close()
+
+
+def test_streams_beyond_the_limit_get_204(app, make_competition):
+    competition = make_competition(app)
+    client = app.test_client()
+
+    first = _stream(app, client, competition)
+    assert first.status_code == 200
+    assert _stream(app, client, competition).status_code == 204
+
+    # Closing a stream frees its slot
+    first.close()
+    second = _stream(app, client, competition)
+    assert second.status_code == 200
+    second.close()
+
+
+def test_streaming_is_off_by_default(app, make_competition):
+    competition = make_competition(app)
+    response = app.test_client().get(
+        f'/live/stream?level=Level 7&apparatus={competition.apparatus_ids[0]}'
+    )
+
+    assert response.status_code == 204
@@ -0,0 +1,68 @@
+"""``/metrics`` keeps every count made by threads that have since exited,
+and counts statements that fail as well as those that succeed."""
+
+import threading
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from extensions import db
+import metrics
+import sql_stats
+
+
+def _scrape(client):
+    """Samples on ``/metrics``, by the text before the value."""
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    samples = {}
+    for line in response.get_data(as_text=True).splitlines():
+        if line and not line.startswith('#'):
+            sample, value = line.rsplit(' ', 1)
+            samples[sample] = float(value)
+    return samples
+
+
+def test_counts_from_exited_threads_are_kept(app):
+    # Not a competition the other tests write to
+    competition_id = 'threads'
+
+    def work():
+        metrics.record_score_writes(competition_id, 1)
+
+    for _ in range(50):
+        threads = [threading.Thread(target=work) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    samples = _scrape(app.test_client())
+    assert samples[
+        f'stag_score_writes_total{{competition="{competition_id}"}}'
+    ] == 500
+
+
+def test_failed_statements_are_counted(app):
+    app.config.update(SQL_STATS_SAMPLE_RATE=1, SQL_STATS_HEADER=True)
+    sql_stats.init_app(app)
+
+    @app.route('/tests/failing-statement')
+    def failing_statement():
+        try:
+            db.session.execute(text('SELECT * FROM no_such_table'))
+        except OperationalError:
+            db.session.rollback()
+        db.session.execute(text('SELECT 1'))
+        return ''
+
+    client = app.test_client()
+    response = client.get('/tests/failing-statement')
+    assert response.headers['X-SQL-Stats'].startswith('queries=2;')
+
+    samples = _scrape(client)
+    queries = 'stag_db_queries_total{endpoint="failing_statement"}'
+    seconds = 'stag_db_query_seconds_total{endpoint="failing_statement"}'
+    assert samples[queries] == 2
+    # Each start time was taken off the stack by its own statement
+    assert 0 < samples[seconds] < 1
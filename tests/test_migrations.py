@@ -0,0 +1,238 @@
+"""A database at the original schema migrates to the schema the models
+create, so no model change ships without its migration, and only when
+``flask migrate`` is run."""
+
+import sqlite3
+
+import pytest
+
+from create_app import create_app
+from extensions import db
+import migrations
+import models
+
+
+# The schema before any migration, as ``create_all`` made it on SQLite
+BASELINE_SCHEMA = """
+CREATE TABLE roles (
+    id INTEGER NOT NULL,
+    name VARCHAR(50) NOT NULL,
+    PRIMARY KEY (id),
+    UNIQUE (name)
+);
+CREATE TABLE seasons (
+    id INTEGER NOT NULL,
+    year INTEGER NOT NULL,
+    PRIMARY KEY (id),
+    UNIQUE (year)
+);
+CREATE TABLE clubs (
+    id INTEGER NOT NULL,
+    name VARCHAR(50) NOT NULL,
+    PRIMARY KEY (id)
+);
+CREATE TABLE apparatus (
+    id INTEGER NOT NULL,
+    name VARCHAR(50) NOT NULL,
+    PRIMARY KEY (id),
+    UNIQUE (name)
+);
+CREATE TABLE users (
+    id INTEGER NOT NULL,
+    email VARCHAR(120) NOT NULL,
+    email_confirmed BOOLEAN NOT NULL,
+    first_name VARCHAR(50),
+    last_name VARCHAR(50),
+    password VARCHAR(255) NOT NULL,
+    created_at DATETIME NOT NULL,
+    role_id INTEGER NOT NULL,
+    PRIMARY KEY (id),
+    UNIQUE (email),
+    FOREIGN KEY(role_id) REFERENCES roles (id)
+);
+CREATE TABLE competitions (
+    id INTEGER NOT NULL,
+    season_id INTEGER NOT NULL,
+    name VARCHAR(50) NOT NULL,
+    address VARCHAR(100) NOT NULL,
+    competition_date DATE,
+    status VARCHAR(20) NOT NULL,
+    started_at DATETIME,
+    ended_at DATETIME,
+    PRIMARY KEY (id),
+    FOREIGN KEY(season_id) REFERENCES seasons (id)
+);
+CREATE TABLE gymnasts (
+    id INTEGER NOT NULL,
+    club_id INTEGER NOT NULL,
+    user_id INTEGER,
+    name VARCHAR(50) NOT NULL,
+    age INTEGER,
+    goals TEXT,
+    achievements TEXT,
+    injuries TEXT,
+    level VARCHAR(50) NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY(club_id) REFERENCES clubs (id),
+    FOREIGN KEY(user_id) REFERENCES users (id)
+);
+CREATE TABLE athlete_applications (
+    id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    club_name VARCHAR(100) NOT NULL,
+    gymnastics_level VARCHAR(50) NOT NULL,
+    years_experience INTEGER,
+    coach_name VARCHAR(100),
+    coach_contact VARCHAR(100),
+    achievements TEXT,
+    why_join TEXT,
+    status VARCHAR(20) NOT NULL,
+    submitted_at DATETIME NOT NULL,
+    reviewed_at DATETIME,
+    reviewed_by INTEGER,
+    admin_notes TEXT,
+    PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES users (id),
+    FOREIGN KEY(reviewed_by) REFERENCES users (id)
+);
+CREATE TABLE entries (
+    id INTEGER NOT NULL,
+    competition_id INTEGER NOT NULL,
+    gymnast_id INTEGER NOT NULL,
+    PRIMARY KEY (id),
+    CONSTRAINT _competition_gymnast_uc UNIQUE (competition_id, gymnast_id),
+    FOREIGN KEY(competition_id) REFERENCES competitions (id),
+    FOREIGN KEY(gymnast_id) REFERENCES gymnasts (id)
+);
+CREATE TABLE scores (
+    id INTEGER NOT NULL,
+    entry_id INTEGER NOT NULL,
+    apparatus_id INTEGER NOT NULL,
+    e_score FLOAT NOT NULL,
+    d_score FLOAT NOT NULL,
+    penalty FLOAT NOT NULL,
+    total FLOAT NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY(entry_id) REFERENCES entries (id),
+    FOREIGN KEY(apparatus_id) REFERENCES apparatus (id)
+);
+CREATE TABLE judge_scores (
+    id INTEGER NOT NULL,
+    score_id INTEGER NOT NULL,
+    judge_number INTEGER NOT NULL,
+    e_score FLOAT NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY(score_id) REFERENCES scores (id)
+);
+"""
+
+BASELINE_DATA = """
+INSERT INTO seasons (id, year) VALUES (1, 2024);
+INSERT INTO clubs (id, name) VALUES (1, 'Club');
+INSERT INTO apparatus (id, name) VALUES (1, 'Floor'), (2, 'Rings');
+INSERT INTO competitions (id, season_id, name, address, status)
+    VALUES (1, 1, 'Nationals', 'Hall', 'ended');
+INSERT INTO gymnasts (id, club_id, name, level)
+    VALUES (1, 1, 'Ana', 'Level 7'), (2, 1, 'Ben', 'Masters');
+INSERT INTO entries (id, competition_id, gymnast_id)
+    VALUES (1, 1, 1), (2, 1, 2);
+INSERT INTO scores (id, entry_id, apparatus_id, e_score, d_score, penalty,
+                    total)
+    VALUES (1, 1, 1, 8.12345, 4.1, 0.1, 12.12345),
+           (2, 1, 2, 8.2, 4.0, 0.0, 12.2),
+           (3, 2, 1, 7.9, 3.5, 0.0, 11.4);
+INSERT INTO judge_scores (id, score_id, judge_number, e_score)
+    VALUES (1, 1, 1, 8.1), (2, 1, 2, 8.3);
+"""
+
+# Columns SQLite cannot make NOT NULL once they exist; the migrations
+# tighten them on MySQL and PostgreSQL
+SQLITE_NULLABLE = {
+    ('scores', 'competition_id'),
+    ('scores', 'gymnast_id'),
+    ('scores', 'level'),
+    ('gymnasts', 'level_id'),
+}
+
+
+def _schema(app):
+    """Tables, columns, indexes and keys as comparable values.
+
+    Column types are left out: SQLite keeps the type a column was
+    created with, so 0004's DECIMAL change only shows on other databases.
+    """
+    with app.app_context():
+        inspector = db.inspect(db.engine)
+        schema = {}
+        for table in inspector.get_table_names():
+            schema[table] = {
+                'columns': {
+                    column['name']: (column['nullable']
+                                     or (table, column['name'])
+                                     in SQLITE_NULLABLE)
+                    for column in inspector.get_columns(table)
+                },
+                'indexes': sorted(
+                    (index['name'], tuple(index['column_names']),
+                     bool(index['unique']))
+                    for index in inspector.get_indexes(table)
+                ),
+                'unique': sorted(
+                    tuple(constraint['column_names'])
+                    for constraint in inspector.get_unique_constraints(table)
+                ),
+                'foreign_keys': sorted(
+                    (tuple(key['constrained_columns']), key['referred_table'],
+                     tuple(key['referred_columns']))
+                    for key in inspector.get_foreign_keys(table)
+                ),
+            }
+        return schema
+
+
+def test_migrated_schema_matches_models(app_factory, tmp_path):
+    with sqlite3.connect(tmp_path / 'legacy.db') as connection:
+        connection.executescript(BASELINE_SCHEMA + BASELINE_DATA)
+    connection.close()
+
+    migrated = app_factory('legacy.db')
+    with migrated.app_context():
+        assert migrations.pending() == []
+        assert not models.Scores.query.filter(db.or_(
+            models.Scores.competition_id.is_(None),
+            models.Scores.gymnast_id.is_(None),
+            models.Scores.level.is_(None),
+        )).count()
+        assert [level.name for level in models.Levels.query.filter_by(
+            top_nz=True).order_by(models.Levels.sort_order)] == \
+            models.TOP_NZ_LEVELS
+
+    assert _schema(migrated) == _schema(app_factory('fresh.db'))
+
+
+def test_migrations_only_run_from_the_command(tmp_path):
+    with sqlite3.connect(tmp_path / 'legacy.db') as connection:
+        connection.executescript(BASELINE_SCHEMA + BASELINE_DATA)
+    connection.close()
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "legacy.db"}',
+        'TESTING': True,
+    })
+    try:
+        with app.app_context():
+            # Starting the app changed nothing, and the check says so
+            assert 'level' in {column['name'] for column in
+                               db.inspect(db.engine).get_columns('gymnasts')}
+            with pytest.raises(RuntimeError, match='0005_gymnast_levels'):
+                migrations.check()
+
+        result = app.test_cli_runner().invoke(args=['migrate'])
+        assert result.exit_code == 0
+        assert f'Applied {migrations.MIGRATIONS[-1][0]}' in result.output
+
+        with app.app_context():
+            migrations.check()
+    finally:
+        with app.app_context():
+            db.engine.dispose()
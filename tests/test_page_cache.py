@@ -0,0 +1,78 @@
+"""Public pages are served from the cache until a write touches a tag they
+were built from, and only for anonymous visitors."""
+
+import pytest
+
+from extensions import db
+import models
+from page_cache import competition_tag, page_cache
+import scores
+
+
+@pytest.fixture
+def cached_app(app):
+    """The app with an in-process page cache."""
+    app.config['PAGE_CACHE_BACKEND'] = 'memory'
+    page_cache.init_app(app)
+    return app
+
+
+def _score(app, competition, entry, e_score):
+    with app.app_context():
+        live = db.session.get(models.Competitions, competition.id)
+        scores.save_scores(live, [scores.ScoreRow(
+            competition.entry_ids[entry], competition.apparatus_ids[0], 5.0,
+            0.0, [e_score]
+        )])
+        return db.session.get(models.Seasons, competition.season_id).year
+
+
+def _cache(client, path):
+    return client.get(path).headers.get('X-Cache')
+
+
+def test_writes_invalidate_the_pages_they_touch(cached_app,
+                                                make_competition):
+    nationals = make_competition(cached_app)
+    regionals = make_competition(cached_app, name='Regionals')
+    year = _score(cached_app, nationals, 0, 8.0)
+    client = cached_app.test_client()
+    pages = {
+        'nationals': f'/competition/{nationals.id}',
+        'regionals': f'/competition/{regionals.id}',
+        'scored gymnast': f'/gymnast/{nationals.gymnast_ids[0]}',
+        'other gymnast': f'/gymnast/{nationals.gymnast_ids[1]}',
+        'top nz': f'/topnz?season={year}&level=Level 7',
+        'calendar': '/calendar',
+    }
+    assert {name: _cache(client, path) for name, path in pages.items()} \
+        == dict.fromkeys(pages, 'MISS')
+    assert {name: _cache(client, path) for name, path in pages.items()} \
+        == dict.fromkeys(pages, 'HIT')
+
+    _score(cached_app, nationals, 0, 9.0)
+    assert {name: _cache(client, path) for name, path in pages.items()} \
+        == {'nationals': 'MISS', 'regionals': 'HIT',
+            'scored gymnast': 'MISS', 'other gymnast': 'HIT',
+            'top nz': 'MISS', 'calendar': 'HIT'}
+    assert '14.000' in client.get(pages['top nz']).get_data(as_text=True)
+
+
+def test_signed_in_visitors_are_not_cached(cached_app, admin,
+                                           make_competition):
+    competition = make_competition(cached_app)
+    path = f'/competition/{competition.id}'
+    admin.get(path)
+
+    assert admin.get(path).headers.get('X-Cache') is None
+    assert _cache(cached_app.test_client(), path) == 'MISS'
+
+
+def test_a_page_built_during_a_write_is_not_kept(cached_app):
+    tag = competition_tag(1)
+    # The view starts, a write commits and invalidates, the view finishes
+    tokens = page_cache.tokens([tag])
+    page_cache.invalidate(tag)
+    page_cache.set('/competition/1?', (b'old', 'text/html'), tokens)
+
+    assert page_cache.get('/competition/1?') is None
@@ -0,0 +1,83 @@
+"""In panel mode a score waits for every judge, a judge resending replaces
+only their own score, and deleting the score starts the panel again."""
+
+import models
+
+
+def _judge(client, competition, judge_number, e_score, panel_size=3,
+           **chair):
+    return client.post('/api/scoring/panel', json={
+        'entry_id': competition.entry_ids[0],
+        'apparatus_id': competition.apparatus_ids[0],
+        'judge_number': judge_number,
+        'panel_size': panel_size,
+        'e_score': e_score,
+        **chair,
+    })
+
+
+def test_the_score_waits_for_the_whole_panel(app, admin, make_competition):
+    competition = make_competition(app)
+
+    response = _judge(admin, competition, 2, 8.0)
+    assert response.status_code == 200
+    assert response.json['status'] == 'waiting'
+    assert response.json['waiting_for'] == [1, 3]
+    assert response.json['messages'] == ['Score received. Waiting for '
+                                         'judges 1, 3.']
+
+    # Judge 2 sends again, changing their mind: still one judge in
+    response = _judge(admin, competition, 2, 8.5)
+    assert (response.json['status'], response.json['submitted']) == \
+        ('waiting', [2])
+
+    response = _judge(admin, competition, 1, 8.0, d_score=5.0, penalty=0.3)
+    assert response.json['waiting_for'] == [3]
+    with app.app_context():
+        assert models.Scores.query.count() == 0
+
+    response = _judge(admin, competition, 3, 9.0)
+    assert response.json['status'] == 'complete'
+    assert response.json['waiting_for'] == []
+    score = response.json['score']
+    assert [judge['e_score'] for judge in score['judge_scores']] == \
+        [8.0, 8.5, 9.0]
+    assert (score['e_score'], score['d_score'], score['penalty'],
+            score['total']) == (8.5, 5.0, 0.3, 13.2)
+
+    # A correction once the panel is complete recomputes the score
+    response = _judge(admin, competition, 3, 7.5)
+    assert response.json['status'] == 'complete'
+    assert response.json['score']['id'] == score['id']
+    assert response.json['score']['total'] == 12.7
+    with app.app_context():
+        assert models.Scores.query.count() == 1
+
+
+def test_judges_must_agree_on_the_panel(app, admin, make_competition):
+    competition = make_competition(app)
+    _judge(admin, competition, 2, 8.0)
+
+    response = _judge(admin, competition, 1, 8.0, panel_size=2,
+                      d_score=5.0)
+    assert response.status_code == 400
+    assert response.json['errors'] == ['This panel has 3 judges; check the '
+                                       'panel size on this device.']
+
+    response = _judge(admin, competition, 4, 8.0)
+    assert response.status_code == 400
+    assert response.json['errors'] == ['Judge number must be between 1 '
+                                       'and 3.']
+
+
+def test_deleting_the_score_starts_the_panel_again(app, admin,
+                                                   make_competition):
+    competition = make_competition(app)
+    _judge(admin, competition, 1, 8.0, panel_size=2, d_score=5.0)
+    score = _judge(admin, competition, 2, 8.0, panel_size=2).json['score']
+
+    admin.post(f'/scoring/delete/{score["id"]}')
+
+    response = _judge(admin, competition, 2, 9.0, panel_size=2)
+    assert response.json['status'] == 'waiting'
+    assert response.json['waiting_for'] == [1]
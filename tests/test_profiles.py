@@ -0,0 +1,89 @@
+"""A gymnast's best score per apparatus is the best-total routine, read in
+the same number of queries however many apparatus there are."""
+
+from sqlalchemy import event
+
+from extensions import db
+import models
+from routes.profiles import _best_scores
+
+
+def _seed_gymnast(app, apparatus_count):
+    """Make a gymnast with two routines on each of ``apparatus_count``
+    apparatus: a high E-score and a better total with a lower one.
+
+    Returns the gymnast's id.
+    """
+    with app.app_context():
+        season = models.Seasons.query.first()
+        club = models.Clubs(name='Club')
+        apparatus = [models.Apparatus(name=f'Apparatus {number}')
+                     for number in range(apparatus_count)]
+        db.session.add_all([club, *apparatus])
+        db.session.flush()
+        gymnast = models.Gymnasts(name='Gymnast', club_id=club.id,
+                                  level='Level 7')
+        db.session.add(gymnast)
+        db.session.flush()
+
+        for name, e_score, d_score, penalty in (('Regionals', 9, 4, 0),
+                                                ('Nationals', 8, 5.5, 0.1)):
+            competition = models.Competitions(
+                name=name, address='Hall', season_id=season.id,
+                status='ended'
+            )
+            db.session.add(competition)
+            db.session.flush()
+            entry = models.Entries(competition_id=competition.id,
+                                   gymnast_id=gymnast.id)
+            db.session.add(entry)
+            db.session.flush()
+            db.session.add_all([
+                models.Scores(
+                    entry_id=entry.id, apparatus_id=app_row.id,
+                    competition_id=competition.id, gymnast_id=gymnast.id,
+                    level='Level 7', e_score=e_score, d_score=d_score,
+                    penalty=penalty, total=e_score + d_score - penalty
+                )
+                for app_row in apparatus
+            ])
+        db.session.commit()
+        return gymnast.id
+
+
+def _best_scores_counted(app, gymnast_id):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+        event.listen(engine, 'before_cursor_execute', count)
+        try:
+            result = _best_scores(gymnast_id)
+        finally:
+            event.remove(engine, 'before_cursor_execute', count)
+    return result, len(statements)
+
+
+def test_best_scores_are_the_best_total_routine(app):
+    gymnast_id = _seed_gymnast(app, 2)
+    (all_around, apparatus_data), _ = _best_scores_counted(app, gymnast_id)
+
+    assert len(apparatus_data) == 2
+    for rows in apparatus_data.values():
+        [best] = rows
+        assert (float(best.e_score), float(best.d_score),
+                float(best.penalty), float(best.total)) == (8, 5.5, 0.1, 13.4)
+    assert float(all_around[0].total_score) == 26.8
+
+
+def test_best_scores_query_count_is_constant(app_factory):
+    small = app_factory('small.db')
+    _, with_two = _best_scores_counted(small, _seed_gymnast(small, 2))
+
+    large = app_factory('large.db')
+    _, with_six = _best_scores_counted(large, _seed_gymnast(large, 6))
+
+    assert with_two == with_six
@@ -0,0 +1,14 @@
+"""Every hot query is planned through the index it was given."""
+
+from query_plans import check_query_plans
+
+
+def test_hot_queries_use_their_indexes(app):
+    with app.app_context():
+        checks = check_query_plans()
+
+    assert checks
+    # The plans of any that don't, so a failure says what was chosen
+    missing = {check.query.description: check.plan for check in checks
+               if check.index is None}
+    assert missing == {}
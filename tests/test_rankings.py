@@ -0,0 +1,90 @@
+"""Season rankings follow every score write and delete, and totals that
+are equal to the thousandth tie exactly on Top NZ however they were
+summed."""
+
+from extensions import db
+import models
+from routes.topnz import _rankings
+import scores
+
+
+def _save(competition_id, entry_id, apparatus_id, e_score):
+    live = db.session.get(models.Competitions, competition_id)
+    return scores.save_scores(live, [scores.ScoreRow(
+        entry_id, apparatus_id, 5.0, 0.0, [e_score]
+    )])[0].id
+
+
+def _all_around(season_id):
+    all_around, _ = _rankings(season_id, 'Level 7')
+    return [(row.rank, row.name, row.total_score) for row in all_around]
+
+
+def test_equal_totals_tie(app, make_competition):
+    competition = make_competition(app, gymnast_count=3)
+    floor, pommel, rings = competition.apparatus_ids
+    first, second, third = competition.entry_ids
+    with app.app_context():
+        # 12.1 + 12.2 and 12.3 + 12.0 differ as binary floats
+        for entry_id, floor_e, pommel_e in ((first, 7.1, 7.2),
+                                            (second, 7.3, 7.0),
+                                            (third, 7.1, 7.1)):
+            _save(competition.id, entry_id, floor, floor_e)
+            _save(competition.id, entry_id, pommel, pommel_e)
+
+        assert _all_around(competition.season_id) == [
+            (1, 'Nationals 1', 24.3),
+            (1, 'Nationals 2', 24.3),
+            (3, 'Nationals 3', 24.2),
+        ]
+        _, apparatus = _rankings(competition.season_id, 'Level 7')
+        assert [(row.rank, row.name, row.total)
+                for row in apparatus['Floor']] == [
+            (1, 'Nationals 2', 12.3),
+            (2, 'Nationals 1', 12.1),
+            (2, 'Nationals 3', 12.1),
+        ]
+
+
+def test_rankings_follow_writes_and_deletes(app, admin, make_competition):
+    nationals = make_competition(app, gymnast_count=2)
+    floor, pommel, rings = nationals.apparatus_ids
+    first, second = nationals.entry_ids
+    regionals = make_competition(app, gymnast_count=0, name='Regionals')
+    with app.app_context():
+        # The first gymnast also competes at Regionals
+        entry = models.Entries(competition_id=regionals.id,
+                               gymnast_id=nationals.gymnast_ids[0],
+                               totals=models.EntryTotals())
+        db.session.add(entry)
+        db.session.commit()
+        regionals_entry = entry.id
+
+        _save(nationals.id, first, floor, 7.0)
+        _save(nationals.id, second, floor, 7.5)
+        assert _all_around(nationals.season_id) == [
+            (1, 'Nationals 2', 12.5), (2, 'Nationals 1', 12.0),
+        ]
+
+        # A worse routine elsewhere doesn't replace the best one
+        _save(regionals.id, regionals_entry, floor, 6.0)
+        assert _all_around(nationals.season_id)[1] == \
+            (2, 'Nationals 1', 12.0)
+
+        # A better one does, and so does a new apparatus
+        best = _save(regionals.id, regionals_entry, floor, 8.0)
+        _save(regionals.id, regionals_entry, pommel, 7.0)
+        assert _all_around(nationals.season_id) == [
+            (1, 'Nationals 1', 25.0), (2, 'Nationals 2', 12.5),
+        ]
+
+    admin.post(f'/scoring/delete/{best}')
+    with app.app_context():
+        # Back to the best routine left: 12.0 on floor, 12.0 on pommel
+        assert _all_around(nationals.season_id) == [
+            (1, 'Nationals 1', 24.0), (2, 'Nationals 2', 12.5),
+        ]
+        rows = models.SeasonRankings.query.filter_by(
+            gymnast_id=nationals.gymnast_ids[0]
+        ).count()
+        assert rows == 3
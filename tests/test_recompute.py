@@ -0,0 +1,90 @@
+"""Recomputed scores come out exactly as ``Scores.update_final_score``
+would store them, and everything that shows them moves on."""
+
+from extensions import db
+from leaderboard import ALL_AROUND, get_live_board
+import models
+from page_cache import competition_tag, gymnast_tag, season_tag
+import recompute
+import scores
+
+
+def _stored(competition_id):
+    return {
+        score.id: (score.e_score, score.total)
+        for score in models.Scores.query.filter_by(
+            competition_id=competition_id)
+    }
+
+
+def test_recompute_matches_update_final_score(app, make_competition,
+                                              monkeypatch):
+    competition = make_competition(app, gymnast_count=3)
+    other = make_competition(app, gymnast_count=1, name='Regionals')
+    floor, pommel, rings = competition.apparatus_ids
+    with app.app_context():
+        live = db.session.get(models.Competitions, competition.id)
+        # Averages and totals that need rounding to the thousandth
+        scores.save_scores(live, [
+            scores.ScoreRow(competition.entry_ids[0], floor, 5.1, 0.3,
+                            [8.1, 8.2, 8.4]),
+            scores.ScoreRow(competition.entry_ids[1], floor, 4.7, 0.1,
+                            [7.35, 7.4, 7.45]),
+            scores.ScoreRow(competition.entry_ids[2], pommel, 3.3, 0.0,
+                            [9.1]),
+        ])
+        scores.save_scores(
+            db.session.get(models.Competitions, other.id),
+            [scores.ScoreRow(other.entry_ids[0], floor, 5.0, 0.0, [8.0])]
+        )
+        version = models.Competitions.current_scores_version(competition.id)
+        # Built before the recompute; read again after it
+        get_live_board(live)
+
+        # Knock the stored values out of line with their inputs (a
+        # single judge's E-score is an input itself)
+        db.session.execute(db.update(models.Scores).values(
+            total=models.Scores.total - 1
+        ))
+        db.session.execute(db.update(models.Scores).where(
+            models.Scores.id.in_(db.select(models.JudgeScores.score_id))
+        ).values(e_score=models.Scores.e_score + 1))
+        db.session.commit()
+
+    invalidated = []
+    monkeypatch.setattr(recompute.page_cache, 'invalidate',
+                        lambda *tags: invalidated.extend(tags))
+    with app.app_context():
+        e_fixed, totals_fixed = recompute.recompute_scores(competition.id)
+        assert (e_fixed, totals_fixed) == (2, 3)
+        recomputed = _stored(competition.id)
+        assert recompute.find_drift(competition.id) == []
+
+        # The same rows, recomputed one at a time by the model
+        for score in models.Scores.query.filter_by(
+                competition_id=competition.id):
+            score.update_final_score()
+            if not score.judge_scores:
+                score.total = round(score.e_score + score.d_score
+                                    - score.penalty, 3)
+        assert _stored(competition.id) == recomputed
+        assert sorted(total for e_score, total in recomputed.values()) == \
+            [12.0, 12.4, 13.033]
+        db.session.rollback()
+
+        # Out of scope: still wrong
+        assert len(recompute.find_drift(other.id)) == 1
+
+        season = db.session.get(models.Seasons, competition.season_id)
+        assert models.Competitions.current_scores_version(competition.id) \
+            > version
+        assert set(invalidated) == {
+            competition_tag(competition.id), season_tag(season.year),
+            *(gymnast_tag(gymnast_id)
+              for gymnast_id in competition.gymnast_ids),
+        }
+
+        board = get_live_board(db.session.get(models.Competitions,
+                                              competition.id))
+        assert sorted(row.total for row in board.standings(
+            'Level 7', ALL_AROUND)) == [12.0, 12.4, 13.033]
@@ -0,0 +1,110 @@
+"""Results pages walk forwards and back through tied sort values without
+skipping or repeating rows, cursors that don't fit the sort start again
+from the first page, and "All" is paged like any other size."""
+
+import base64
+import json
+
+from extensions import db
+import models
+from routes import results
+import scores
+
+
+def _seed(app, competition, totals):
+    """Score the competition's entries on Floor with these E-scores."""
+    with app.app_context():
+        live = db.session.get(models.Competitions, competition.id)
+        scores.save_scores(live, [
+            scores.ScoreRow(entry_id, competition.apparatus_ids[0], 5.0,
+                            0.0, [e_score])
+            for entry_id, e_score in zip(competition.entry_ids, totals)
+        ])
+
+
+def _page(app, sort_by='total', sort_order='desc', per_page=2, cursor=None):
+    with app.app_context():
+        return results._results_page('', sort_by, sort_order, per_page,
+                                     cursor)
+
+
+def _ids(page):
+    return [row.score_id for row in page.items]
+
+
+def test_pages_round_trip_through_ties(app, make_competition):
+    competition = make_competition(app, gymnast_count=7)
+    _seed(app, competition, [8.0, 9.0, 8.0, 8.0, 7.0, 9.0, 8.0])
+
+    for sort_by, sort_order in (('total', 'desc'), ('total', 'asc'),
+                                ('level', 'asc')):
+        everything = _ids(_page(app, sort_by, sort_order, per_page=-1))
+        assert len(everything) == 7
+
+        pages = [_page(app, sort_by, sort_order)]
+        while pages[-1].has_next:
+            pages.append(_page(app, sort_by, sort_order,
+                               cursor=pages[-1].next_cursor))
+        assert [len(page.items) for page in pages] == [2, 2, 2, 1]
+        assert sum(map(_ids, pages), []) == everything
+        assert not pages[0].has_prev
+
+        # And back again from the last page, page for page
+        back = [pages[-1]]
+        while back[-1].has_prev:
+            back.append(_page(app, sort_by, sort_order,
+                              cursor=back[-1].prev_cursor))
+        assert list(map(_ids, reversed(back))) == list(map(_ids, pages))
+        assert back[-1].has_next
+
+
+def test_unusable_cursors_start_from_the_first_page(app, admin,
+                                                    make_competition):
+    competition = make_competition(app)
+    _seed(app, competition, [8.0, 9.0, 7.0, 6.0])
+    first = _page(app)
+    second = _page(app, cursor=first.next_cursor)
+    assert _ids(second) != _ids(first)
+
+    def token(data):
+        raw = json.dumps(data).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    score_id = first.items[-1].score_id
+    for cursor in (
+        'not a cursor',
+        token(['total', 'desc', 'next', None, score_id]),
+        token(['total', 'desc', 'next', [1], score_id]),
+        token(['total', 'desc', 'next', 13.0, True]),
+        token(['total', 'desc', 'sideways', 13.0, score_id]),
+        token(['total', 'desc', 'next']),
+        token({'sort_value': 13.0}),
+    ):
+        assert _ids(_page(app, cursor=cursor)) == _ids(first)
+
+    # A cursor minted for another sort doesn't carry over
+    assert _ids(_page(app, sort_order='asc', cursor=first.next_cursor)) \
+        == _ids(_page(app, sort_order='asc'))
+    assert _ids(_page(app, sort_by='e_score', cursor=first.next_cursor)) \
+        == _ids(_page(app, sort_by='e_score'))
+
+    response = admin.get('/results?per_page=2&cursor=not-a-cursor')
+    assert response.status_code == 200
+
+
+def test_all_is_a_bounded_page(app, make_competition, monkeypatch):
+    competition = make_competition(app, gymnast_count=5)
+    _seed(app, competition, [8.0, 9.0, 7.0, 6.0, 5.0])
+
+    whole = _page(app, per_page=-1)
+    assert len(whole.items) == 5
+    assert whole.total == 5
+    assert not (whole.has_prev or whole.has_next)
+
+    monkeypatch.setattr(results, 'ALL_PAGE_SIZE', 3)
+    first = _page(app, per_page=-1)
+    assert _ids(first) == _ids(whole)[:3]
+    assert first.has_next
+    rest = _page(app, per_page=-1, cursor=first.next_cursor)
+    assert _ids(rest) == _ids(whole)[3:]
+    assert not rest.has_next
@@ -0,0 +1,88 @@
+"""A rotation is saved in one transaction with a fixed number of
+statements, and one bad row keeps every row from being saved."""
+
+from sqlalchemy import event
+
+from extensions import db
+import models
+
+
+def _row(competition, entry, e_score, d_score=5.0, apparatus=0):
+    return {
+        'entry_id': competition.entry_ids[entry],
+        'apparatus_id': competition.apparatus_ids[apparatus],
+        'd_score': d_score,
+        'penalty': 0.0,
+        'execution_scores': [e_score],
+    }
+
+
+def _submit(app, client, rows):
+    """POST a rotation; returns the response and the statements it ran."""
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        response = client.post('/api/scoring/rotation', json={'rows': rows})
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    return response, statements
+
+
+def _totals(app):
+    with app.app_context():
+        return sorted(
+            (score.entry_id, float(score.total))
+            for score in models.Scores.query
+        )
+
+
+def test_a_rotation_is_saved_together(app, admin, make_competition):
+    competition = make_competition(app, gymnast_count=10)
+
+    rows = [_row(competition, entry, 8.0 + entry / 10)
+            for entry in range(3)]
+    response, three = _submit(app, admin, rows)
+    assert response.status_code == 200
+    results = response.json['results']
+    assert [result['status'] for result in results] == ['saved'] * 3
+    assert [result['score']['total'] for result in results] == \
+        [13.0, 13.1, 13.2]
+    assert response.json['messages'][0] == \
+        'Rotation submitted! 3 scores saved.'
+
+    # Resubmitting replaces the scores rather than adding to them
+    rows = [_row(competition, entry, 9.0) for entry in range(10)]
+    response, ten = _submit(app, admin, rows)
+    assert response.status_code == 200
+    assert _totals(app) == [(entry_id, 14.0)
+                            for entry_id in competition.entry_ids]
+    assert len(ten) == len(three)
+
+
+def test_one_bad_row_saves_nothing(app, admin, make_competition):
+    competition = make_competition(app, gymnast_count=3)
+
+    rows = [
+        _row(competition, 0, 8.0),
+        _row(competition, 1, 8.0, d_score='lots'),
+        _row(competition, 2, 11.0),
+    ]
+    response, _ = _submit(app, admin, rows)
+
+    assert response.status_code == 400
+    results = response.json['results']
+    assert [result['status'] for result in results] == \
+        ['not_saved', 'invalid', 'invalid']
+    assert results[1]['errors'] == ['D Score must be a number.']
+    assert response.json['errors'] == \
+        ['2 of 3 scores need fixing. Nothing was saved.']
+    assert _totals(app) == []
+
+    assert admin.post('/api/scoring/rotation',
+                      json={'rows': []}).status_code == 400
@@ -0,0 +1,86 @@
+"""The scoring console runs the same number of queries however many
+entries the live competition has."""
+
+from sqlalchemy import event
+
+from extensions import db
+import models
+
+
+def _seed_live_competition(app, entry_count):
+    """Make a competition with ``entry_count`` scored entries the live one.
+
+    Any competition that was live before is ended.
+    """
+    with app.app_context():
+        models.Competitions.query.filter_by(status='live').update(
+            {'status': 'ended'}
+        )
+        season = models.Seasons.query.first()
+        club = models.Clubs.query.first()
+        if club is None:
+            club = models.Clubs(name='Club')
+            db.session.add_all([club, *(
+                models.Apparatus(name=name)
+                for name in ('Floor', 'Pommel Horse', 'Rings')
+            )])
+        competition = models.Competitions(
+            name=f'Live with {entry_count}', address='Hall',
+            season_id=season.id, status='live'
+        )
+        db.session.add(competition)
+        db.session.flush()
+        apparatus = models.Apparatus.query.order_by(models.Apparatus.id).all()
+
+        for number in range(entry_count):
+            gymnast = models.Gymnasts(name=f'Gymnast {number}',
+                                      club_id=club.id, level='Level 7')
+            db.session.add(gymnast)
+            db.session.flush()
+            entry = models.Entries(competition_id=competition.id,
+                                   gymnast_id=gymnast.id)
+            db.session.add(entry)
+            db.session.flush()
+            # Score two of the three apparatus with a two-judge panel
+            for app_row in apparatus[:2]:
+                score = models.Scores(
+                    entry_id=entry.id, apparatus_id=app_row.id,
+                    competition_id=competition.id, gymnast_id=gymnast.id,
+                    level='Level 7', e_score=8, d_score=5, penalty=0,
+                    total=13
+                )
+                db.session.add(score)
+                db.session.flush()
+                db.session.add_all([
+                    models.JudgeScores(score_id=score.id, judge_number=judge,
+                                       e_score=8)
+                    for judge in (1, 2)
+                ])
+        db.session.commit()
+
+
+def _count_scoring_queries(app, client):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        response = client.get('/scoring')
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    assert response.status_code == 200
+    return len(statements)
+
+
+def test_scoring_query_count_is_constant(app, admin):
+    _seed_live_competition(app, 10)
+    with_ten = _count_scoring_queries(app, admin)
+
+    _seed_live_competition(app, 40)
+    with_forty = _count_scoring_queries(app, admin)
+
+    assert with_ten == with_forty
@@ -0,0 +1,100 @@
+"""The search index follows new and renamed rows, every word of a search
+must match, and a search runs as a single statement."""
+
+from sqlalchemy import event
+
+from extensions import db
+import models
+from routes.results import _results_page
+import scores
+
+
+def _found(app, search):
+    """(gymnast, apparatus) of every result matching ``search``."""
+    with app.app_context():
+        page = _results_page(search, 'total', 'desc', -1, None)
+        return sorted((row.gymnast, row.apparatus) for row in page.items)
+
+
+def _seed(app, competition):
+    """Rename the first gymnast, enter a new one, and score everyone on
+    Floor (and the second gymnast on Rings too)."""
+    floor, pommel, rings = competition.apparatus_ids
+    with app.app_context():
+        live = db.session.get(models.Competitions, competition.id)
+        gymnast = db.session.get(models.Gymnasts, competition.gymnast_ids[0])
+        gymnast.name = 'Aroha Ngata'
+        newcomer = models.Gymnasts(name='Mere Smith', level='Level 8',
+                                   club_id=gymnast.club_id)
+        db.session.add(newcomer)
+        db.session.flush()
+        entry = models.Entries(competition_id=competition.id,
+                               gymnast_id=newcomer.id)
+        db.session.add(entry)
+        db.session.commit()
+
+        rows = [scores.ScoreRow(entry_id, floor, 5.0, 0.0, [8.0])
+                for entry_id in [*competition.entry_ids, entry.id]]
+        rows.append(scores.ScoreRow(competition.entry_ids[1], rings, 5.0,
+                                    0.0, [8.0]))
+        scores.save_scores(live, rows)
+
+
+def test_new_and_renamed_rows_are_found(app, make_competition):
+    competition = make_competition(app, gymnast_count=2, name='Regionals')
+    _seed(app, competition)
+
+    assert _found(app, 'aroha') == [('Aroha Ngata', 'Floor')]
+    assert _found(app, 'NGA') == [('Aroha Ngata', 'Floor')]
+    assert _found(app, 'smi') == [('Mere Smith', 'Floor')]
+    with app.app_context():
+        # The old name is gone from the index
+        tokens = db.session.scalars(
+            db.select(models.SearchIndex.token)
+            .where(models.SearchIndex.kind == 'gymnast')
+            .where(models.SearchIndex.ref_id == competition.gymnast_ids[0])
+        )
+        assert sorted(tokens) == ['7', 'aroha', 'level', 'ngata']
+
+    with app.app_context():
+        club = models.Clubs.query.one()
+        club.name = 'Harbour City'
+        db.session.commit()
+    assert len(_found(app, 'harbour')) == 4
+    assert _found(app, 'club') == []
+
+
+def test_every_word_must_match(app, make_competition):
+    competition = make_competition(app, gymnast_count=2, name='Regionals')
+    _seed(app, competition)
+
+    # Words can match different things: a name, a level, an apparatus
+    assert _found(app, 'regionals ring') == [('Regionals 2', 'Rings')]
+    assert _found(app, 'level 8') == [('Mere Smith', 'Floor')]
+    assert _found(app, 'mere flo') == [('Mere Smith', 'Floor')]
+    assert _found(app, 'mere ring') == []
+    assert _found(app, 'aroha smith') == []
+    # Punctuation isn't a word, and LIKE wildcards match only themselves
+    assert _found(app, '%') == []
+    assert _found(app, 'aroha_') == []
+
+
+def test_a_search_is_one_statement(app, make_competition):
+    competition = make_competition(app, gymnast_count=2, name='Regionals')
+    _seed(app, competition)
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+        event.listen(engine, 'before_cursor_execute', count)
+        try:
+            page = _results_page('regionals level floor', 'total', 'desc',
+                                 5, None)
+        finally:
+            event.remove(engine, 'before_cursor_execute', count)
+
+    assert len(page.items) == 3
+    assert len(statements) == 1
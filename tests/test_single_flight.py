@@ -0,0 +1,90 @@
+"""Concurrent calls with the same key share one call and its result or
+error; nothing is kept once it finishes."""
+
+import threading
+import time
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def _wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def _in_flight(flights, key, function, followers):
+    """Start a leader blocked in ``function`` and ``followers`` callers
+    waiting on it. Returns (release, threads, results, errors)."""
+    release = threading.Event()
+    results, errors = [], []
+
+    def blocked():
+        release.wait(5)
+        return function()
+
+    def call():
+        try:
+            results.append(flights.do(key, blocked))
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=call)
+               for _ in range(followers + 1)]
+    threads[0].start()
+    _wait_for(lambda: flights.stats().get(key[0], {}).get('leaders'))
+    for thread in threads[1:]:
+        thread.start()
+    _wait_for(lambda: flights.stats()[key[0]]['coalesced'] == followers)
+    return release, threads, results, errors
+
+
+def test_concurrent_calls_share_one_result():
+    flights = SingleFlight()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return ('board', len(calls))
+
+    release, threads, results, errors = _in_flight(
+        flights, ('live', 1), compute, followers=9
+    )
+    # Another key isn't held up by, or shared with, the first
+    assert flights.do(('live', 2), lambda: 'other') == 'other'
+
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [1]
+    assert results == [('board', 1)] * 10
+    assert errors == []
+    assert flights.stats() == {'live': {'leaders': 2, 'coalesced': 9}}
+
+    # Finished flights are forgotten: the next call computes again
+    assert flights.do(('live', 1), compute) == ('board', 2)
+
+
+def test_followers_get_the_leaders_error():
+    flights = SingleFlight()
+
+    def fail():
+        raise ValueError('database went away')
+
+    release, threads, results, errors = _in_flight(
+        flights, ('results', 'x'), fail, followers=3
+    )
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == []
+    assert [str(error) for error in errors] == ['database went away'] * 4
+
+    with pytest.raises(ValueError):
+        flights.do(('results', 'x'), fail)
+    assert flights.do(('results', 'x'), lambda: 'recovered') == 'recovered'
@@ -0,0 +1,129 @@
+"""A stale value is served while it is refreshed, in the background or in
+the request where threads don't run; an expired or purged one never is."""
+
+import sys
+import time
+import types
+
+import pytest
+
+from page_cache import page_cache
+import stale_cache
+from stale_cache import StaleCache
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(stale_cache, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def cache(app):
+    app.config.update(STALE_CACHE_SOFT_TTL=10, STALE_CACHE_HARD_TTL=60)
+    cache = StaleCache()
+    cache.init_app(app)
+    return cache
+
+
+def _counter():
+    """A function returning how many times it has been called."""
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+    return compute
+
+
+def _wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_stale_values_are_refreshed_in_the_background(app, cache, clock):
+    compute = _counter()
+    with app.app_context():
+        assert cache.get(('topnz', 1), ['season:1'], compute) == 1
+        clock.now += 5
+        assert cache.get(('topnz', 1), ['season:1'], compute) == 1
+        assert cache.stale_hits == 0
+
+        clock.now += 6
+        assert cache.get(('topnz', 1), ['season:1'], compute) == 1
+        _wait_for(lambda: cache.refreshes == 1)
+        assert cache.get(('topnz', 1), ['season:1'], compute) == 2
+        assert cache.stale_hits == 1
+
+
+def test_without_threads_the_request_refreshes(app, cache, clock):
+    cache.background = False
+    compute = _counter()
+    with app.app_context():
+        cache.get(('topnz', 1), ['season:1'], compute)
+        clock.now += 11
+        assert cache.get(('topnz', 1), ['season:1'], compute) == 2
+        assert (cache.stale_hits, cache.refreshes) == (1, 1)
+        assert cache.get(('topnz', 1), ['season:1'], compute) == 2
+
+        # A failed refresh keeps serving the stale value
+        clock.now += 11
+
+        def fail():
+            raise RuntimeError('database went away')
+        assert cache.get(('topnz', 1), ['season:1'], fail) == 2
+        assert cache.refreshes == 1
+
+
+def test_threads_are_detected(app, cache, monkeypatch):
+    assert cache.background
+    uwsgi = types.SimpleNamespace(opt={})
+    monkeypatch.setitem(sys.modules, 'uwsgi', uwsgi)
+    cache.init_app(app)
+    assert not cache.background
+
+    uwsgi.opt['enable-threads'] = True
+    cache.init_app(app)
+    assert cache.background
+
+
+def test_expired_values_are_never_served(app, cache, clock):
+    cache.background = False
+    compute = _counter()
+    with app.app_context():
+        cache.get(('topnz', 1), ['season:1'], compute)
+        clock.now += 61
+        assert cache.get(('topnz', 1), ['season:1'], compute) == 2
+        assert cache.stale_hits == 0
+
+
+def test_purged_values_are_never_served(app, cache, clock):
+    cache.background = False
+    compute = _counter()
+    with app.app_context():
+        cache.get(('topnz', 1), ['season:1'], compute)
+        cache.get(('topnz', 2), ['season:2'], compute)
+
+        page_cache.invalidate('season:1')
+        assert cache.get(('topnz', 1), ['season:1'], compute) == 3
+        assert cache.get(('topnz', 2), ['season:2'], compute) == 2
+
+        # Nor is a value computed while its tag was purged
+        def racing():
+            page_cache.invalidate('season:1')
+            return 'old'
+        clock.now += 11
+        assert cache.get(('topnz', 1), ['season:1'], racing) == 'old'
+        assert cache.get(('topnz', 1), ['season:1'], compute) == 4
+        assert cache.stale_hits == 1
@@ -0,0 +1,121 @@
+"""Scores reach the database through /api/scoring/sync, one at a time from
+the console or a whole offline queue from a tablet. Resent keys are
+acknowledged without writing again, later scores for the same gymnast and
+apparatus win, and a bad score is rejected on its own."""
+
+import models
+
+
+def _item(competition, key, e_scores, entry=0, apparatus=0, d_score=5.0):
+    return {
+        'key': key,
+        'entry_id': competition.entry_ids[entry],
+        'apparatus_id': competition.apparatus_ids[apparatus],
+        'd_score': d_score,
+        'penalty': 0.1,
+        'execution_scores': e_scores,
+    }
+
+
+def _sync(client, *items):
+    return client.post('/api/scoring/sync', json={'scores': list(items)})
+
+
+def test_a_single_score_is_saved_with_progress(app, admin, make_competition):
+    competition = make_competition(app, gymnast_count=2)
+
+    response = _sync(admin, _item(competition, 'a', [8.0, 8.5]))
+    assert response.status_code == 200
+    [result] = response.json['results']
+    assert result['key'] == 'a'
+    assert result['status'] == 'saved'
+    assert (result['score']['e_score'], result['score']['total']) == \
+        (8.25, 13.15)
+    assert [judge['e_score'] for judge in result['score']['judge_scores']] \
+        == [8.0, 8.5]
+    assert result['progress']['scored_count'] == 1
+    assert not result['progress']['is_complete']
+    assert response.json['overall_progress']['fully_scored'] == 0
+    assert response.json['messages'] == [
+        'Multi-judge score submitted! Average E-score: 8.250, '
+        'Total: 13.150'
+    ]
+
+    # There is no separate one-score endpoint
+    assert admin.post('/api/scoring/score', json=_item(
+        competition, 'b', [8.0]
+    )).status_code == 404
+
+
+def test_a_resent_key_is_a_duplicate(app, admin, make_competition):
+    competition = make_competition(app)
+    first = _sync(admin, _item(competition, 'a', [8.0])).json['results'][0]
+
+    # The tablet never heard back and sends the queue again
+    response = _sync(admin, _item(competition, 'a', [8.0]))
+    [result] = response.json['results']
+    assert result['status'] == 'duplicate'
+    assert result['score']['id'] == first['score']['id']
+    assert response.json['messages'] == []
+
+    # Even if the judge edited it in between, the applied key wins
+    [result] = _sync(admin, _item(competition, 'a', [9.0])).json['results']
+    assert result['status'] == 'duplicate'
+    assert result['score']['total'] == 12.9
+    with app.app_context():
+        assert models.Scores.query.count() == 1
+        assert models.ScoreSubmissions.query.count() == 1
+
+
+def test_a_later_queued_score_supersedes_an_earlier_one(app, admin,
+                                                        make_competition):
+    competition = make_competition(app)
+
+    response = _sync(
+        admin,
+        _item(competition, 'a', [7.0]),
+        _item(competition, 'b', [8.0], entry=1),
+        _item(competition, 'c', [9.0]),
+    )
+    results = response.json['results']
+    assert [result['status'] for result in results] == \
+        ['superseded', 'saved', 'saved']
+    # The superseded score reports the one that replaced it
+    assert results[0]['score'] == results[2]['score']
+    assert results[2]['score']['total'] == 13.9
+    with app.app_context():
+        assert models.Scores.query.count() == 2
+        # Both keys were applied, so resending either is a duplicate
+        assert models.ScoreSubmissions.query.count() == 3
+    [result] = _sync(admin, _item(competition, 'a', [7.0])).json['results']
+    assert result['status'] == 'duplicate'
+    assert result['score']['total'] == 13.9
+
+
+def test_a_bad_score_rejects_only_itself(app, admin, make_competition):
+    competition = make_competition(app)
+
+    response = _sync(
+        admin,
+        _item(competition, 'a', [8.0]),
+        _item(competition, 'b', [8.0], entry=1, d_score='lots'),
+        {'entry_id': competition.entry_ids[2]},
+        _item(competition, 'd', [11.0], entry=3),
+        'not a score',
+        _item(competition, 'f', [9.0], entry=1, apparatus=1),
+    )
+    assert response.status_code == 200
+    results = response.json['results']
+    assert [result['status'] for result in results] == [
+        'saved', 'invalid', 'invalid', 'invalid', 'invalid', 'saved',
+    ]
+    assert results[1]['errors'] == ['D Score must be a number.']
+    assert results[2]['errors'] == ['Missing submission key.']
+    assert all(result['errors'] for result in results[1:5])
+    with app.app_context():
+        assert models.Scores.query.count() == 2
+        # Rejected keys weren't used up: fixed, they can be sent again
+        assert models.ScoreSubmissions.query.count() == 2
+    [result] = _sync(admin, _item(competition, 'd', [9.5],
+                                  entry=3)).json['results']
+    assert result['status'] == 'saved'
@@ -0,0 +1,45 @@
+"""Top NZ ranks only the levels marked for it, however many other levels
+have scores."""
+
+from extensions import db
+import models
+import scores
+
+
+def _score(app, competition, e_score):
+    with app.app_context():
+        live = db.session.get(models.Competitions, competition.id)
+        scores.save_scores(live, [
+            scores.ScoreRow(entry_id, competition.apparatus_ids[0], 5.0, 0.0,
+                            [e_score])
+            for entry_id in competition.entry_ids
+        ])
+        return db.session.get(models.Seasons, competition.season_id).year
+
+
+def test_only_top_nz_levels_are_ranked(app, make_competition):
+    senior = make_competition(app, gymnast_count=1, name='Senior',
+                              level='Senior International')
+    year = _score(app, senior, 8.0)
+    junior = make_competition(app, gymnast_count=1, name='Club Night',
+                              level='Level 3')
+    _score(app, junior, 9.0)
+    client = app.test_client()
+
+    page = client.get(f'/topnz?season={year}').get_data(as_text=True)
+    assert 'value="Senior International"' in page
+    assert 'value="Level 3"' not in page
+
+    page = client.get(f'/topnz?season={year}&level=Senior International')
+    assert 'Senior 1' in page.get_data(as_text=True)
+
+    # Asking for another level by name shows no rankings
+    page = client.get(f'/topnz?season={year}&level=Level 3')
+    assert 'Club Night 1' not in page.get_data(as_text=True)
+
+    # Marking the level is all it takes to rank it
+    with app.app_context():
+        models.Levels.query.filter_by(name='Level 3').one().top_nz = True
+        db.session.commit()
+    page = client.get(f'/topnz?season={year}&level=Level 3')
+    assert 'Club Night 1' in page.get_data(as_text=True)
@@ -0,0 +1,79 @@
+"""Resubmitting a score replaces it in place with one upsert per table,
+and the database itself refuses a second score for the same gymnast and
+apparatus."""
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+import models
+import scores
+
+
+def _save(competition, e_scores, entry=0):
+    live = db.session.get(models.Competitions, competition.id)
+    return scores.save_scores(live, [scores.ScoreRow(
+        competition.entry_ids[entry], competition.apparatus_ids[0], 5.0,
+        0.0, e_scores
+    )])[0]
+
+
+def _judges(score_id):
+    return [(judge.judge_number, judge.e_score)
+            for judge in models.JudgeScores.query.filter_by(
+                score_id=score_id).order_by(models.JudgeScores.judge_number)]
+
+
+def test_resubmitting_replaces_the_score(app, make_competition):
+    competition = make_competition(app)
+    with app.app_context():
+        score_id = _save(competition, [8.0, 8.5, 9.0]).id
+        assert _judges(score_id) == [(1, 8.0), (2, 8.5), (3, 9.0)]
+
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context,
+                   executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            replaced = _save(competition, [7.0, 7.5])
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+        assert replaced.id == score_id
+        assert float(replaced.total) == 12.25
+        # The third judge from the bigger panel is gone
+        assert _judges(score_id) == [(1, 7.0), (2, 7.5)]
+        inserts = [statement.split('(')[0].strip()
+                   for statement in statements
+                   if statement.startswith('INSERT INTO')]
+        assert inserts.count('INSERT INTO scores') == 1
+        assert inserts.count('INSERT INTO judge_scores') == 1
+
+        # Down to one judge, who keeps no judge scores
+        _save(competition, [9.0])
+        assert _judges(score_id) == []
+        assert models.Scores.query.count() == 1
+
+
+def test_duplicates_are_refused(app, make_competition):
+    competition = make_competition(app)
+    with app.app_context():
+        score = _save(competition, [8.0, 8.5])
+        db.session.add(models.Scores(
+            entry_id=score.entry_id, apparatus_id=score.apparatus_id,
+            competition_id=score.competition_id,
+            gymnast_id=score.gymnast_id, level=score.level, e_score=1,
+            d_score=1, penalty=0, total=2
+        ))
+        with pytest.raises(IntegrityError):
+            db.session.flush()
+        db.session.rollback()
+
+        db.session.add(models.JudgeScores(score_id=score.id,
+                                          judge_number=1, e_score=1))
+        with pytest.raises(IntegrityError):
+            db.session.flush()
@@ -0,0 +1,153 @@
+"""Maintenance of the ``entry_totals`` aggregate table.
+
+An entry's apparatus count and all-around sums only change when its scores
+do, so they are rewritten on every score write or delete, in the same
+transaction, and the scoring progress and leaderboards read them rather
+than grouping ``Scores`` on every request.
+
+Writers call ``lock_entries`` before touching an entry's scores. The lock
+serialises writes to one gymnast, so ``refresh_entry_totals`` always sums
+a complete set of scores, while gymnasts scored in parallel never wait for
+each other.
+"""
+
+from collections import namedtuple
+
+from extensions import db
+import models
+
+# Scores and totals are kept to three decimals, so smaller differences
+# are rounding
+TOLERANCE = 0.001
+
+# The aggregate columns, in the order the rebuild selects them
+COLUMNS = ('apparatus_count', 'e_score', 'd_score', 'penalty', 'total')
+
+# A stored total that disagrees with the entry's scores; ``stored`` is
+# None when the entry has no row at all
+TotalsDrift = namedtuple('TotalsDrift', 'entry_id column stored expected')
+
+
+def entries_in_scope(competition_id=None, season_id=None):
+    """Select the ids of the entries in scope (every entry if neither)."""
+    entries = db.select(models.Entries.id)
+    if competition_id is not None:
+        entries = entries.where(
+            models.Entries.competition_id == competition_id
+        )
+    if season_id is not None:
+        entries = entries.where(models.Entries.competition_id.in_(
+            db.select(models.Competitions.id).where(
+                models.Competitions.season_id == season_id
+            )
+        ))
+    return entries
+
+
+def lock_entries(entry_ids):
+    """Lock entry rows for this transaction, in id order to avoid deadlocks."""
+    entry_ids = sorted(set(entry_ids))
+    if entry_ids:
+        db.session.query(models.Entries.id).filter(
+            models.Entries.id.in_(entry_ids)
+        ).order_by(models.Entries.id).with_for_update().all()
+
+
+def refresh_entry_totals(entry_ids):
+    """Rewrite the totals of some entries in the current transaction.
+
+    The entries must already be locked with ``lock_entries``. Returns the
+    new rows as dicts keyed by entry id. The caller commits.
+    """
+    entry_ids = sorted(set(entry_ids))
+    if not entry_ids:
+        return {}
+
+    totals = {
+        entry_id: dict({column: 0.0 for column in COLUMNS},
+                       entry_id=entry_id, apparatus_count=0)
+        for entry_id in entry_ids
+    }
+
+    # Locking read, so scores committed by the previous holder of the entry
+    # lock are seen even under REPEATABLE READ
+    score_rows = db.session.query(
+        models.Scores.entry_id,
+        models.Scores.e_score,
+        models.Scores.d_score,
+        models.Scores.penalty,
+        models.Scores.total
+    ).filter(models.Scores.entry_id.in_(entry_ids)).with_for_update()
+    for entry_id, e_score, d_score, penalty, total in score_rows:
+        row = totals[entry_id]
+        row['apparatus_count'] += 1
+        row['e_score'] += e_score
+        row['d_score'] += d_score
+        row['penalty'] += penalty
+        row['total'] += total
+
+    for row in totals.values():
+        for column in COLUMNS[1:]:
+            row[column] = round(row[column], 3)
+
+    models.EntryTotals.query.filter(
+        models.EntryTotals.entry_id.in_(entry_ids)
+    ).delete(synchronize_session=False)
+    db.session.execute(db.insert(models.EntryTotals), list(totals.values()))
+    return totals
+
+
+def _expected_totals(entries):
+    """Aggregate ``Scores`` per entry, including entries with none."""
+    def summed(column):
+        return db.func.coalesce(db.func.round(db.func.sum(column), 3), 0)
+
+    return (
+        db.select(
+            models.Entries.id,
+            db.func.count(models.Scores.id),
+            summed(models.Scores.e_score),
+            summed(models.Scores.d_score),
+            summed(models.Scores.penalty),
+            summed(models.Scores.total)
+        )
+        .outerjoin(models.Scores, models.Scores.entry_id == models.Entries.id)
+        .where(models.Entries.id.in_(entries))
+        .group_by(models.Entries.id)
+    )
+
+
+def rebuild_entry_totals(competition_id=None, season_id=None):
+    """Rebuild the totals of every entry in scope from ``Scores``.
+
+    Returns the number of rows written. The caller commits.
+    """
+    entries = entries_in_scope(competition_id, season_id)
+    models.EntryTotals.query.filter(
+        models.EntryTotals.entry_id.in_(entries)
+    ).delete(synchronize_session=False)
+    return db.session.execute(
+        db.insert(models.EntryTotals).from_select(
+            ['entry_id', *COLUMNS], _expected_totals(entries)
+        )
+    ).rowcount
+
+
+def find_totals_drift(competition_id=None, season_id=None):
+    """Return a ``TotalsDrift`` for every stored total that disagrees."""
+    entries = entries_in_scope(competition_id, season_id)
+    stored = {
+        row.entry_id: row
+        for row in models.EntryTotals.query.filter(
+            models.EntryTotals.entry_id.in_(entries)
+        )
+    }
+
+    drift = []
+    for entry_id, *expected in db.session.execute(_expected_totals(entries)):
+        row = stored.get(entry_id)
+        for column, value in zip(COLUMNS, expected):
+            current = getattr(row, column) if row else None
+            if current is None or abs(current - value) >= TOLERANCE:
+                drift.append(TotalsDrift(entry_id, column, current, value))
+    return drift
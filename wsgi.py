@@ -20,5 +20,11 @@ os.environ.setdefault('FLASK_DEBUG', '0')
 
 application = create_app()
 
+# Migrations are a deploy step ("flask --app run migrate"); refuse to serve
+# a database that hasn't had them
+from migrations import check as check_migrations
+with application.app_context():
+    check_migrations()
+
 if __name__ == "__main__":
     application.run()